@@ -1,34 +1,30 @@
 import os
-import subprocess
+import sys
+import glob
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from omegaconf import OmegaConf
+
+from artifact_cache import ArtifactCache
+from model_registry import registry
+from pipeline import Pipeline, STAGES, image_name
 
 def list_images(directory="data"):
     """Liste toutes les images JPG et PNG disponibles dans un dossier."""
     images = [f for f in os.listdir(directory) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
     return images
 
-def segment_and_convert(image_path, save_name):
+def segment_and_convert(image_path, save_name, pipeline=None):
     """
-    1. Segmente l'image et génère un fichier "_rgba.png".
-    2. Demande à l'utilisateur un nom personnalisé pour `save_path`.
-    3. Convertit l'image segmentée en 3D avec `save_path=save_name`.
+    1. Demande à l'utilisateur un nom personnalisé pour `save_path`.
+    2. Segmente l'image ("_rgba.png") puis la convertit en 3D avec `save_path=save_name`,
+       dans ce même processus (les modèles sont chargés une seule fois par `pipeline`).
     """
 
-    # Extraire le nom de l'image sans extension
-    image_name = os.path.basename(image_path).split('.')[0]
-
-    # Nom de l'image segmentée
-    segmented_image = f"data/{image_name}_rgba.png"
-
-    # Commande pour segmenter l'image
-    segmentation_cmd = f"python process.py {image_path}"
-    print(f"🔹 Exécution : {segmentation_cmd}")
-    subprocess.run(segmentation_cmd, shell=True, check=True)
-
-    # Vérification que l'image segmentée a bien été générée
-    if not os.path.exists(segmented_image):
-        print(f" Erreur : L'image segmentée {segmented_image} n'a pas été générée.")
-        return
-
     # Demander le nom personnalisé avant de lancer le rendu 3D
     print("\n Choisissez un nom pour l'objet 3D généré :")
     custom_name = input(f" Nom du fichier (par défaut : {save_name}): ").strip()
@@ -37,14 +33,148 @@ def segment_and_convert(image_path, save_name):
     if not custom_name:
         custom_name = save_name
 
-    # Commande pour générer le modèle 3D avec le nom choisi
-    render_cmd = f"python main.py --config configs/image.yaml input={segmented_image} save_path={custom_name}"
-    print(f"🔹 Exécution : {render_cmd}")
-    subprocess.run(render_cmd, shell=True, check=True)
+    if pipeline is None:
+        # les étapes déjà calculées pour la même image et la même config sont reprises du cache
+        pipeline = Pipeline(OmegaConf.load("configs/image.yaml"), stages=("segment", "stage1"), cache=ArtifactCache("logs/cache"))
+
+    print(f"🔹 Traitement : {image_path} -> {custom_name}")
+    pipeline.run([image_path], names=[custom_name])
 
     print(f" Processus terminé avec succès ! ")
 
+def expand_images(patterns):
+    """Images correspondant aux motifs glob, dans l'ordre, sans doublons ni sorties de segmentation ("_rgba.png")."""
+    images = []
+    for pattern in patterns:
+        for f in sorted(glob.glob(pattern)):
+            if f.lower().endswith(('.jpg', '.jpeg', '.png')) and not f.endswith('_rgba.png') and f not in images:
+                images.append(f)
+    return images
+
+
+def output_name(template, path, index):
+    """Nom de sortie d'une image : `template` avec {name} (nom de l'image), {dir} (dossier parent) et {index}."""
+    return template.format(name=image_name(path), dir=os.path.basename(os.path.dirname(os.path.abspath(path))), index=index)
+
+
+_segment_pipeline = None
+
+def _init_segment_worker(opt, cache_dir, cache_size):
+    # un pipeline de segmentation (et une session rembg) par processus
+    global _segment_pipeline
+    cache = ArtifactCache(cache_dir, max_bytes=cache_size) if cache_dir else None
+    _segment_pipeline = Pipeline(opt, stages=("segment",), cache=cache)
+
+def _segment_worker(path, name):
+    t = _segment_pipeline.run_stage("segment", path, name)
+    return _segment_pipeline.input_path(path), t
+
+
+def run_batch(images, name_template="{name}", opt=None, stages=("segment", "stage1"), workers=2, cache=None):
+    """
+    Traite toutes les images sans interaction : la segmentation tourne dans un pool de `workers` processus
+    pendant que les étapes 3D des images déjà segmentées s'exécutent dans ce processus.
+    Retourne le résumé {"images": [{"input", "name", "rgba", "status", "error", "timings", "outputs"}], "models": [...], ...}.
+    """
+    if opt is None:
+        opt = OmegaConf.load("configs/image.yaml")
+    names = [output_name(name_template, path, i) for i, path in enumerate(images)]
+    if len(set(names)) != len(names):
+        raise ValueError(f"le modèle de nom {name_template!r} donne plusieurs fois le même nom : {names}")
+
+    pipeline = Pipeline(opt, stages=[s for s in stages if s != "segment"], cache=cache)
+    os.makedirs(opt.outdir, exist_ok=True)
+    results = [{"input": path, "name": name, "rgba": path, "status": "done", "error": None, "timings": {}, "outputs": {}} for path, name in zip(images, names)]
+
+    def run_3d(result):
+        for stage in STAGES:
+            if stage not in pipeline.stages:
+                continue
+            result["timings"][stage] = pipeline.run_stage(stage, result["rgba"], result["name"])
+            opt_stage = OmegaConf.merge(opt, {"input": result["rgba"], "save_path": result["name"]})
+            result["outputs"][stage] = sorted(pipeline.stage_outputs(stage, result["rgba"], opt_stage)[1])
+
+    def fail(result):
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+        print(f"[WARN] {result['name']} failed:\n{result['error']}")
+
+    t0 = time.perf_counter()
+    if "segment" in stages:
+        # spawn : pas de fork d'un processus qui a déjà initialisé cuda
+        cache_args = (cache.root, cache.max_bytes) if cache is not None else (None, 0)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_segment_worker, initargs=(opt, *cache_args)) as pool:
+            futures = {pool.submit(_segment_worker, r["input"], r["name"]): r for r in results}
+            for future in as_completed(futures):
+                result = futures[future]
+                try:
+                    result["rgba"], result["timings"]["segment"] = future.result()
+                    result["outputs"]["segment"] = [result["rgba"]]
+                    run_3d(result)
+                except Exception:
+                    fail(result)
+    else:
+        for result in results:
+            try:
+                run_3d(result)
+            except Exception:
+                fail(result)
+
+    return {
+        "stages": list(stages),
+        "total": time.perf_counter() - t0,
+        "done": sum(r["status"] == "done" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "images": results,
+        # temps de chargement et mémoire des modèles de ce processus
+        "models": registry.summary(),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Image -> 3D. Sans --images, choix interactif d'une image de data/.")
+    parser.add_argument("--images", nargs="+", default=None, help="motifs glob des images à traiter (mode non interactif)")
+    parser.add_argument("--name", default="{name}", help="modèle du nom de sortie, champs {name}, {dir}, {index}")
+    parser.add_argument("--config", default="configs/image.yaml", type=str)
+    parser.add_argument("--stages", nargs="+", default=["segment", "stage1"], choices=STAGES)
+    parser.add_argument("--workers", default=2, type=int, help="processus de segmentation")
+    parser.add_argument("--cache_dir", default="logs/cache", type=str, help="cache des étapes déjà calculées, vide pour le désactiver")
+    parser.add_argument("--cache_size", default=20, type=float, help="taille maximale du cache en Go")
+    parser.add_argument("--summary", default=None, type=str, help="fichier du résumé json (défaut : <outdir>/summary.json), - pour la sortie standard (les journaux passent alors sur la sortie d'erreur)")
+    return parser.parse_known_args()
+
+
 if __name__ == "__main__":
+    args, extras = parse_args()
+
+    if args.images is not None:
+        images = expand_images(args.images)
+        if not images:
+            sys.exit(f"Aucune image ne correspond à {args.images}")
+
+        summary_out = None
+        if args.summary == "-":
+            # la sortie standard ne reçoit que le résumé json : les journaux (y compris ceux des processus
+            # de segmentation et des bibliothèques) sont redirigés vers la sortie d'erreur
+            sys.stdout.flush()
+            summary_out = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+            os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+        # les options restantes (ex. iters=300) surchargent la config
+        opt = OmegaConf.merge(OmegaConf.load(args.config), OmegaConf.from_cli(extras))
+        cache = ArtifactCache(args.cache_dir, max_bytes=int(args.cache_size * 2 ** 30)) if args.cache_dir else None
+        summary = run_batch(images, args.name, opt, stages=args.stages, workers=args.workers, cache=cache)
+
+        summary_path = args.summary or os.path.join(opt.outdir, "summary.json")
+        if summary_out is not None:
+            summary_out.write(json.dumps(summary, indent=2, ensure_ascii=False) + "\n")
+            summary_out.close()
+        else:
+            with open(summary_path, "w") as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            print(f"[INFO] {summary['done']} done, {summary['failed']} failed in {summary['total']:.1f}s, summary in {summary_path}")
+        sys.exit(1 if summary["failed"] else 0)
+
     images = list_images()
 
     if not images:
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import functools
+import threading
+
+from omegaconf import OmegaConf
+
+ARTIFACT_CACHE_VERSION = 1
+
+# source files whose content is part of the key of each stage
+STAGE_SOURCES = {
+    "segment": ["process.py"],
+    "stage1": ["main.py", "gs_renderer.py", "gs_rasterizer.py", "sh_utils.py", "knn_utils.py", "cam_utils.py", "view_sampler.py", "mesh.py", "mesh_utils.py", "texture_bake.py", "texture_padding.py", "grid_put.py", "guidance"],
+    "stage2": ["main2.py", "mesh_renderer.py", "cam_utils.py", "mesh.py", "texture_bake.py", "texture_padding.py", "guidance"],
+    "video": ["pipeline.py", "mesh.py", "texture_bake.py"],
+}
+
+# options that never change the outputs of a stage
+IGNORED_OPTIONS = {"input", "outdir", "gui", "force_cuda_rast", "mesh", "mesh_cache", "mesh_pipeline_cache", "embedding_cache_dir", "guidance_offload", "profile"}
+STAGE_OPTIONS = {
+    "segment": ["ref_size"],
+    # the video is named after save_path, restored entries keep their file names
+    "video": ["elevation", "mesh_format", "save_path"],
+}
+# stage 1 does not read the stage 2 options
+STAGE1_IGNORED_OPTIONS = {"iters_refine", "geom_lr", "texture_lr", "train_geo"}
+
+
+def hash_file(path, h=None):
+    h = h if h is not None else hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2 ** 24), b""):
+            h.update(chunk)
+    return h
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(stage, root=os.path.dirname(os.path.abspath(__file__))):
+    # hash of the python sources used by a stage (directories are hashed recursively), computed once per process
+    h = hashlib.sha1(f"{ARTIFACT_CACHE_VERSION} {stage}".encode())
+    for name in STAGE_SOURCES[stage]:
+        path = os.path.join(root, name)
+        paths = [path]
+        if os.path.isdir(path):
+            paths = sorted(os.path.join(d, f) for d, _, files in os.walk(path) for f in files if f.endswith(".py"))
+        for p in paths:
+            if os.path.exists(p):
+                h.update(os.path.relpath(p, root).encode())
+                hash_file(p, h)
+    return h.hexdigest()
+
+
+def stage_options(stage, opt):
+    # the subset of the merged config a stage depends on
+    opt = OmegaConf.to_container(opt, resolve=True)
+    if stage in STAGE_OPTIONS:
+        return {k: opt.get(k) for k in STAGE_OPTIONS[stage]}
+    ignored = IGNORED_OPTIONS | (STAGE1_IGNORED_OPTIONS if stage == "stage1" else set())
+    return {k: v for k, v in opt.items() if k not in ignored}
+
+
+def stage_key(stage, upstream, opt):
+    # upstream: key of the previous stage, or hash of the input file for the first one
+    h = hashlib.sha1(f"{upstream} {stage} {code_version(stage)}".encode())
+    h.update(json.dumps(stage_options(stage, opt), sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    # content-addressed store of stage outputs: key -> a set of files, restored by copy into an output directory.
+    # the total size is bounded by max_bytes, least recently used entries are evicted first.
+    def __init__(self, root, max_bytes=10 * 2 ** 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, size INTEGER NOT NULL, files TEXT NOT NULL, accessed REAL NOT NULL)"
+        )
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, "objects", key[:2], key)
+
+    def get(self, key, out_dir):
+        # copy the files of an entry into out_dir, return their paths or None on a miss
+        with self.lock:
+            row = self.db.execute("SELECT files FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for name in json.loads(row[0]):
+            src = os.path.join(self.entry_dir(key), name)
+            if not os.path.exists(src):
+                # removed behind our back, drop the entry
+                self.remove(key)
+                return None
+            paths.append(shutil.copy2(src, os.path.join(out_dir, name)))
+        return paths
+
+    def put(self, key, files):
+        # files: paths of the outputs (stored by file name)
+        files = [f for f in files if os.path.isfile(f)]
+        entry_dir = self.entry_dir(key)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for f in files:
+            shutil.copy2(f, os.path.join(tmp_dir, os.path.basename(f)))
+        size = sum(os.path.getsize(f) for f in files)
+
+        with self.lock:
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, size, files, accessed) VALUES (?, ?, ?, ?)",
+                (key, size, json.dumps([os.path.basename(f) for f in files]), time.time()),
+            )
+        self.evict(keep=key)
+
+    def remove(self, key):
+        with self.lock:
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def size(self):
+        with self.lock:
+            return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self, keep=None):
+        # drop least recently used entries until the cache fits in max_bytes
+        with self.lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+                total -= size
@@ -21,23 +21,36 @@ def safe_normalize(x, eps=1e-20):
     return x / length(x, eps)
 
 
+def cross(x, y):
+    if isinstance(x, np.ndarray):
+        return np.cross(x, y)
+    else:
+        x, y = torch.broadcast_tensors(x, y)
+        return torch.cross(x, y, dim=-1)
+
+
 def look_at(campos, target, opengl=True):
-    # campos: [N, 3], camera/eye position
-    # target: [N, 3], object to look at
-    # return: [N, 3, 3], rotation matrix
+    # campos: [N, 3] or [3], camera/eye position
+    # target: [N, 3] or [3], object to look at
+    # return: [N, 3, 3] or [3, 3], rotation matrix (same array type as campos)
+    if isinstance(campos, np.ndarray):
+        up_vector = np.array([0, 1, 0], dtype=np.float32)
+    else:
+        up_vector = torch.tensor([0, 1, 0], dtype=campos.dtype, device=campos.device)
     if not opengl:
         # camera forward aligns with -z
         forward_vector = safe_normalize(target - campos)
-        up_vector = np.array([0, 1, 0], dtype=np.float32)
-        right_vector = safe_normalize(np.cross(forward_vector, up_vector))
-        up_vector = safe_normalize(np.cross(right_vector, forward_vector))
+        right_vector = safe_normalize(cross(forward_vector, up_vector))
+        up_vector = safe_normalize(cross(right_vector, forward_vector))
     else:
         # camera forward aligns with +z
         forward_vector = safe_normalize(campos - target)
-        up_vector = np.array([0, 1, 0], dtype=np.float32)
-        right_vector = safe_normalize(np.cross(up_vector, forward_vector))
-        up_vector = safe_normalize(np.cross(forward_vector, right_vector))
-    R = np.stack([right_vector, up_vector, forward_vector], axis=1)
+        right_vector = safe_normalize(cross(up_vector, forward_vector))
+        up_vector = safe_normalize(cross(forward_vector, right_vector))
+    if isinstance(campos, np.ndarray):
+        R = np.stack([right_vector, up_vector, forward_vector], axis=-1)
+    else:
+        R = torch.stack([right_vector, up_vector, forward_vector], dim=-1)
     return R
 
 
@@ -62,6 +75,45 @@ def orbit_camera(elevation, azimuth, radius=1, is_degree=True, target=None, open
     return T
 
 
+# batched orbit_camera
+def orbit_cameras(elevations, azimuths, radius=1, is_degree=True, target=None, opengl=True):
+    # elevations, azimuths, radius: [N] or scalars (broadcast), lists, numpy arrays or torch tensors
+    # target: [3] or [N, 3], default to the origin
+    # return: [N, 4, 4], camera pose matrices, a torch tensor (on the device of the inputs) if any input is one, else a float32 numpy array
+    tensors = [x for x in (elevations, azimuths, radius, target) if torch.is_tensor(x)]
+    if tensors:
+        device = tensors[0].device
+        dtype = torch.float64 if any(x.dtype == torch.float64 for x in tensors) else torch.float32
+        elevations, azimuths, radius = torch.broadcast_tensors(*[torch.as_tensor(x, dtype=dtype, device=device) for x in (elevations, azimuths, radius)])
+        elevations, azimuths, radius = [x.reshape(-1) for x in (elevations, azimuths, radius)]
+        if is_degree:
+            elevations, azimuths = torch.deg2rad(elevations), torch.deg2rad(azimuths)
+        target = torch.zeros(3, dtype=dtype, device=device) if target is None else torch.as_tensor(target, dtype=dtype, device=device)
+        campos = torch.stack([
+            radius * torch.cos(elevations) * torch.sin(azimuths),
+            - radius * torch.sin(elevations),
+            radius * torch.cos(elevations) * torch.cos(azimuths),
+        ], dim=-1) + target # [N, 3]
+        T = torch.zeros(campos.shape[0], 4, 4, dtype=torch.float32, device=device)
+    else:
+        # float64 like orbit_camera, the poses are rounded to float32 at the end
+        elevations, azimuths, radius = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in (elevations, azimuths, radius)])
+        elevations, azimuths, radius = [x.reshape(-1) for x in (elevations, azimuths, radius)]
+        if is_degree:
+            elevations, azimuths = np.deg2rad(elevations), np.deg2rad(azimuths)
+        target = np.zeros([3], dtype=np.float32) if target is None else np.asarray(target)
+        campos = np.stack([
+            radius * np.cos(elevations) * np.sin(azimuths),
+            - radius * np.sin(elevations),
+            radius * np.cos(elevations) * np.cos(azimuths),
+        ], axis=-1) + target # [N, 3]
+        T = np.zeros([campos.shape[0], 4, 4], dtype=np.float32)
+    T[:, :3, :3] = look_at(campos, target, opengl)
+    T[:, :3, 3] = campos
+    T[:, 3, 3] = 1
+    return T
+
+
 class OrbitCamera:
     def __init__(self, W, H, r=2, fovy=60, near=0.01, far=100):
         self.W = W
@@ -1,7 +1,19 @@
 import gradio as gr
 import os
 from PIL import Image
-import subprocess
+from omegaconf import OmegaConf
+
+from model_registry import registry
+from pipeline import Pipeline
+
+
+def get_pipeline(stages, elevation_slider):
+    # stages run in this process: the models stay loaded in model_registry between two generations
+    opt = OmegaConf.merge(
+        OmegaConf.load(os.path.join("configs", "image.yaml")),
+        {"mesh_format": "glb", "elevation": elevation_slider, "force_cuda_rast": True},
+    )
+    return Pipeline(opt, stages=stages)
 
 
 # check if there is a picture uploaded or selected
@@ -17,21 +29,21 @@ def optimize_stage_1(image_block: Image.Image, preprocess_chk: bool, elevation_s
         # save image to a designated path
         image_block.save(os.path.join('tmp_data', 'tmp.png'))
 
-        # preprocess image
-        print(f'python process.py {os.path.join("tmp_data", "tmp.png")}')
-        subprocess.run(f'python process.py {os.path.join("tmp_data", "tmp.png")}', shell=True)
+        # preprocess image + stage 1
+        get_pipeline(("segment", "stage1"), elevation_slider).run([os.path.join("tmp_data", "tmp.png")], names=["tmp"])
     else:
         image_block.save(os.path.join('tmp_data', 'tmp_rgba.png'))
 
-    # stage 1
-    subprocess.run(f'python main.py --config {os.path.join("configs", "image.yaml")} input={os.path.join("tmp_data", "tmp_rgba.png")} save_path=tmp mesh_format=glb elevation={elevation_slider} force_cuda_rast=True', shell=True)
+        # stage 1
+        get_pipeline(("stage1",), elevation_slider).run([os.path.join("tmp_data", "tmp_rgba.png")], names=["tmp"])
+    registry.report()
 
     return os.path.join('logs', 'tmp_mesh.glb')
 
 
 def optimize_stage_2(elevation_slider: float):
     # stage 2
-    subprocess.run(f'python main2.py --config {os.path.join("configs", "image.yaml")} input={os.path.join("tmp_data", "tmp_rgba.png")} save_path=tmp mesh_format=glb elevation={elevation_slider} force_cuda_rast=True', shell=True)
+    get_pipeline(("stage2",), elevation_slider).run([os.path.join("tmp_data", "tmp_rgba.png")], names=["tmp"])
 
     return os.path.join('logs', 'tmp.glb')
 
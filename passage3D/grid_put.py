@@ -80,43 +80,53 @@ def nearest_grid_put_2d(H, W, coords, values, return_count=False):
     return result
 
 
-def linear_grid_put_2d(H, W, coords, values, return_count=False):
-    # coords: [N, 2], float in [-1, 1]
+def linear_grid_put_nd(shape, coords, values, return_count=False, weights=None):
+    # shape: [D], list/tuple
+    # coords: [N, D], float in [-1, 1]
     # values: [N, C]
+    # weights: [N], optional per-sample weights (weighted average)
+    # all 2^D corners are gathered in one flat index (corner-major) and splatted with a single index_add_ for values and one for counts.
 
-    C = values.shape[-1]
+    D = len(shape)
+    N, C = values.shape
+
+    size = torch.tensor(shape, dtype=torch.long, device=coords.device)
+    indices = (coords * 0.5 + 0.5) * (size - 1).float()
+    indices_0 = indices.floor().long()  # [N, D]
+    for i in range(D):
+        indices_0[:, i].clamp_(0, shape[i] - 2)
+    frac = indices - indices_0.float()  # [N, D]
+
+    stride = stride_from_shape(shape)
+    flatten_indices = (indices_0 * torch.tensor(stride, dtype=torch.long, device=coords.device)).sum(-1)  # [N]
+
+    # corner k has bit (D - 1 - i) set if it is the upper neighbour along dim i, e.g. 01 = [0, 1] in 2D
+    corner_indices = []
+    corner_weights = []
+    for k in range(2 ** D):
+        offset = 0
+        w = None
+        for i in range(D):
+            upper = (k >> (D - 1 - i)) & 1
+            offset += upper * stride[i]
+            wi = frac[:, i] if upper else 1 - frac[:, i]
+            w = wi if w is None else w * wi
+        corner_indices.append(flatten_indices + offset)
+        corner_weights.append(w)
+    corner_indices = torch.cat(corner_indices)  # [2^D * N]
+    corner_weights = torch.stack(corner_weights).unsqueeze(-1)  # [2^D, N, 1]
 
-    indices = (coords * 0.5 + 0.5) * torch.tensor(
-        [H - 1, W - 1], dtype=torch.float32, device=coords.device
-    )
-    indices_00 = indices.floor().long()  # [N, 2]
-    indices_00[:, 0].clamp_(0, H - 2)
-    indices_00[:, 1].clamp_(0, W - 2)
-    indices_01 = indices_00 + torch.tensor(
-        [0, 1], dtype=torch.long, device=indices.device
-    )
-    indices_10 = indices_00 + torch.tensor(
-        [1, 0], dtype=torch.long, device=indices.device
-    )
-    indices_11 = indices_00 + torch.tensor(
-        [1, 1], dtype=torch.long, device=indices.device
-    )
+    if weights is None:
+        weights = torch.ones_like(values[..., :1])  # [N, 1]
+    else:
+        weights = weights.view(-1, 1).to(values.dtype)
+        values = values * weights
 
-    h = indices[..., 0] - indices_00[..., 0].float()
-    w = indices[..., 1] - indices_00[..., 1].float()
-    w_00 = (1 - h) * (1 - w)
-    w_01 = (1 - h) * w
-    w_10 = h * (1 - w)
-    w_11 = h * w
+    result = torch.zeros(*shape, C, device=values.device, dtype=values.dtype)  # [..., C]
+    count = torch.zeros(*shape, 1, device=values.device, dtype=values.dtype)  # [..., 1]
 
-    result = torch.zeros(H, W, C, device=values.device, dtype=values.dtype)  # [H, W, C]
-    count = torch.zeros(H, W, 1, device=values.device, dtype=values.dtype)  # [H, W, 1]
-    weights = torch.ones_like(values[..., :1])  # [N, 1]
-    
-    result, count = scatter_add_nd_with_count(result, count, indices_00, values * w_00.unsqueeze(1), weights* w_00.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_01, values * w_01.unsqueeze(1), weights* w_01.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_10, values * w_10.unsqueeze(1), weights* w_10.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_11, values * w_11.unsqueeze(1), weights* w_11.unsqueeze(1))
+    result.view(-1, C).index_add_(0, corner_indices, (values * corner_weights).view(-1, C))
+    count.view(-1, 1).index_add_(0, corner_indices, (weights * corner_weights).view(-1, 1))
 
     if return_count:
         return result, count
@@ -126,30 +136,104 @@ def linear_grid_put_2d(H, W, coords, values, return_count=False):
 
     return result
 
-def mipmap_linear_grid_put_2d(H, W, coords, values, min_resolution=32, return_count=False):
+
+def linear_grid_put_2d(H, W, coords, values, return_count=False, weights=None):
     # coords: [N, 2], float in [-1, 1]
     # values: [N, C]
+    # weights: [N], optional per-sample weights (weighted average)
+
+    return linear_grid_put_nd((H, W), coords, values, return_count, weights)
+
+def sum_pool_nd(grid):
+    # grid: [..., C], D dimension + C channel
+    # return: [..., C] with every dimension halved (rounded up), summing 2^D blocks
+
+    shape = grid.shape[:-1]
+    C = grid.shape[-1]
+
+    pad = [0, 0]
+    for s in reversed(shape):
+        pad += [0, s % 2]
+    grid = F.pad(grid, pad)
+
+    view = []
+    for s in shape:
+        view += [(s + 1) // 2, 2]
+    return grid.view(*view, C).sum(dim=tuple(range(1, 2 * len(shape), 2)))
+
+
+def interpolate_nd_at(grid, shape, indices):
+    # sample a coarse grid at some cells of a finer one, same as F.interpolate(mode='(bi|tri)linear', align_corners=False) followed by gathering.
+    # grid: [..., C], D dimension + C channel
+    # shape: [D], size of the fine grid
+    # indices: [M, D], long cell indices in the fine grid
+    # return: [M, C]
+
+    size = grid.shape[:-1]
+    C = grid.shape[-1]
+    D = len(size)
+    stride = stride_from_shape(size)
+    grid = grid.view(-1, C)
+
+    lower, upper, frac = [], [], []
+    for i in range(D):
+        src = ((indices[:, i].float() + 0.5) * (size[i] / shape[i]) - 0.5).clamp_min(0)
+        i0 = src.floor().long().clamp_max(size[i] - 1)
+        lower.append(i0)
+        upper.append((i0 + 1).clamp_max(size[i] - 1))
+        frac.append(src - i0.float())
+
+    out = torch.zeros(indices.shape[0], C, device=grid.device, dtype=grid.dtype)
+    for k in range(2 ** D):
+        flatten_indices = 0
+        w = None
+        for i in range(D):
+            upper_i = (k >> (D - 1 - i)) & 1
+            flatten_indices = flatten_indices + (upper[i] if upper_i else lower[i]) * stride[i]
+            wi = frac[i] if upper_i else 1 - frac[i]
+            w = wi if w is None else w * wi
+        out += grid[flatten_indices] * w.unsqueeze(1)
+
+    return out
+
+
+def mipmap_linear_grid_put_nd(shape, coords, values, min_resolution=32, return_count=False):
+    # shape: [D], list/tuple
+    # coords: [N, D], float in [-1, 1]
+    # values: [N, C]
+    # a single linear splat at full resolution, coarser levels are sum pooled from it only while holes remain,
+    # and each level is sampled at the remaining hole cells only (no dense upsampling), so every cell takes the finest level that reaches it.
 
     C = values.shape[-1]
 
-    result = torch.zeros(H, W, C, device=values.device, dtype=values.dtype)  # [H, W, C]
-    count = torch.zeros(H, W, 1, device=values.device, dtype=values.dtype)  # [H, W, 1]
+    result, count = linear_grid_put_nd(shape, coords, values, return_count=True)
 
-    cur_H, cur_W = H, W
-    
-    while min(cur_H, cur_W) > min_resolution:
+    holes = count.squeeze(-1) == 0  # [...], bool
+    stride = torch.tensor(stride_from_shape(shape), dtype=torch.long, device=count.device)
+    max_pool = F.max_pool2d if len(shape) == 2 else F.max_pool3d
 
-        # try to fill the holes
-        mask = (count.squeeze(-1) == 0)
-        if not mask.any():
+    cur_result, cur_count = result, count
+    while holes.any():
+        cur_result = sum_pool_nd(cur_result)
+        cur_count = sum_pool_nd(cur_count)
+        size = cur_count.shape[:-1]
+        if min(size) <= min_resolution:
             break
 
-        cur_result, cur_count = linear_grid_put_2d(cur_H, cur_W, coords, values, return_count=True)
-        result[mask] = result[mask] + F.interpolate(cur_result.permute(2,0,1).unsqueeze(0).contiguous(), (H, W), mode='bilinear', align_corners=False).squeeze(0).permute(1,2,0).contiguous()[mask]
-        count[mask] = count[mask] + F.interpolate(cur_count.view(1, 1, cur_H, cur_W), (H, W), mode='bilinear', align_corners=False).view(H, W, 1)[mask]
-        cur_H //= 2
-        cur_W //= 2
-    
+        # only holes next to a non-empty coarse cell can be reached by the interpolation
+        reach = max_pool(cur_count.view(1, 1, *size), 3, stride=1, padding=1)[0, 0] > 0
+        for i in range(len(shape)):
+            nearest = ((torch.arange(shape[i], device=count.device) * 2 + 1) * size[i]) // (2 * shape[i])
+            reach = reach.index_select(i, nearest)
+        candidates = (holes & reach).nonzero()  # [M, D]
+
+        cur_hole_count = interpolate_nd_at(cur_count, shape, candidates)  # [M, 1]
+        found = cur_hole_count.squeeze(-1) > 0
+        flatten_indices = (candidates[found] * stride).sum(-1)
+        result.view(-1, C)[flatten_indices] = interpolate_nd_at(cur_result, shape, candidates[found])
+        count.view(-1, 1)[flatten_indices] = cur_hole_count[found]
+        holes.view(-1)[flatten_indices] = False
+
     if return_count:
         return result, count
 
@@ -158,6 +242,13 @@ def mipmap_linear_grid_put_2d(H, W, coords, values, min_resolution=32, return_co
 
     return result
 
+
+def mipmap_linear_grid_put_2d(H, W, coords, values, min_resolution=32, return_count=False):
+    # coords: [N, 2], float in [-1, 1]
+    # values: [N, C]
+
+    return mipmap_linear_grid_put_nd((H, W), coords, values, min_resolution, return_count)
+
 def nearest_grid_put_3d(H, W, D, coords, values, return_count=False):
     # coords: [N, 3], float in [-1, 1]
     # values: [N, C]
@@ -184,93 +275,18 @@ def nearest_grid_put_3d(H, W, D, coords, values, return_count=False):
     return result
 
 
-def linear_grid_put_3d(H, W, D, coords, values, return_count=False):
+def linear_grid_put_3d(H, W, D, coords, values, return_count=False, weights=None):
     # coords: [N, 3], float in [-1, 1]
     # values: [N, C]
+    # weights: [N], optional per-sample weights (weighted average)
 
-    C = values.shape[-1]
-
-    indices = (coords * 0.5 + 0.5) * torch.tensor(
-        [H - 1, W - 1, D - 1], dtype=torch.float32, device=coords.device
-    )
-    indices_000 = indices.floor().long()  # [N, 3]
-    indices_000[:, 0].clamp_(0, H - 2)
-    indices_000[:, 1].clamp_(0, W - 2)
-    indices_000[:, 2].clamp_(0, D - 2)
-
-    indices_001 = indices_000 + torch.tensor([0, 0, 1], dtype=torch.long, device=indices.device)
-    indices_010 = indices_000 + torch.tensor([0, 1, 0], dtype=torch.long, device=indices.device)
-    indices_011 = indices_000 + torch.tensor([0, 1, 1], dtype=torch.long, device=indices.device)
-    indices_100 = indices_000 + torch.tensor([1, 0, 0], dtype=torch.long, device=indices.device)
-    indices_101 = indices_000 + torch.tensor([1, 0, 1], dtype=torch.long, device=indices.device)
-    indices_110 = indices_000 + torch.tensor([1, 1, 0], dtype=torch.long, device=indices.device)
-    indices_111 = indices_000 + torch.tensor([1, 1, 1], dtype=torch.long, device=indices.device)
-
-    h = indices[..., 0] - indices_000[..., 0].float()
-    w = indices[..., 1] - indices_000[..., 1].float()
-    d = indices[..., 2] - indices_000[..., 2].float()
-    
-    w_000 = (1 - h) * (1 - w) * (1 - d)
-    w_001 = (1 - h) * w * (1 - d)
-    w_010 = h * (1 - w) * (1 - d)
-    w_011 = h * w * (1 - d)
-    w_100 = (1 - h) * (1 - w) * d
-    w_101 = (1 - h) * w * d
-    w_110 = h * (1 - w) * d
-    w_111 = h * w * d
-
-    result = torch.zeros(H, W, D, C, device=values.device, dtype=values.dtype)  # [H, W, D, C]
-    count = torch.zeros(H, W, D, 1, device=values.device, dtype=values.dtype)  # [H, W, D, 1]
-    weights = torch.ones_like(values[..., :1])  # [N, 1]
-    
-    result, count = scatter_add_nd_with_count(result, count, indices_000, values * w_000.unsqueeze(1), weights * w_000.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_001, values * w_001.unsqueeze(1), weights * w_001.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_010, values * w_010.unsqueeze(1), weights * w_010.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_011, values * w_011.unsqueeze(1), weights * w_011.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_100, values * w_100.unsqueeze(1), weights * w_100.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_101, values * w_101.unsqueeze(1), weights * w_101.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_110, values * w_110.unsqueeze(1), weights * w_110.unsqueeze(1))
-    result, count = scatter_add_nd_with_count(result, count, indices_111, values * w_111.unsqueeze(1), weights * w_111.unsqueeze(1))
-
-    if return_count:
-        return result, count
-
-    mask = (count.squeeze(-1) > 0)
-    result[mask] = result[mask] / count[mask].repeat(1, C)
-
-    return result
+    return linear_grid_put_nd((H, W, D), coords, values, return_count, weights)
 
 def mipmap_linear_grid_put_3d(H, W, D, coords, values, min_resolution=32, return_count=False):
     # coords: [N, 3], float in [-1, 1]
     # values: [N, C]
 
-    C = values.shape[-1]
-
-    result = torch.zeros(H, W, D, C, device=values.device, dtype=values.dtype)  # [H, W, D, C]
-    count = torch.zeros(H, W, D, 1, device=values.device, dtype=values.dtype)  # [H, W, D, 1]
-    cur_H, cur_W, cur_D = H, W, D
-    
-    while min(min(cur_H, cur_W), cur_D) > min_resolution:
-
-        # try to fill the holes
-        mask = (count.squeeze(-1) == 0)
-        if not mask.any():
-            break
-
-        cur_result, cur_count = linear_grid_put_3d(cur_H, cur_W, cur_D, coords, values, return_count=True)
-        result[mask] = result[mask] + F.interpolate(cur_result.permute(3,0,1,2).unsqueeze(0).contiguous(), (H, W, D), mode='trilinear', align_corners=False).squeeze(0).permute(1,2,3,0).contiguous()[mask]
-        count[mask] = count[mask] + F.interpolate(cur_count.view(1, 1, cur_H, cur_W, cur_D), (H, W, D), mode='trilinear', align_corners=False).view(H, W, D, 1)[mask]
-        cur_H //= 2
-        cur_W //= 2
-        cur_D //= 2
-    
-    if return_count:
-        return result, count
-
-    mask = (count.squeeze(-1) > 0)
-    result[mask] = result[mask] / count[mask].repeat(1, C)
-
-    return result
+    return mipmap_linear_grid_put_nd((H, W, D), coords, values, min_resolution, return_count)
 
 
 def grid_put(shape, coords, values, mode='linear-mipmap', min_resolution=32, return_raw=False):
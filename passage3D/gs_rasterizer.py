@@ -0,0 +1,353 @@
+from typing import NamedTuple
+
+import torch
+import torch.nn.functional as F
+
+from sh_utils import eval_sh_fused
+
+try:
+    import diff_gaussian_rasterization
+except ImportError:
+    # cuda-only extension, only the torch backend is available
+    diff_gaussian_rasterization = None
+
+# tile size of the cuda rasterizer
+BLOCK_X, BLOCK_Y = 16, 16
+
+
+class GaussianRasterizationSettings(NamedTuple):
+    # same fields as diff_gaussian_rasterization.GaussianRasterizationSettings
+    image_height: int
+    image_width: int
+    tanfovx: float
+    tanfovy: float
+    bg: torch.Tensor
+    scale_modifier: float
+    viewmatrix: torch.Tensor
+    projmatrix: torch.Tensor
+    sh_degree: int
+    campos: torch.Tensor
+    prefiltered: bool
+    debug: bool
+
+
+class CudaRasterizer:
+    # thin wrapper around diff_gaussian_rasterization (the default on GPU)
+    def __init__(self, raster_settings):
+        assert diff_gaussian_rasterization is not None, "diff_gaussian_rasterization is not installed!"
+        self.rasterizer = diff_gaussian_rasterization.GaussianRasterizer(
+            raster_settings=diff_gaussian_rasterization.GaussianRasterizationSettings(**raster_settings._asdict())
+        )
+
+    def __call__(self, means3D, means2D, opacities, shs=None, colors_precomp=None, scales=None, rotations=None, cov3D_precomp=None):
+        return self.rasterizer(
+            means3D=means3D,
+            means2D=means2D,
+            shs=shs,
+            colors_precomp=colors_precomp,
+            opacities=opacities,
+            scales=scales,
+            rotations=rotations,
+            cov3D_precomp=cov3D_precomp,
+        )
+
+
+def build_covariance_3d(scales, rotations, scale_modifier=1.0):
+    # scales: [N, 3], rotations: [N, 4] quaternion (r, x, y, z)
+    # return: [N, 3, 3]
+    r, x, y, z = F.normalize(rotations, dim=-1).unbind(-1)
+    R = torch.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - r * z), 2 * (x * z + r * y),
+        2 * (x * y + r * z), 1 - 2 * (x * x + z * z), 2 * (y * z - r * x),
+        2 * (x * z - r * y), 2 * (y * z + r * x), 1 - 2 * (x * x + y * y),
+    ], dim=-1).view(-1, 3, 3)
+    L = R * (scale_modifier * scales).unsqueeze(1)
+    return L @ L.transpose(1, 2)
+
+
+def unpack_covariance_3d(cov3D_precomp):
+    # [N, 6] upper triangle (as in strip_symmetric) --> [N, 3, 3]
+    a, b, c, d, e, f = cov3D_precomp.unbind(-1)
+    return torch.stack([a, b, c, b, d, e, c, e, f], dim=-1).view(-1, 3, 3)
+
+
+def preprocess_gaussians(raster_settings, means3D, means2D, opacities, shs=None, colors_precomp=None, scales=None, rotations=None, cov3D_precomp=None):
+    # per-gaussian part of the cuda rasterizer (preprocessCUDA): projection, 2D covariance (EWA), radius and color.
+    # return a dict of [N, ...] tensors, `radii` is 0 for culled gaussians.
+    H, W = int(raster_settings.image_height), int(raster_settings.image_width)
+    viewmatrix, projmatrix = raster_settings.viewmatrix, raster_settings.projmatrix
+    tanfovx, tanfovy = raster_settings.tanfovx, raster_settings.tanfovy
+
+    ones = torch.ones_like(means3D[:, :1])
+    p_hom = torch.cat([means3D, ones], dim=-1)
+    p_view = p_hom @ viewmatrix # [N, 4], matrices are stored transposed
+    p_clip = p_hom @ projmatrix
+    p_proj = p_clip[:, :2] / (p_clip[:, 3:] + 1e-7)
+
+    # near plane culling
+    depth = p_view[:, 2]
+    in_frustum = depth > 0.2
+
+    # 3D covariance
+    if cov3D_precomp is not None:
+        cov3D = unpack_covariance_3d(cov3D_precomp)
+    else:
+        cov3D = build_covariance_3d(scales, rotations, raster_settings.scale_modifier)
+
+    # 2D covariance, J @ W @ cov3D @ W^T @ J^T
+    focal_x = W / (2 * tanfovx)
+    focal_y = H / (2 * tanfovy)
+    tz = depth.clamp_min(1e-6) # culled ones are masked out later
+    limx, limy = 1.3 * tanfovx, 1.3 * tanfovy
+    tx = (p_view[:, 0] / tz).clamp(-limx, limx) * tz
+    ty = (p_view[:, 1] / tz).clamp(-limy, limy) * tz
+    zeros = torch.zeros_like(tz)
+    J = torch.stack([
+        focal_x / tz, zeros, -(focal_x * tx) / (tz * tz),
+        zeros, focal_y / tz, -(focal_y * ty) / (tz * tz),
+    ], dim=-1).view(-1, 2, 3)
+    T = J @ viewmatrix[:3, :3].T.unsqueeze(0) # [N, 2, 3]
+    cov2D = T @ cov3D @ T.transpose(1, 2)
+    # low-pass filter, at least one pixel wide
+    a = cov2D[:, 0, 0] + 0.3
+    b = cov2D[:, 0, 1]
+    c = cov2D[:, 1, 1] + 0.3
+
+    det = a * c - b * b
+    valid = in_frustum & (det != 0)
+    det_inv = 1 / torch.where(valid, det, torch.ones_like(det))
+    conic = torch.stack([c * det_inv, -b * det_inv, a * det_inv], dim=-1) # [N, 3]
+
+    mid = 0.5 * (a + c)
+    lambda1 = mid + torch.sqrt((mid * mid - det).clamp_min(0.1))
+    radius = torch.ceil(3 * torch.sqrt(lambda1.detach()))
+
+    # pixel coordinates (ndc2Pix), means2D only carries the screen-space gradient
+    proj = p_proj + means2D[:, :2]
+    xy = torch.stack([((proj[:, 0] + 1) * W - 1) * 0.5, ((proj[:, 1] + 1) * H - 1) * 0.5], dim=-1)
+
+    # touched tiles (getRect), the gaussian is skipped if it touches none
+    xy_d = xy.detach()
+    grid_x, grid_y = (W + BLOCK_X - 1) // BLOCK_X, (H + BLOCK_Y - 1) // BLOCK_Y
+    rect_min = torch.stack([
+        ((xy_d[:, 0] - radius) / BLOCK_X).trunc().clamp(0, grid_x),
+        ((xy_d[:, 1] - radius) / BLOCK_Y).trunc().clamp(0, grid_y),
+    ], dim=-1).long()
+    rect_max = torch.stack([
+        ((xy_d[:, 0] + radius + BLOCK_X - 1) / BLOCK_X).trunc().clamp(0, grid_x),
+        ((xy_d[:, 1] + radius + BLOCK_Y - 1) / BLOCK_Y).trunc().clamp(0, grid_y),
+    ], dim=-1).long()
+    valid = valid & ((rect_max - rect_min).prod(-1) > 0)
+
+    # color
+    if colors_precomp is None:
+        dirs = F.normalize(means3D - raster_settings.campos.unsqueeze(0), dim=-1)
+        colors = eval_sh_fused(raster_settings.sh_degree, shs.transpose(1, 2), dirs)
+        colors = torch.clamp_min(colors + 0.5, 0.0)
+    else:
+        colors = colors_precomp
+
+    return {
+        "xy": xy,
+        "depth": depth,
+        "conic": conic,
+        "opacity": opacities.view(-1),
+        "color": colors,
+        "radii": torch.where(valid, radius, torch.zeros_like(radius)).int(),
+        "rect_min": rect_min,
+        "rect_max": rect_max,
+        "valid": valid,
+    }
+
+
+def composite(xy, conic, opacity, features, pix, mask=None, T_thresh=0.0001):
+    # front-to-back alpha compositing of depth-sorted gaussians, with the same rules as renderCUDA:
+    # alpha clamped to 0.99, skipped below 1/255, stop before transmittance drops under T_thresh.
+    # xy: [..., G, 2], conic: [..., G, 3], opacity: [..., G], features: [..., G, C] (sorted by depth)
+    # pix: [..., P, 2] pixel coordinates, mask: [..., P, G] optional, which gaussians may touch which pixels
+    # return: [..., P, C] accumulated features, [..., P] accumulated alpha
+    d = pix.unsqueeze(-2) - xy.unsqueeze(-3) # [..., P, G, 2]
+    conic = conic.unsqueeze(-3)
+    power = -0.5 * (conic[..., 0] * d[..., 0] ** 2 + conic[..., 2] * d[..., 1] ** 2) - conic[..., 1] * d[..., 0] * d[..., 1]
+    alpha = (opacity.unsqueeze(-2) * torch.exp(power)).clamp_max(0.99)
+    keep = (power <= 0) & (alpha >= 1 / 255)
+    if mask is not None:
+        keep = keep & mask
+    alpha = torch.where(keep, alpha, torch.zeros_like(alpha))
+
+    T_after = torch.cumprod(1 - alpha, dim=-1)
+    T_before = torch.cat([torch.ones_like(T_after[..., :1]), T_after[..., :-1]], dim=-1)
+    # T_after is non-increasing, so this is the same as terminating the loop
+    weights = alpha * T_before * (T_after.detach() >= T_thresh)
+
+    return weights @ features, weights.sum(-1)
+
+
+class TorchRasterizer:
+    # slow reference splatting in pure torch (runs on cpu), same interface as the cuda rasterizer.
+    # every pixel is blended against every visible gaussian whose tile rect covers it, in chunks of pixels.
+    def __init__(self, raster_settings, max_elements=2 ** 24):
+        self.raster_settings = raster_settings
+        self.max_elements = max_elements
+
+    def __call__(self, means3D, means2D, opacities, shs=None, colors_precomp=None, scales=None, rotations=None, cov3D_precomp=None):
+        settings = self.raster_settings
+        H, W = int(settings.image_height), int(settings.image_width)
+        device = means3D.device
+
+        g = preprocess_gaussians(settings, means3D, means2D, opacities, shs, colors_precomp, scales, rotations, cov3D_precomp)
+
+        # visible gaussians, front to back
+        index = g["valid"].nonzero(as_tuple=True)[0]
+        index = index[torch.argsort(g["depth"][index].detach())]
+
+        xy = g["xy"][index]
+        conic = g["conic"][index]
+        opacity = g["opacity"][index]
+        features = torch.cat([g["color"][index], g["depth"][index].unsqueeze(-1)], dim=-1) # [G, C + 1]
+        rect_min, rect_max = g["rect_min"][index], g["rect_max"][index]
+
+        ys, xs = torch.meshgrid(torch.arange(H, device=device), torch.arange(W, device=device), indexing="ij")
+        pix = torch.stack([xs, ys], dim=-1).view(-1, 2)
+        tiles = torch.stack([pix[:, 0] // BLOCK_X, pix[:, 1] // BLOCK_Y], dim=-1)
+        pix = pix.float()
+
+        out_features, out_alpha = [], []
+        chunk = max(1, self.max_elements // max(1, index.shape[0]))
+        for start in range(0, pix.shape[0], chunk):
+            end = min(start + chunk, pix.shape[0])
+            # only gaussians assigned to the tile of the pixel are blended
+            in_rect = ((tiles[start:end, None] >= rect_min[None]) & (tiles[start:end, None] < rect_max[None])).all(-1) # [P, G]
+            feats, alpha = composite(xy, conic, opacity, features, pix[start:end], in_rect)
+            out_features.append(feats)
+            out_alpha.append(alpha)
+
+        out_features = torch.cat(out_features, dim=0) # [HW, C + 1]
+        out_alpha = torch.cat(out_alpha, dim=0) # [HW]
+
+        image, depth, alpha = to_images(out_features, out_alpha, settings.bg, H, W)
+        return image, g["radii"], depth, alpha
+
+
+def to_images(features, alpha, bg, H, W):
+    # features: [HW, C + 1] (color + depth), alpha: [HW]
+    # return: image [C, H, W] blended over bg, depth [1, H, W], alpha [1, H, W]
+    image = features[:, :-1] + (1 - alpha.unsqueeze(-1)) * bg.view(1, -1)
+    image = image.T.reshape(-1, H, W)
+    depth = features[:, -1].view(1, H, W)
+    alpha = alpha.view(1, H, W)
+    return image, depth, alpha
+
+
+class TileRasterizer:
+    # tile-based torch splatting, same binning as the cuda rasterizer: each visible gaussian is duplicated
+    # into the 16x16 tiles of its rect, the list is sorted by (tile, depth), and batches of tiles are
+    # composited as padded [tiles, 256 pixels, gaussians per tile] tensors.
+    def __init__(self, raster_settings, max_elements=2 ** 24):
+        self.raster_settings = raster_settings
+        self.max_elements = max_elements
+
+    def __call__(self, means3D, means2D, opacities, shs=None, colors_precomp=None, scales=None, rotations=None, cov3D_precomp=None):
+        settings = self.raster_settings
+        H, W = int(settings.image_height), int(settings.image_width)
+        grid_x, grid_y = (W + BLOCK_X - 1) // BLOCK_X, (H + BLOCK_Y - 1) // BLOCK_Y
+        device = means3D.device
+
+        g = preprocess_gaussians(settings, means3D, means2D, opacities, shs, colors_precomp, scales, rotations, cov3D_precomp)
+
+        # visible gaussians, front to back (the stable sort by tile below keeps this order inside each tile)
+        index = g["valid"].nonzero(as_tuple=True)[0]
+        index = index[torch.argsort(g["depth"][index].detach())]
+
+        xy = g["xy"][index]
+        conic = g["conic"][index]
+        opacity = g["opacity"][index]
+        features = torch.cat([g["color"][index], g["depth"][index].unsqueeze(-1)], dim=-1) # [G, C + 1]
+        C = features.shape[-1]
+
+        # duplicate per touched tile
+        rect_min, rect_max = g["rect_min"][index], g["rect_max"][index]
+        rect_size = rect_max - rect_min # [G, 2]
+        counts = rect_size.prod(-1)
+        gid = torch.repeat_interleave(torch.arange(index.shape[0], device=device), counts) # [M]
+        offset = torch.arange(gid.shape[0], device=device) - torch.repeat_interleave(torch.cumsum(counts, 0) - counts, counts)
+        tile_x = rect_min[gid, 0] + offset % rect_size[gid, 0]
+        tile_y = rect_min[gid, 1] + offset // rect_size[gid, 0]
+        tile = tile_y * grid_x + tile_x
+
+        tile, order = torch.sort(tile, stable=True)
+        gid = gid[order]
+        tile_counts = torch.bincount(tile, minlength=grid_x * grid_y)
+        tile_starts = torch.cumsum(tile_counts, 0) - tile_counts
+
+        # pixel coordinates inside a tile
+        ly, lx = torch.meshgrid(torch.arange(BLOCK_Y, device=device), torch.arange(BLOCK_X, device=device), indexing="ij")
+        local = torch.stack([lx, ly], dim=-1).view(-1, 2) # [256, 2]
+
+        # non-empty tiles, in increasing number of gaussians to limit padding inside a batch
+        tiles = (tile_counts > 0).nonzero(as_tuple=True)[0]
+        tiles = tiles[torch.argsort(tile_counts[tiles])]
+        tile_counts_cpu = tile_counts[tiles].tolist()
+
+        out_ids, out_features, out_alpha = [], [], []
+        start = 0
+        while start < len(tiles):
+            B = max(1, self.max_elements // (local.shape[0] * tile_counts_cpu[start]))
+            end = min(start + B, len(tiles))
+            # the last tile of the batch has the most gaussians
+            B = max(1, self.max_elements // (local.shape[0] * tile_counts_cpu[end - 1]))
+            end = min(start + B, end)
+            K = tile_counts_cpu[end - 1]
+
+            batch = tiles[start:end] # [B]
+            slot = torch.arange(K, device=device)
+            mask = slot.unsqueeze(0) < tile_counts[batch].unsqueeze(1) # [B, K]
+            slot = torch.where(mask, tile_starts[batch].unsqueeze(1) + slot, torch.zeros_like(slot))
+            ids = gid[slot] # [B, K]
+
+            origin = torch.stack([batch % grid_x * BLOCK_X, batch // grid_x * BLOCK_Y], dim=-1) # [B, 2]
+            pix = origin.unsqueeze(1) + local.unsqueeze(0) # [B, 256, 2]
+
+            feats, alpha = composite(xy[ids], conic[ids], opacity[ids], features[ids], pix.float(), mask.unsqueeze(1))
+            out_ids.append((pix[..., 1] * grid_x * BLOCK_X + pix[..., 0]).view(-1))
+            out_features.append(feats.view(-1, C))
+            out_alpha.append(alpha.view(-1))
+            start = end
+
+        # scatter tiles back into the (tile-padded) image, empty tiles keep the background
+        HP, WP = grid_y * BLOCK_Y, grid_x * BLOCK_X
+        full_features = features.new_zeros((HP * WP, C))
+        full_alpha = features.new_zeros((HP * WP,))
+        if len(out_ids) > 0:
+            out_ids = torch.cat(out_ids)
+            full_features = full_features.index_copy(0, out_ids, torch.cat(out_features))
+            full_alpha = full_alpha.index_copy(0, out_ids, torch.cat(out_alpha))
+        full_features = full_features.view(HP, WP, C)[:H, :W].reshape(-1, C)
+        full_alpha = full_alpha.view(HP, WP)[:H, :W].reshape(-1)
+
+        image, depth, alpha = to_images(full_features, full_alpha, settings.bg, H, W)
+        return image, g["radii"], depth, alpha
+
+
+# backend name -> rasterizer class, constructed per render with the raster settings
+RASTERIZERS = {
+    "cuda": CudaRasterizer,
+    "torch": TorchRasterizer,
+    "tile": TileRasterizer,
+}
+
+
+def register_rasterizer(name, cls):
+    RASTERIZERS[name] = cls
+
+
+def default_backend(device):
+    if diff_gaussian_rasterization is not None and torch.device(device).type == "cuda":
+        return "cuda"
+    return "tile"
+
+
+def get_rasterizer(backend, raster_settings):
+    if backend not in RASTERIZERS:
+        raise ValueError(f"unknown rasterizer backend {backend}, available: {list(RASTERIZERS.keys())}")
+    return RASTERIZERS[backend](raster_settings)
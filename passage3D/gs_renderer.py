@@ -7,18 +7,17 @@ from plyfile import PlyData, PlyElement
 import torch
 from torch import nn
 
-from diff_gaussian_rasterization import (
-    GaussianRasterizationSettings,
-    GaussianRasterizer,
-)
-from simple_knn._C import distCUDA2
-
-from sh_utils import eval_sh, SH2RGB, RGB2SH
+from gs_rasterizer import GaussianRasterizationSettings, get_rasterizer, default_backend
+from sh_utils import eval_sh_fused, SH2RGB, RGB2SH
+from knn_utils import dist2 as knn_dist2
 from mesh import Mesh
-from mesh_utils import decimate_mesh, clean_mesh
+from mesh_utils import MeshPipeline
 
 import kiui
 
+def default_device():
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
 def inverse_sigmoid(x):
     return torch.log(x/(1-x))
 
@@ -48,7 +47,7 @@ def get_expon_lr_func(
 
 
 def strip_lowerdiag(L):
-    uncertainty = torch.zeros((L.shape[0], 6), dtype=torch.float, device="cuda")
+    uncertainty = torch.zeros((L.shape[0], 6), dtype=torch.float, device=L.device)
 
     uncertainty[:, 0] = L[:, 0, 0]
     uncertainty[:, 1] = L[:, 0, 1]
@@ -87,7 +86,7 @@ def build_rotation(r):
 
     q = r / norm[:, None]
 
-    R = torch.zeros((q.size(0), 3, 3), device='cuda')
+    R = torch.zeros((q.size(0), 3, 3), device=r.device)
 
     r = q[:, 0]
     x = q[:, 1]
@@ -106,7 +105,7 @@ def build_rotation(r):
     return R
 
 def build_scaling_rotation(s, r):
-    L = torch.zeros((s.shape[0], 3, 3), dtype=torch.float, device="cuda")
+    L = torch.zeros((s.shape[0], 3, 3), dtype=torch.float, device=s.device)
     R = build_rotation(r)
 
     L[:,0,0] = s[:,0]
@@ -122,6 +121,20 @@ class BasicPointCloud(NamedTuple):
     normals: np.array
 
 
+# optimizer group name -> GaussianModel attribute
+PARAM_ATTRS = {
+    "xyz": "_xyz",
+    "f_dc": "_features_dc",
+    "f_rest": "_features_rest",
+    "opacity": "_opacity",
+    "scaling": "_scaling",
+    "rotation": "_rotation",
+}
+
+# densification statistics (not optimized, but follow the same rows as the parameters)
+STAT_ATTRS = ["xyz_gradient_accum", "denom", "max_radii2D"]
+
+
 class GaussianModel:
 
     def setup_functions(self):
@@ -142,7 +155,8 @@ class GaussianModel:
         self.rotation_activation = torch.nn.functional.normalize
 
 
-    def __init__(self, sh_degree : int):
+    def __init__(self, sh_degree : int, pooled : bool = False, device=None):
+        self.device = torch.device(device) if device is not None else default_device()
         self.active_sh_degree = 0
         self.max_sh_degree = sh_degree  
         self._xyz = torch.empty(0)
@@ -157,6 +171,12 @@ class GaussianModel:
         self.optimizer = None
         self.percent_dense = 0
         self.spatial_lr_scale = 0
+        # pooled storage: params, adam moments and stats live in buffers of `capacity` rows,
+        # self._xyz etc. are views of the first `num_active` rows.
+        self.pooled = pooled
+        self.capacity = 0
+        self.num_active = 0
+        self._stat_pool = {}
         self.setup_functions()
 
     def capture(self):
@@ -293,7 +313,7 @@ class GaussianModel:
 
         return occ
     
-    def extract_mesh(self, path, density_thresh=1, resolution=128, decimate_target=1e5):
+    def extract_mesh(self, path, density_thresh=1, resolution=128, decimate_target=1e5, remesh=True, decimate_backend="pymeshlab", cache_dir=None):
 
         os.makedirs(os.path.dirname(path), exist_ok=True)
 
@@ -306,18 +326,22 @@ class GaussianModel:
         # transform back to the original space
         vertices = vertices / self.scale + self.center.detach().cpu().numpy()
 
-        vertices, triangles = clean_mesh(vertices, triangles, remesh=True, remesh_size=0.015)
-        if decimate_target > 0 and triangles.shape[0] > decimate_target:
-            vertices, triangles = decimate_mesh(vertices, triangles, decimate_target)
+        # clean, remesh and decimate in one MeshSet
+        pipeline = MeshPipeline(cache_dir=cache_dir).add("clean")
+        if remesh:
+            pipeline.add("remesh", size=0.015)
+        if decimate_target > 0:
+            pipeline.add("decimate", target=decimate_target, backend=decimate_backend)
+        vertices, triangles = pipeline.run(vertices, triangles)
 
-        v = torch.from_numpy(vertices.astype(np.float32)).contiguous().cuda()
-        f = torch.from_numpy(triangles.astype(np.int32)).contiguous().cuda()
+        v = torch.from_numpy(vertices.astype(np.float32)).contiguous().to(self.device)
+        f = torch.from_numpy(triangles.astype(np.int32)).contiguous().to(self.device)
 
         print(
             f"[INFO] marching cubes result: {v.shape} ({v.min().item()}-{v.max().item()}), {f.shape}"
         )
 
-        mesh = Mesh(v=v, f=f, device='cuda')
+        mesh = Mesh(v=v, f=f, device=self.device)
 
         return mesh
     
@@ -330,20 +354,20 @@ class GaussianModel:
 
     def create_from_pcd(self, pcd : BasicPointCloud, spatial_lr_scale : float = 1):
         self.spatial_lr_scale = spatial_lr_scale
-        fused_point_cloud = torch.tensor(np.asarray(pcd.points)).float().cuda()
-        fused_color = RGB2SH(torch.tensor(np.asarray(pcd.colors)).float().cuda())
-        features = torch.zeros((fused_color.shape[0], 3, (self.max_sh_degree + 1) ** 2)).float().cuda()
+        fused_point_cloud = torch.tensor(np.asarray(pcd.points)).float().to(self.device)
+        fused_color = RGB2SH(torch.tensor(np.asarray(pcd.colors)).float().to(self.device))
+        features = torch.zeros((fused_color.shape[0], 3, (self.max_sh_degree + 1) ** 2)).float().to(self.device)
         features[:, :3, 0 ] = fused_color
         features[:, 3:, 1:] = 0.0
 
         print("Number of points at initialisation : ", fused_point_cloud.shape[0])
 
-        dist2 = torch.clamp_min(distCUDA2(torch.from_numpy(np.asarray(pcd.points)).float().cuda()), 0.0000001)
+        dist2 = torch.clamp_min(knn_dist2(fused_point_cloud), 0.0000001)
         scales = torch.log(torch.sqrt(dist2))[...,None].repeat(1, 3)
-        rots = torch.zeros((fused_point_cloud.shape[0], 4), device="cuda")
+        rots = torch.zeros((fused_point_cloud.shape[0], 4), device=self.device)
         rots[:, 0] = 1
 
-        opacities = inverse_sigmoid(0.1 * torch.ones((fused_point_cloud.shape[0], 1), dtype=torch.float, device="cuda"))
+        opacities = inverse_sigmoid(0.1 * torch.ones((fused_point_cloud.shape[0], 1), dtype=torch.float, device=self.device))
 
         self._xyz = nn.Parameter(fused_point_cloud.requires_grad_(True))
         self._features_dc = nn.Parameter(features[:,:,0:1].transpose(1, 2).contiguous().requires_grad_(True))
@@ -351,20 +375,25 @@ class GaussianModel:
         self._scaling = nn.Parameter(scales.requires_grad_(True))
         self._rotation = nn.Parameter(rots.requires_grad_(True))
         self._opacity = nn.Parameter(opacities.requires_grad_(True))
-        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
+        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device=self.device)
 
     def training_setup(self, training_args):
         self.percent_dense = training_args.percent_dense
-        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device=self.device)
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device=self.device)
+
+        if self.pooled:
+            params = self._init_pool()
+        else:
+            params = {name: getattr(self, attr) for name, attr in PARAM_ATTRS.items()}
 
         l = [
-            {'params': [self._xyz], 'lr': training_args.position_lr_init * self.spatial_lr_scale, "name": "xyz"},
-            {'params': [self._features_dc], 'lr': training_args.feature_lr, "name": "f_dc"},
-            {'params': [self._features_rest], 'lr': training_args.feature_lr / 20.0, "name": "f_rest"},
-            {'params': [self._opacity], 'lr': training_args.opacity_lr, "name": "opacity"},
-            {'params': [self._scaling], 'lr': training_args.scaling_lr, "name": "scaling"},
-            {'params': [self._rotation], 'lr': training_args.rotation_lr, "name": "rotation"}
+            {'params': [params["xyz"]], 'lr': training_args.position_lr_init * self.spatial_lr_scale, "name": "xyz"},
+            {'params': [params["f_dc"]], 'lr': training_args.feature_lr, "name": "f_dc"},
+            {'params': [params["f_rest"]], 'lr': training_args.feature_lr / 20.0, "name": "f_rest"},
+            {'params': [params["opacity"]], 'lr': training_args.opacity_lr, "name": "opacity"},
+            {'params': [params["scaling"]], 'lr': training_args.scaling_lr, "name": "scaling"},
+            {'params': [params["rotation"]], 'lr': training_args.rotation_lr, "name": "rotation"}
         ]
 
         self.optimizer = torch.optim.Adam(l, lr=0.0, eps=1e-15)
@@ -373,6 +402,106 @@ class GaussianModel:
                                                     lr_delay_mult=training_args.position_lr_delay_mult,
                                                     max_steps=training_args.position_lr_max_steps)
 
+    def _init_pool(self):
+        # move the current parameters and stats into pool buffers (no spare rows yet, grown by doubling)
+        self.num_active = self._xyz.shape[0]
+        self.capacity = self.num_active
+
+        if self.max_radii2D.shape[0] != self.num_active:
+            self.max_radii2D = torch.zeros((self.num_active), device=self.device)
+
+        params = {}
+        for name, attr in PARAM_ATTRS.items():
+            params[name] = nn.Parameter(getattr(self, attr).detach().clone().requires_grad_(True))
+        self._stat_pool = {name: getattr(self, name).detach().clone() for name in STAT_ATTRS}
+
+        self._sync_pool_views(params)
+        return params
+
+    def _sync_pool_views(self, params=None):
+        # expose the active rows of the pool buffers as the usual attributes
+        if params is None:
+            params = {group["name"]: group["params"][0] for group in self.optimizer.param_groups}
+        n = self.num_active
+        # views must be created with grad enabled, or no gradient flows back to the buffers
+        with torch.enable_grad():
+            for name, attr in PARAM_ATTRS.items():
+                setattr(self, attr, params[name][:n])
+        for name in STAT_ATTRS:
+            setattr(self, name, self._stat_pool[name][:n])
+
+    @torch.no_grad()
+    def _reserve_pool(self, num):
+        # make sure the buffers can hold `num` rows, doubling the capacity (amortized O(1) growth)
+        if num <= self.capacity:
+            return
+
+        capacity = max(self.capacity, 1)
+        while capacity < num:
+            capacity *= 2
+        n = self.num_active
+
+        def grow(tensor):
+            out = tensor.new_zeros((capacity, *tensor.shape[1:]))
+            out[:n] = tensor[:n]
+            return out
+
+        for group in self.optimizer.param_groups:
+            stored_state = self.optimizer.state.get(group['params'][0], None)
+            new_param = nn.Parameter(grow(group["params"][0]).requires_grad_(True))
+            if stored_state is not None:
+                stored_state["exp_avg"] = grow(stored_state["exp_avg"])
+                stored_state["exp_avg_sq"] = grow(stored_state["exp_avg_sq"])
+                del self.optimizer.state[group['params'][0]]
+                self.optimizer.state[new_param] = stored_state
+            group["params"][0] = new_param
+
+        for name in STAT_ATTRS:
+            self._stat_pool[name] = grow(self._stat_pool[name])
+
+        self.capacity = capacity
+
+    @torch.no_grad()
+    def _append_to_pool(self, tensors_dict):
+        # write new rows after the active ones, with fresh (zero) adam moments
+        n = self.num_active
+        m = tensors_dict["xyz"].shape[0]
+        self._reserve_pool(n + m)
+
+        for group in self.optimizer.param_groups:
+            group["params"][0][n:n + m] = tensors_dict[group["name"]]
+            stored_state = self.optimizer.state.get(group['params'][0], None)
+            if stored_state is not None:
+                stored_state["exp_avg"][n:n + m] = 0
+                stored_state["exp_avg_sq"][n:n + m] = 0
+
+        self.num_active = n + m
+
+    @torch.no_grad()
+    def _compact_pool(self, valid_points_mask):
+        # move kept rows to the front (stable order), zero the freed tail
+        n = self.num_active
+        index = valid_points_mask.nonzero(as_tuple=True)[0]
+        k = index.shape[0]
+
+        def compact(tensor):
+            tensor[:k] = tensor[:n][index]
+            tensor[k:n] = 0
+
+        for group in self.optimizer.param_groups:
+            compact(group["params"][0])
+            group["params"][0].grad = None
+            stored_state = self.optimizer.state.get(group['params'][0], None)
+            if stored_state is not None:
+                compact(stored_state["exp_avg"])
+                compact(stored_state["exp_avg_sq"])
+
+        for name in STAT_ATTRS:
+            compact(self._stat_pool[name])
+
+        self.num_active = k
+        self._sync_pool_views()
+
     def update_learning_rate(self, iteration):
         ''' Learning rate scheduling per step '''
         for param_group in self.optimizer.param_groups:
@@ -452,19 +581,28 @@ class GaussianModel:
         for idx, attr_name in enumerate(rot_names):
             rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
 
-        self._xyz = nn.Parameter(torch.tensor(xyz, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._features_dc = nn.Parameter(torch.tensor(features_dc, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(True))
-        self._features_rest = nn.Parameter(torch.tensor(features_extra, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(True))
-        self._opacity = nn.Parameter(torch.tensor(opacities, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._scaling = nn.Parameter(torch.tensor(scales, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._rotation = nn.Parameter(torch.tensor(rots, dtype=torch.float, device="cuda").requires_grad_(True))
+        self._xyz = nn.Parameter(torch.tensor(xyz, dtype=torch.float, device=self.device).requires_grad_(True))
+        self._features_dc = nn.Parameter(torch.tensor(features_dc, dtype=torch.float, device=self.device).transpose(1, 2).contiguous().requires_grad_(True))
+        self._features_rest = nn.Parameter(torch.tensor(features_extra, dtype=torch.float, device=self.device).transpose(1, 2).contiguous().requires_grad_(True))
+        self._opacity = nn.Parameter(torch.tensor(opacities, dtype=torch.float, device=self.device).requires_grad_(True))
+        self._scaling = nn.Parameter(torch.tensor(scales, dtype=torch.float, device=self.device).requires_grad_(True))
+        self._rotation = nn.Parameter(torch.tensor(rots, dtype=torch.float, device=self.device).requires_grad_(True))
 
         self.active_sh_degree = self.max_sh_degree
 
     def replace_tensor_to_optimizer(self, tensor, name):
         optimizable_tensors = {}
         for group in self.optimizer.param_groups:
-            if group["name"] == name:
+            if group["name"] == name and self.pooled:
+                with torch.no_grad():
+                    group["params"][0][:self.num_active] = tensor
+                stored_state = self.optimizer.state.get(group['params'][0], None)
+                if stored_state is not None:
+                    stored_state["exp_avg"].zero_()
+                    stored_state["exp_avg_sq"].zero_()
+
+                optimizable_tensors[group["name"]] = group["params"][0][:self.num_active]
+            elif group["name"] == name:
                 stored_state = self.optimizer.state.get(group['params'][0], None)
                 stored_state["exp_avg"] = torch.zeros_like(tensor)
                 stored_state["exp_avg_sq"] = torch.zeros_like(tensor)
@@ -496,6 +634,10 @@ class GaussianModel:
 
     def prune_points(self, mask):
         valid_points_mask = ~mask
+        if self.pooled:
+            self._compact_pool(valid_points_mask)
+            return
+
         optimizable_tensors = self._prune_optimizer(valid_points_mask)
 
         self._xyz = optimizable_tensors["xyz"]
@@ -540,6 +682,13 @@ class GaussianModel:
         "scaling" : new_scaling,
         "rotation" : new_rotation}
 
+        if self.pooled:
+            self._append_to_pool(d)
+            for name in STAT_ATTRS:
+                self._stat_pool[name][:self.num_active] = 0
+            self._sync_pool_views()
+            return
+
         optimizable_tensors = self.cat_tensors_to_optimizer(d)
         self._xyz = optimizable_tensors["xyz"]
         self._features_dc = optimizable_tensors["f_dc"]
@@ -548,14 +697,14 @@ class GaussianModel:
         self._scaling = optimizable_tensors["scaling"]
         self._rotation = optimizable_tensors["rotation"]
 
-        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device=self.device)
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device=self.device)
+        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device=self.device)
 
     def densify_and_split(self, grads, grad_threshold, scene_extent, N=2):
         n_init_points = self.get_xyz.shape[0]
         # Extract points that satisfy the gradient condition
-        padded_grad = torch.zeros((n_init_points), device="cuda")
+        padded_grad = torch.zeros((n_init_points), device=self.device)
         padded_grad[:grads.shape[0]] = grads.squeeze()
         selected_pts_mask = torch.where(padded_grad >= grad_threshold, True, False)
         selected_pts_mask = torch.logical_and(selected_pts_mask,
@@ -563,7 +712,7 @@ class GaussianModel:
         )
 
         stds = self.get_scaling[selected_pts_mask].repeat(N,1)
-        means =torch.zeros((stds.size(0), 3),device="cuda")
+        means =torch.zeros((stds.size(0), 3),device=self.device)
         samples = torch.normal(mean=means, std=stds)
         rots = build_rotation(self._rotation[selected_pts_mask]).repeat(N,1,1)
         new_xyz = torch.bmm(rots, samples.unsqueeze(-1)).squeeze(-1) + self.get_xyz[selected_pts_mask].repeat(N, 1)
@@ -575,7 +724,7 @@ class GaussianModel:
 
         self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacity, new_scaling, new_rotation)
 
-        prune_filter = torch.cat((selected_pts_mask, torch.zeros(N * selected_pts_mask.sum(), device="cuda", dtype=bool)))
+        prune_filter = torch.cat((selected_pts_mask, torch.zeros(N * selected_pts_mask.sum(), device=self.device, dtype=bool)))
         self.prune_points(prune_filter)
 
     def densify_and_clone(self, grads, grad_threshold, scene_extent):
@@ -643,7 +792,7 @@ def getProjectionMatrix(znear, zfar, fovX, fovY):
 
 
 class MiniCam:
-    def __init__(self, c2w, width, height, fovy, fovx, znear, zfar):
+    def __init__(self, c2w, width, height, fovy, fovx, znear, zfar, device=None):
         # c2w (pose) should be in NeRF convention.
 
         self.image_width = width
@@ -659,31 +808,73 @@ class MiniCam:
         w2c[1:3, :3] *= -1
         w2c[:3, 3] *= -1
 
-        self.world_view_transform = torch.tensor(w2c).transpose(0, 1).cuda()
+        device = device if device is not None else default_device()
+
+        self.world_view_transform = torch.tensor(w2c).transpose(0, 1).to(device)
         self.projection_matrix = (
             getProjectionMatrix(
                 znear=self.znear, zfar=self.zfar, fovX=self.FoVx, fovY=self.FoVy
             )
             .transpose(0, 1)
-            .cuda()
+            .to(device)
         )
         self.full_proj_transform = self.world_view_transform @ self.projection_matrix
-        self.camera_center = -torch.tensor(c2w[:3, 3]).cuda()
+        self.camera_center = -torch.tensor(c2w[:3, 3]).to(device)
+
+
+class MiniCams:
+    # a batch of MiniCam sharing the resolution and fov, for Renderer.render_batch:
+    # world_view_transform / full_proj_transform [N, 4, 4] and camera_center [N, 3] are built with batched tensor ops.
+    def __init__(self, c2ws, width, height, fovy, fovx, znear, zfar, device=None):
+        # c2ws: [N, 4, 4] numpy array or tensor (e.g. from cam_utils.orbit_cameras), NeRF convention like MiniCam
+
+        self.image_width = width
+        self.image_height = height
+        self.FoVy = fovy
+        self.FoVx = fovx
+        self.znear = znear
+        self.zfar = zfar
+
+        device = device if device is not None else default_device()
+        c2ws = torch.as_tensor(c2ws, dtype=torch.float32).to(device)
+
+        w2cs = torch.linalg.inv(c2ws)
+
+        # rectify...
+        w2cs[:, 1:3, :3] *= -1
+        w2cs[:, :3, 3] *= -1
+
+        self.world_view_transform = w2cs.transpose(1, 2)
+        self.projection_matrix = (
+            getProjectionMatrix(
+                znear=self.znear, zfar=self.zfar, fovX=self.FoVx, fovY=self.FoVy
+            )
+            .transpose(0, 1)
+            .to(device)
+        )
+        self.full_proj_transform = self.world_view_transform @ self.projection_matrix
+        self.camera_center = -c2ws[:, :3, 3]
+
+    def __len__(self):
+        return self.world_view_transform.shape[0]
 
 
 class Renderer:
-    def __init__(self, sh_degree=3, white_background=True, radius=1):
+    def __init__(self, sh_degree=3, white_background=True, radius=1, pooled=False, device=None, backend=None):
         
         self.sh_degree = sh_degree
         self.white_background = white_background
         self.radius = radius
+        self.device = torch.device(device) if device is not None else default_device()
+        # rasterizer backend, see gs_rasterizer.RASTERIZERS
+        self.backend = backend if backend is not None else default_backend(self.device)
 
-        self.gaussians = GaussianModel(sh_degree)
+        self.gaussians = GaussianModel(sh_degree, pooled=pooled, device=self.device)
 
         self.bg_color = torch.tensor(
             [1, 1, 1] if white_background else [0, 0, 0],
             dtype=torch.float32,
-            device="cuda",
+            device=self.device,
         )
     
     def initialize(self, input=None, num_pts=5000, radius=0.5):
@@ -729,7 +920,7 @@ class Renderer:
                 self.gaussians.get_xyz,
                 dtype=self.gaussians.get_xyz.dtype,
                 requires_grad=True,
-                device="cuda",
+                device=self.device,
             )
             + 0
         )
@@ -757,7 +948,7 @@ class Renderer:
             debug=False,
         )
 
-        rasterizer = GaussianRasterizer(raster_settings=raster_settings)
+        rasterizer = get_rasterizer(self.backend, raster_settings)
 
         means3D = self.gaussians.get_xyz
         means2D = screenspace_points
@@ -787,7 +978,7 @@ class Renderer:
                     self.gaussians.get_features.shape[0], 1
                 )
                 dir_pp_normalized = dir_pp / dir_pp.norm(dim=1, keepdim=True)
-                sh2rgb = eval_sh(
+                sh2rgb = eval_sh_fused(
                     self.gaussians.active_sh_degree, shs_view, dir_pp_normalized
                 )
                 colors_precomp = torch.clamp_min(sh2rgb + 0.5, 0.0)
@@ -820,3 +1011,91 @@ class Renderer:
             "visibility_filter": radii > 0,
             "radii": radii,
         }
+
+    def render_batch(
+        self,
+        cameras,
+        scaling_modifier=1.0,
+        bg_color=None,
+    ):
+        # cameras: list of MiniCam sharing the same resolution and fov, or a camera with stacked
+        # world_view_transform / full_proj_transform [V, 4, 4] and camera_center [V, 3].
+        # bg_color: [3] or [V, 3]
+        # the per-gaussian work (activations, 3D covariance, SH -> RGB for all views at once) is done once,
+        # only the projection and rasterization run per view.
+        if isinstance(cameras, (list, tuple)):
+            cam = cameras[0]
+            viewmatrices = torch.stack([c.world_view_transform for c in cameras])
+            projmatrices = torch.stack([c.full_proj_transform for c in cameras])
+            campos = torch.stack([c.camera_center for c in cameras])
+        else:
+            cam = cameras
+            viewmatrices, projmatrices, campos = cam.world_view_transform, cam.full_proj_transform, cam.camera_center
+        V = viewmatrices.shape[0]
+
+        if bg_color is None:
+            bg_color = self.bg_color
+        bg_color = bg_color.expand(V, 3)
+
+        means3D = self.gaussians.get_xyz
+        opacity = self.gaussians.get_opacity
+        cov3D_precomp = self.gaussians.get_covariance(scaling_modifier)
+
+        # SH -> RGB, [V, N, 3]
+        shs_view = self.gaussians.get_features.transpose(1, 2)
+        dirs = means3D.unsqueeze(0) - campos.to(means3D.dtype).unsqueeze(1)
+        dirs = dirs / dirs.norm(dim=-1, keepdim=True)
+        colors_precomp = torch.clamp_min(eval_sh_fused(self.gaussians.active_sh_degree, shs_view, dirs) + 0.5, 0.0)
+        colors_precomp = colors_precomp.expand(V, -1, -1) # degree 0 is view independent
+
+        tanfovx = math.tan(cam.FoVx * 0.5)
+        tanfovy = math.tan(cam.FoVy * 0.5)
+
+        images, depths, alphas, radiis, screenspace_points = [], [], [], [], []
+        for i in range(V):
+            # one screen-space tensor per view, for the densification stats
+            points = torch.zeros_like(means3D, requires_grad=True) + 0
+            try:
+                points.retain_grad()
+            except:
+                pass
+
+            raster_settings = GaussianRasterizationSettings(
+                image_height=int(cam.image_height),
+                image_width=int(cam.image_width),
+                tanfovx=tanfovx,
+                tanfovy=tanfovy,
+                bg=bg_color[i],
+                scale_modifier=scaling_modifier,
+                viewmatrix=viewmatrices[i],
+                projmatrix=projmatrices[i],
+                sh_degree=self.gaussians.active_sh_degree,
+                campos=campos[i],
+                prefiltered=False,
+                debug=False,
+            )
+            rasterizer = get_rasterizer(self.backend, raster_settings)
+
+            image, radii, depth, alpha = rasterizer(
+                means3D=means3D,
+                means2D=points,
+                opacities=opacity,
+                colors_precomp=colors_precomp[i],
+                cov3D_precomp=cov3D_precomp,
+            )
+            images.append(image.clamp(0, 1))
+            depths.append(depth)
+            alphas.append(alpha)
+            radiis.append(radii)
+            screenspace_points.append(points)
+
+        radii = torch.stack(radiis)
+
+        return {
+            "image": torch.stack(images), # [V, 3, H, W]
+            "depth": torch.stack(depths), # [V, 1, H, W]
+            "alpha": torch.stack(alphas), # [V, 1, H, W]
+            "viewspace_points": screenspace_points, # list of V [N, 3]
+            "visibility_filter": radii > 0, # [V, N]
+            "radii": radii, # [V, N]
+        }
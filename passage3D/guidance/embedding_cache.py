@@ -0,0 +1,76 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class EmbeddingCache:
+    # conditioning embeddings of the guidance models (text encoder, clip image encoder, vae encoding of the reference image),
+    # keyed by model, prompt text or image hash and resolution.
+    # entries are kept as fp16 cpu tensors in a memory lru and on disk, so repeated prompts / images skip the encoders.
+    #   key = cache.key(self.model_key, "text", prompts, negative_prompts)
+    #   embeddings = cache.get(key, self.device, self.dtype) # None on a miss
+    #   cache.put(key, {"pos": pos_embeds, "neg": neg_embeds})
+    def __init__(self, cache_dir=None, max_items=32):
+        # cache_dir: directory of the .pt files, None (or empty, as left in a config) to only cache in memory
+        # max_items: number of entries kept in memory
+        self.cache_dir = cache_dir or None
+        self.max_items = max_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        # parts: strings, lists of prompts, numbers or tensors (hashed by shape and content)
+        h = hashlib.sha1()
+        for part in parts:
+            if torch.is_tensor(part):
+                part = part.detach().float().contiguous().cpu()
+                h.update(f"tensor {tuple(part.shape)}".encode())
+                h.update(part.numpy().tobytes())
+            else:
+                h.update(repr(part).encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".pt")
+
+    def remember(self, key, embeddings):
+        with self.lock:
+            self.memory[key] = embeddings
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_items:
+                self.memory.popitem(last=False)
+
+    def get(self, key, device, dtype):
+        # return: {name: tensor} on device with dtype, or None
+        with self.lock:
+            embeddings = self.memory.get(key)
+            if embeddings is not None:
+                self.memory.move_to_end(key)
+
+        if embeddings is None and self.cache_dir is not None and os.path.exists(self.path(key)):
+            try:
+                embeddings = torch.load(self.path(key), map_location="cpu")
+            except Exception:
+                # partially written or corrupted file, recompute
+                return None
+            self.remember(key, embeddings)
+
+        if embeddings is None:
+            return None
+        return {name: x.to(device=device, dtype=dtype) for name, x in embeddings.items()}
+
+    def put(self, key, embeddings):
+        # embeddings: {name: tensor}
+        embeddings = {name: x.detach().to(device="cpu", dtype=torch.float16) for name, x in embeddings.items()}
+        self.remember(key, embeddings)
+        if self.cache_dir is not None:
+            tmp = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            torch.save(embeddings, tmp)
+            os.replace(tmp, self.path(key))
@@ -37,6 +37,8 @@ class ImageDream(nn.Module):
 
         self.image_embeddings = {}
         self.embeddings = {}
+        # guidance.embedding_cache.EmbeddingCache, set by the caller
+        self.embedding_cache = None
 
         self.scheduler = DDIMScheduler.from_pretrained(
             "stabilityai/stable-diffusion-2-1-base", subfolder="scheduler", torch_dtype=self.dtype
@@ -46,6 +48,20 @@ class ImageDream(nn.Module):
     def get_image_text_embeds(self, image, prompts, negative_prompts):
 
         image = F.interpolate(image, (256, 256), mode='bilinear', align_corners=False)
+
+        if self.embedding_cache is not None:
+            key = self.embedding_cache.key(self.model_name, self.ckpt_path, "image_text", image, prompts, negative_prompts)
+            embeddings = self.embedding_cache.get(key, self.device, self.dtype)
+            if embeddings is not None:
+                # the negative image embeddings are zeros
+                self.image_embeddings['pos'] = embeddings['image']
+                self.image_embeddings['neg'] = torch.zeros_like(embeddings['image'])
+                self.image_embeddings['ip_img'] = embeddings['ip_img']
+                self.image_embeddings['neg_ip_img'] = torch.zeros_like(embeddings['ip_img'])
+                self.embeddings['pos'] = embeddings['pos']
+                self.embeddings['neg'] = embeddings['neg']
+                return
+
         image_pil = TF.to_pil_image(image[0])
         image_embeddings = self.model.get_learned_image_conditioning(image_pil).repeat(5,1,1) # [5, 257, 1280]
         self.image_embeddings['pos'] = image_embeddings
@@ -58,6 +74,14 @@ class ImageDream(nn.Module):
         neg_embeds = self.encode_text(negative_prompts).repeat(5,1,1)
         self.embeddings['pos'] = pos_embeds
         self.embeddings['neg'] = neg_embeds
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(key, {
+                'image': self.image_embeddings['pos'],
+                'ip_img': self.image_embeddings['ip_img'],
+                'pos': pos_embeds,
+                'neg': neg_embeds,
+            })
     
     def encode_text(self, prompt):
         # prompt: [str]
@@ -35,6 +35,8 @@ class MVDream(nn.Module):
         self.max_step = int(self.num_train_timesteps * t_range[1])
 
         self.embeddings = {}
+        # guidance.embedding_cache.EmbeddingCache, set by the caller
+        self.embedding_cache = None
 
         self.scheduler = DDIMScheduler.from_pretrained(
             "stabilityai/stable-diffusion-2-1-base", subfolder="scheduler", torch_dtype=self.dtype
@@ -42,10 +44,20 @@ class MVDream(nn.Module):
 
     @torch.no_grad()
     def get_text_embeds(self, prompts, negative_prompts):
+        if self.embedding_cache is not None:
+            key = self.embedding_cache.key(self.model_name, self.ckpt_path, "text", prompts, negative_prompts)
+            embeddings = self.embedding_cache.get(key, self.device, self.dtype)
+            if embeddings is not None:
+                self.embeddings = embeddings
+                return
+
         pos_embeds = self.encode_text(prompts).repeat(4,1,1)  # [1, 77, 768]
         neg_embeds = self.encode_text(negative_prompts).repeat(4,1,1)
         self.embeddings['pos'] = pos_embeds
         self.embeddings['neg'] = neg_embeds
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(key, self.embeddings)
     
     def encode_text(self, prompt):
         # prompt: [str]
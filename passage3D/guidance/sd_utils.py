@@ -47,11 +47,13 @@ class StableDiffusion(nn.Module):
                 f"Stable-diffusion version {self.sd_version} not supported."
             )
 
+        self.model_key = model_key
         self.dtype = torch.float16 if fp16 else torch.float32
 
         # Create model
+        # weights are memory-mapped from the safetensors files and not copied once more on cpu
         pipe = StableDiffusionPipeline.from_pretrained(
-            model_key, torch_dtype=self.dtype
+            model_key, torch_dtype=self.dtype, low_cpu_mem_usage=True
         )
 
         if vram_O:
@@ -80,9 +82,18 @@ class StableDiffusion(nn.Module):
         self.alphas = self.scheduler.alphas_cumprod.to(self.device)  # for convenience
 
         self.embeddings = {}
+        # guidance.embedding_cache.EmbeddingCache, set by the caller
+        self.embedding_cache = None
 
     @torch.no_grad()
     def get_text_embeds(self, prompts, negative_prompts):
+        if self.embedding_cache is not None:
+            key = self.embedding_cache.key(self.model_key, "text", prompts, negative_prompts)
+            embeddings = self.embedding_cache.get(key, self.device, self.dtype)
+            if embeddings is not None:
+                self.embeddings = embeddings
+                return
+
         pos_embeds = self.encode_text(prompts)  # [1, 77, 768]
         neg_embeds = self.encode_text(negative_prompts)
         self.embeddings['pos'] = pos_embeds
@@ -92,6 +103,9 @@ class StableDiffusion(nn.Module):
         for d in ['front', 'side', 'back']:
             embeds = self.encode_text([f'{p}, {d} view' for p in prompts])
             self.embeddings[d] = embeds
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(key, self.embeddings)
     
     def encode_text(self, prompt):
         # prompt: [str]
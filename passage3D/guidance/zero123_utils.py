@@ -13,10 +13,11 @@ from zero123 import Zero123Pipeline
 
 
 class Zero123(nn.Module):
-    def __init__(self, device, fp16=True, t_range=[0.02, 0.98], model_key="ashawkey/zero123-xl-diffusers"):
+    def __init__(self, device, fp16=True, t_range=[0.02, 0.98], model_key="ashawkey/zero123-xl-diffusers", vram_O=False):
         super().__init__()
 
         self.device = device
+        self.model_key = model_key
         self.fp16 = fp16
         self.dtype = torch.float16 if fp16 else torch.float32
 
@@ -25,11 +26,20 @@ class Zero123(nn.Module):
         # model_key = "ashawkey/zero123-xl-diffusers"
         # model_key = './model_cache/stable_zero123_diffusers'
 
+        # weights are memory-mapped from the safetensors files and not copied once more on cpu
         self.pipe = Zero123Pipeline.from_pretrained(
             model_key,
             torch_dtype=self.dtype,
             trust_remote_code=True,
-        ).to(self.device)
+            low_cpu_mem_usage=True,
+        )
+
+        if vram_O:
+            # modules stay on cpu and are moved to the gpu when called
+            self.pipe.enable_sequential_cpu_offload(gpu_id=torch.device(device).index or 0)
+            self.pipe.clip_camera_projection.to(self.device)
+        else:
+            self.pipe.to(self.device)
 
         # stable-zero123 has a different camera embedding
         self.use_stable_zero123 = 'stable' in model_key
@@ -52,16 +62,29 @@ class Zero123(nn.Module):
         self.alphas = self.scheduler.alphas_cumprod.to(self.device) # for convenience
 
         self.embeddings = None
+        # guidance.embedding_cache.EmbeddingCache, set by the caller
+        self.embedding_cache = None
 
     @torch.no_grad()
     def get_img_embeds(self, x):
         # x: image tensor in [0, 1]
         x = F.interpolate(x, (256, 256), mode='bilinear', align_corners=False)
+
+        if self.embedding_cache is not None:
+            key = self.embedding_cache.key(self.model_key, "image", x)
+            embeddings = self.embedding_cache.get(key, self.device, self.dtype)
+            if embeddings is not None:
+                self.embeddings = [embeddings['clip'], embeddings['vae']]
+                return
+
         x_pil = [TF.to_pil_image(image) for image in x]
         x_clip = self.pipe.feature_extractor(images=x_pil, return_tensors="pt").pixel_values.to(device=self.device, dtype=self.dtype)
         c = self.pipe.image_encoder(x_clip).image_embeds
         v = self.encode_imgs(x.to(self.dtype)) / self.vae.config.scaling_factor
         self.embeddings = [c, v]
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(key, {'clip': c, 'vae': v})
     
     def get_cam_embeddings(self, elevation, azimuth, radius, default_elevation=0):
         if self.use_stable_zero123:
@@ -0,0 +1,259 @@
+import os
+import time
+import json
+import sqlite3
+import threading
+import traceback
+
+# stage -> worker pool, heavy training stages share the gpu pool, the others overlap with them on cpu workers
+STAGE_CLASSES = {
+    "segment": "cpu",
+    "stage1": "gpu",
+    "stage2": "gpu",
+    "video": "cpu",
+}
+
+
+class JobQueue:
+    # persistent queue of (asset, stage) jobs in a sqlite database.
+    # a job becomes ready when the previous stage of the same asset is done, so stages of different assets can run concurrently.
+    # status: pending -> running -> done, or back to pending on failure until max_attempts, then failed.
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # one connection shared by the worker threads, serialized by a lock
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                asset TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                after INTEGER,
+                payload TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                error TEXT,
+                duration REAL,
+                updated REAL,
+                UNIQUE (asset, stage)
+            )"""
+        )
+
+    def add(self, asset, stages, payload=None, max_attempts=3, fresh=False):
+        # enqueue the stages of an asset in order. resubmitting an asset updates its payload and queues its failed jobs again,
+        # with fresh=True its done jobs too (unchanged stages are then restored by the artifact cache), otherwise they are kept.
+        reset = "status = 'failed' OR (? AND status = 'done')"
+        with self.lock:
+            after = None
+            for stage in stages:
+                self.db.execute(
+                    f"""INSERT INTO jobs (asset, stage, after, payload, max_attempts, updated) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (asset, stage) DO UPDATE SET
+                    after = excluded.after, payload = excluded.payload, max_attempts = excluded.max_attempts, updated = excluded.updated,
+                    status = CASE WHEN {reset} THEN 'pending' ELSE status END,
+                    attempts = CASE WHEN {reset} THEN 0 ELSE attempts END,
+                    error = CASE WHEN {reset} THEN NULL ELSE error END""",
+                    (asset, stage, after, json.dumps(payload), max_attempts, time.time(), fresh, fresh, fresh),
+                )
+                after = self.db.execute("SELECT id FROM jobs WHERE asset = ? AND stage = ?", (asset, stage)).fetchone()[0]
+
+    def recover(self):
+        # jobs left running by a crashed scheduler go back to the queue
+        with self.lock:
+            return self.db.execute("UPDATE jobs SET status = 'pending', updated = ? WHERE status = 'running'", (time.time(),)).rowcount
+
+    def claim(self, stages):
+        # atomically take the oldest ready job among the given stages, return (id, asset, stage, payload) or None
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                # jobs after a failed one can never run
+                self.db.execute(
+                    """UPDATE jobs SET status = 'failed', error = 'previous stage failed', updated = ?
+                    WHERE status = 'pending' AND after IN (SELECT id FROM jobs WHERE status = 'failed')""",
+                    (time.time(),),
+                )
+                row = self.db.execute(
+                    f"""SELECT j.id, j.asset, j.stage, j.payload FROM jobs j LEFT JOIN jobs p ON j.after = p.id
+                    WHERE j.status = 'pending' AND j.stage IN ({','.join('?' * len(stages))}) AND (j.after IS NULL OR p.status = 'done')
+                    ORDER BY j.id LIMIT 1""",
+                    tuple(stages),
+                ).fetchone()
+                if row is not None:
+                    self.db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                        (time.time(), row[0]),
+                    )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return row[0], row[1], row[2], json.loads(row[3])
+
+    def complete(self, job_id, duration=None):
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = 'done', error = NULL, duration = ?, updated = ? WHERE id = ?",
+                (duration, time.time(), job_id),
+            )
+
+    def fail(self, job_id, error):
+        # retry until max_attempts
+        with self.lock:
+            self.db.execute(
+                """UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                error = ?, updated = ? WHERE id = ?""",
+                (error, time.time(), job_id),
+            )
+
+    def active(self, stages=None):
+        # number of jobs that are pending or running.
+        # stages: only count the running jobs and the pending jobs of these stages that do not wait on a pending job of another stage
+        # (the jobs that workers serving these stages can still make progress on)
+        with self.lock:
+            if stages is None:
+                return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+            marks = ','.join('?' * len(stages))
+            return self.db.execute(
+                f"""SELECT COUNT(*) FROM jobs j LEFT JOIN jobs p ON j.after = p.id
+                WHERE j.status = 'running' OR (j.status = 'pending' AND j.stage IN ({marks})
+                AND (j.after IS NULL OR p.status != 'pending' OR p.stage IN ({marks})))""",
+                tuple(stages) * 2,
+            ).fetchone()[0]
+
+    def pending_stages(self):
+        # stages of the jobs that are pending or running
+        with self.lock:
+            return [row[0] for row in self.db.execute("SELECT DISTINCT stage FROM jobs WHERE status IN ('pending', 'running')").fetchall()]
+
+    def summary(self):
+        # {status: count}
+        with self.lock:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def jobs(self, asset=None):
+        with self.lock:
+            query = "SELECT asset, stage, status, attempts, duration, error FROM jobs"
+            rows = self.db.execute(query + " WHERE asset = ? ORDER BY id" if asset else query + " ORDER BY id", (asset,) if asset else ()).fetchall()
+        return [dict(zip(("asset", "stage", "status", "attempts", "duration", "error"), row)) for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+class Scheduler:
+    # run the jobs of a JobQueue with one worker pool (threads) per stage class.
+    #   queue = JobQueue("logs/jobs.db"); queue.add("cat", STAGES, {"path": "data/cat.png"})
+    #   Scheduler(queue, lambda stage, asset, payload: pipeline.run_stage(stage, payload["path"], asset)).run()
+    def __init__(self, queue, runner, stage_classes=STAGE_CLASSES, workers=None, poll_interval=0.05, verbose=True):
+        # runner: callable (stage, asset, payload), raises on failure
+        # workers: number of threads per stage class, default 2 cpu and 1 gpu
+        self.queue = queue
+        self.runner = runner
+        self.stage_classes = stage_classes
+        self.workers = workers if workers is not None else {"cpu": 2, "gpu": 1}
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+
+    def served_stages(self):
+        # stages of the pools with at least one worker
+        return [stage for stage, cls in self.stage_classes.items() if self.workers.get(cls, 0) > 0]
+
+    def worker(self, stages):
+        served = self.served_stages()
+        while True:
+            job = self.queue.claim(stages)
+            if job is None:
+                # running jobs of other pools may still unlock ours, jobs no pool serves never will
+                if self.queue.active(served) == 0:
+                    return
+                time.sleep(self.poll_interval)
+                continue
+
+            job_id, asset, stage, payload = job
+            t0 = time.perf_counter()
+            try:
+                self.runner(stage, asset, payload)
+            except Exception:
+                self.queue.fail(job_id, traceback.format_exc())
+                if self.verbose:
+                    print(f"[WARN] job {asset}/{stage} failed:\n{traceback.format_exc()}")
+            else:
+                self.queue.complete(job_id, time.perf_counter() - t0)
+                if self.verbose:
+                    print(f"[INFO] job {asset}/{stage} done in {time.perf_counter() - t0:.2f}s")
+
+    def run(self):
+        # process the queue until no job is pending or running, return the status summary
+        recovered = self.queue.recover()
+        if recovered and self.verbose:
+            print(f"[INFO] resuming {recovered} interrupted jobs")
+
+        unserved = sorted(set(self.queue.pending_stages()) - set(self.served_stages()))
+        if unserved:
+            raise ValueError(f"no worker for the stages {unserved} (stage classes {self.stage_classes}, workers {self.workers})")
+
+        threads = []
+        for cls, num in self.workers.items():
+            stages = [stage for stage, c in self.stage_classes.items() if c == cls]
+            if not stages:
+                continue
+            for i in range(num):
+                thread = threading.Thread(target=self.worker, args=(stages,), name=f"{cls}-{i}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        return self.queue.summary()
+
+
+if __name__ == "__main__":
+    import glob
+    import argparse
+    from omegaconf import OmegaConf
+
+    from artifact_cache import ArtifactCache
+    from pipeline import Pipeline, STAGES, image_name
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default="data", type=str, help="directory of the input images")
+    parser.add_argument("--config", default="configs/image.yaml", type=str)
+    parser.add_argument("--db", default="logs/jobs.db", type=str, help="queue database, rerun with the same path to resume")
+    parser.add_argument("--fresh", action="store_true", help="run the done jobs of the images again (unchanged stages are restored from the cache)")
+    parser.add_argument("--stages", default=list(STAGES), type=str, nargs="+")
+    parser.add_argument("--video_dir", default="videos", type=str)
+    parser.add_argument("--cpu_workers", default=2, type=int)
+    parser.add_argument("--gpu_workers", default=1, type=int)
+    parser.add_argument("--max_attempts", default=2, type=int)
+    parser.add_argument("--cache_dir", default="logs/cache", type=str, help="artifact cache of unchanged stages, empty to disable")
+    parser.add_argument("--cache_size", default=20, type=float, help="artifact cache size limit in GB")
+    args, extras = parser.parse_known_args()
+
+    opt = OmegaConf.merge(OmegaConf.load(args.config), OmegaConf.from_cli(extras))
+    cache = ArtifactCache(args.cache_dir, max_bytes=int(args.cache_size * 2 ** 30)) if args.cache_dir else None
+    pipeline = Pipeline(opt, stages=args.stages, video_dir=args.video_dir, cache=cache)
+
+    files = sorted(f for f in glob.glob(f"{args.dir}/*") if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    # raw images and their segmentation: keep the raw one when segmenting, the *_rgba.png otherwise
+    rgba = [f for f in files if f.endswith("_rgba.png")]
+    files = [f for f in files if not f.endswith("_rgba.png")] if "segment" in args.stages else rgba
+
+    queue = JobQueue(args.db)
+    for f in files:
+        queue.add(image_name(f), args.stages, {"path": f}, max_attempts=args.max_attempts, fresh=args.fresh)
+
+    scheduler = Scheduler(
+        queue,
+        lambda stage, asset, payload: pipeline.run_stage(stage, payload["path"], asset),
+        workers={"cpu": args.cpu_workers, "gpu": args.gpu_workers},
+    )
+    print(f"[INFO] jobs: {scheduler.run()}")
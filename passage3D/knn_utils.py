@@ -0,0 +1,36 @@
+import numpy as np
+import torch
+from scipy.spatial import cKDTree
+
+try:
+    from simple_knn._C import distCUDA2
+except ImportError:
+    # simple-knn is a CUDA-only extension, fallback to the kd-tree version below
+    distCUDA2 = None
+
+
+def distCPU2(points, k=3):
+    # points: [N, 3] torch.Tensor or np.ndarray
+    # return: [N] float32 torch.Tensor, mean squared distance to the k nearest neighbours
+    # (same quantity as simple_knn's distCUDA2, on the device of the input)
+    device = points.device if torch.is_tensor(points) else torch.device("cpu")
+    if torch.is_tensor(points):
+        points = points.detach().cpu().numpy()
+    points = np.ascontiguousarray(points, dtype=np.float32)
+
+    # query k + 1 since the closest point is the query itself (or a duplicate at distance 0)
+    dists, _ = cKDTree(points).query(points, k=k + 1, workers=-1)
+    dists = dists[:, 1:].astype(np.float32) ** 2
+
+    # less than k neighbours: simple-knn leaves FLT_MAX in the missing slots
+    dists = np.nan_to_num(dists, posinf=np.finfo(np.float32).max)
+
+    return torch.from_numpy(dists.mean(axis=-1, dtype=np.float32)).to(device)
+
+
+def dist2(points):
+    # points: [N, 3] torch.Tensor
+    # use the cuda kernel when possible, else the cpu kd-tree.
+    if distCUDA2 is not None and points.is_cuda:
+        return distCUDA2(points.float().contiguous())
+    return distCPU2(points)
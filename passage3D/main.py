@@ -10,11 +10,15 @@ import torch.nn.functional as F
 
 import rembg
 
-from cam_utils import orbit_camera, OrbitCamera
-from gs_renderer import Renderer, MiniCam
+from cam_utils import orbit_camera, orbit_cameras, OrbitCamera
+from gs_renderer import Renderer, MiniCam, MiniCams
 
-from grid_put import mipmap_linear_grid_put_2d
-from mesh import Mesh, safe_normalize
+from texture_bake import TextureBaker
+from mesh import Mesh
+from view_sampler import ViewSampler
+from profiler import StepProfiler
+from guidance.embedding_cache import EmbeddingCache
+from model_registry import registry
 
 class GUI:
     def __init__(self, opt):
@@ -31,7 +35,7 @@ class GUI:
         self.need_update = True  # update buffer_image
 
         # models
-        self.device = torch.device("cuda")
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.bg_remover = None
 
         self.guidance_sd = None
@@ -41,7 +45,7 @@ class GUI:
         self.enable_zero123 = False
 
         # renderer
-        self.renderer = Renderer(sh_degree=self.opt.sh_degree)
+        self.renderer = Renderer(sh_degree=self.opt.sh_degree, pooled=self.opt.pooled_gaussians, device=self.device)
         self.gaussain_scale_factor = 1
 
         # input image
@@ -61,6 +65,8 @@ class GUI:
         self.optimizer = None
         self.step = 0
         self.train_steps = 1  # steps per rendering loop
+        # time of the preview frames (cuda events on gpu, time.perf_counter on cpu)
+        self.frame_timer = StepProfiler(self.device, enabled=False)
         
         # load input data from cmdline
         if self.opt.input is not None:
@@ -113,6 +119,13 @@ class GUI:
         self.renderer.gaussians.active_sh_degree = self.renderer.gaussians.max_sh_degree
         self.optimizer = self.renderer.gaussians.optimizer
 
+        # camera schedule of the novel views
+        seed = self.opt.view_seed if self.opt.view_seed is not None else np.random.randint(0, 2 ** 31)
+        self.view_sampler = ViewSampler.from_opt(self.opt, seed=seed)
+
+        # per-phase timing of the steps (only the step time without opt.profile)
+        self.profiler = StepProfiler(self.device, enabled=self.opt.profile)
+
         # default camera
         if self.opt.mvdream or self.opt.imagedream:
             # the second view is the front view for mvdream/imagedream.
@@ -134,30 +147,24 @@ class GUI:
 
         # lazy load guidance model
         if self.guidance_sd is None and self.enable_sd:
+            # loaded once per process by the registry
             if self.opt.mvdream:
-                print(f"[INFO] loading MVDream...")
-                from guidance.mvdream_utils import MVDream
-                self.guidance_sd = MVDream(self.device)
-                print(f"[INFO] loaded MVDream!")
+                self.guidance_sd = registry.get("mvdream", self.device)
             elif self.opt.imagedream:
-                print(f"[INFO] loading ImageDream...")
-                from guidance.imagedream_utils import ImageDream
-                self.guidance_sd = ImageDream(self.device)
-                print(f"[INFO] loaded ImageDream!")
+                self.guidance_sd = registry.get("imagedream", self.device)
             else:
-                print(f"[INFO] loading SD...")
-                from guidance.sd_utils import StableDiffusion
-                self.guidance_sd = StableDiffusion(self.device)
-                print(f"[INFO] loaded SD!")
+                self.guidance_sd = registry.get("sd", self.device, offload=self.opt.guidance_offload)
 
         if self.guidance_zero123 is None and self.enable_zero123:
-            print(f"[INFO] loading zero123...")
-            from guidance.zero123_utils import Zero123
             if self.opt.stable_zero123:
-                self.guidance_zero123 = Zero123(self.device, model_key='ashawkey/stable-zero123-diffusers')
+                self.guidance_zero123 = registry.get("zero123", self.device, model_key='ashawkey/stable-zero123-diffusers', offload=self.opt.guidance_offload)
             else:
-                self.guidance_zero123 = Zero123(self.device, model_key='ashawkey/zero123-xl-diffusers')
-            print(f"[INFO] loaded zero123!")
+                self.guidance_zero123 = registry.get("zero123", self.device, model_key='ashawkey/zero123-xl-diffusers', offload=self.opt.guidance_offload)
+
+        # embeddings of already seen prompts / images are reused (the cache stays with the models shared by the pipeline)
+        for guidance in (self.guidance_sd, self.guidance_zero123):
+            if guidance is not None and getattr(guidance, "embedding_cache", None) is None:
+                guidance.embedding_cache = EmbeddingCache(self.opt.embedding_cache_dir)
 
         # input image
         if self.input_img is not None:
@@ -180,14 +187,13 @@ class GUI:
                 self.guidance_zero123.get_img_embeds(self.input_img_torch)
 
     def train_step(self):
-        starter = torch.cuda.Event(enable_timing=True)
-        ender = torch.cuda.Event(enable_timing=True)
-        starter.record()
+        t = 0
 
         for _ in range(self.train_steps):
 
             self.step += 1
             step_ratio = min(1, self.step / self.opt.iters)
+            self.profiler.begin_step(self.step)
 
             # update lr
             self.renderer.gaussians.update_learning_rate(self.step)
@@ -196,99 +202,75 @@ class GUI:
 
             ### known view
             if self.input_img_torch is not None and not self.opt.imagedream:
-                cur_cam = self.fixed_cam
-                out = self.renderer.render(cur_cam)
+                with self.profiler.span("reference loss"):
+                    cur_cam = self.fixed_cam
+                    out = self.renderer.render(cur_cam)
 
-                # rgb loss
-                image = out["image"].unsqueeze(0) # [1, 3, H, W] in [0, 1]
-                loss = loss + 10000 * (step_ratio if self.opt.warmup_rgb_loss else 1) * F.mse_loss(image, self.input_img_torch)
+                    # rgb loss
+                    image = out["image"].unsqueeze(0) # [1, 3, H, W] in [0, 1]
+                    loss = loss + 10000 * (step_ratio if self.opt.warmup_rgb_loss else 1) * F.mse_loss(image, self.input_img_torch)
 
-                # mask loss
-                mask = out["alpha"].unsqueeze(0) # [1, 1, H, W] in [0, 1]
-                loss = loss + 1000 * (step_ratio if self.opt.warmup_rgb_loss else 1) * F.mse_loss(mask, self.input_mask_torch)
+                    # mask loss
+                    mask = out["alpha"].unsqueeze(0) # [1, 1, H, W] in [0, 1]
+                    loss = loss + 1000 * (step_ratio if self.opt.warmup_rgb_loss else 1) * F.mse_loss(mask, self.input_mask_torch)
 
             ### novel view (manual batch)
-            render_resolution = 128 if step_ratio < 0.3 else (256 if step_ratio < 0.6 else 512)
-            images = []
-            poses = []
-            vers, hors, radii = [], [], []
-            # avoid too large elevation (> 80 or < -80), and make sure it always cover [min_ver, max_ver]
-            min_ver = max(min(self.opt.min_ver, self.opt.min_ver - self.opt.elevation), -80 - self.opt.elevation)
-            max_ver = min(max(self.opt.max_ver, self.opt.max_ver - self.opt.elevation), 80 - self.opt.elevation)
-
-            for _ in range(self.opt.batch_size):
-
-                # render random view
-                ver = np.random.randint(min_ver, max_ver)
-                hor = np.random.randint(-180, 180)
-                radius = 0
-
-                vers.append(ver)
-                hors.append(hor)
-                radii.append(radius)
-
-                pose = orbit_camera(self.opt.elevation + ver, hor, self.opt.radius + radius)
-                poses.append(pose)
-
-                cur_cam = MiniCam(pose, render_resolution, render_resolution, self.cam.fovy, self.cam.fovx, self.cam.near, self.cam.far)
-
-                bg_color = torch.tensor([1, 1, 1] if np.random.rand() > self.opt.invert_bg_prob else [0, 0, 0], dtype=torch.float32, device="cuda")
-                out = self.renderer.render(cur_cam, bg_color=bg_color)
-
-                image = out["image"].unsqueeze(0) # [1, 3, H, W] in [0, 1]
-                images.append(image)
-
-                # enable mvdream training
-                if self.opt.mvdream or self.opt.imagedream:
-                    for view_i in range(1, 4):
-                        pose_i = orbit_camera(self.opt.elevation + ver, hor + 90 * view_i, self.opt.radius + radius)
-                        poses.append(pose_i)
-
-                        cur_cam_i = MiniCam(pose_i, render_resolution, render_resolution, self.cam.fovy, self.cam.fovx, self.cam.near, self.cam.far)
-
-                        # bg_color = torch.tensor([0.5, 0.5, 0.5], dtype=torch.float32, device="cuda")
-                        out_i = self.renderer.render(cur_cam_i, bg_color=bg_color)
-
-                        image = out_i["image"].unsqueeze(0) # [1, 3, H, W] in [0, 1]
-                        images.append(image)
-                    
-            images = torch.cat(images, dim=0)
-            poses = torch.from_numpy(np.stack(poses, axis=0)).to(self.device)
+            with self.profiler.span("view sampling"):
+                # precomputed schedule: elevation / azimuth offsets and background of each sample, render resolution
+                vers, hors, _, render_resolution = self.view_sampler.sample(self.step)
+                radii = np.zeros_like(vers)
+                # every rendered view (the 4 views of a mvdream sample follow each other)
+                view_vers, view_hors, view_radii, bg_colors, _ = self.view_sampler.views(self.step)
+
+                # all poses and cameras at once
+                poses = orbit_cameras(view_vers, view_hors, view_radii) # [B, 4, 4]
+                cams = MiniCams(poses, render_resolution, render_resolution, self.cam.fovy, self.cam.fovx, self.cam.near, self.cam.far, device=self.device)
+
+            # render all views at once
+            with self.profiler.span("render"):
+                out = self.renderer.render_batch(cams, bg_color=torch.tensor(bg_colors, dtype=torch.float32, device=self.device))
+                images = out["image"] # [B, 3, H, W] in [0, 1]
+            poses = torch.from_numpy(poses).to(self.device)
 
             # import kiui
             # print(hor, ver)
             # kiui.vis.plot_image(images)
 
             # guidance loss
-            if self.enable_sd:
-                if self.opt.mvdream or self.opt.imagedream:
-                    loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, poses, step_ratio=step_ratio if self.opt.anneal_timestep else None)
-                else:
-                    loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, step_ratio=step_ratio if self.opt.anneal_timestep else None)
-
-            if self.enable_zero123:
-                loss = loss + self.opt.lambda_zero123 * self.guidance_zero123.train_step(images, vers, hors, radii, step_ratio=step_ratio if self.opt.anneal_timestep else None, default_elevation=self.opt.elevation)
+            with self.profiler.span("guidance"):
+                if self.enable_sd:
+                    if self.opt.mvdream or self.opt.imagedream:
+                        loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, poses, step_ratio=step_ratio if self.opt.anneal_timestep else None)
+                    else:
+                        loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, step_ratio=step_ratio if self.opt.anneal_timestep else None)
+
+                if self.enable_zero123:
+                    loss = loss + self.opt.lambda_zero123 * self.guidance_zero123.train_step(images, vers, hors, radii, step_ratio=step_ratio if self.opt.anneal_timestep else None, default_elevation=self.opt.elevation)
             
             # optimize step
-            loss.backward()
-            self.optimizer.step()
-            self.optimizer.zero_grad()
+            with self.profiler.span("backward"):
+                loss.backward()
+            with self.profiler.span("optimizer"):
+                self.optimizer.step()
+                self.optimizer.zero_grad()
 
             # densify and prune
             if self.step >= self.opt.density_start_iter and self.step <= self.opt.density_end_iter:
-                viewspace_point_tensor, visibility_filter, radii = out["viewspace_points"], out["visibility_filter"], out["radii"]
-                self.renderer.gaussians.max_radii2D[visibility_filter] = torch.max(self.renderer.gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
-                self.renderer.gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
-
-                if self.step % self.opt.densification_interval == 0:
-                    self.renderer.gaussians.densify_and_prune(self.opt.densify_grad_threshold, min_opacity=0.01, extent=4, max_screen_size=1)
-                
-                if self.step % self.opt.opacity_reset_interval == 0:
-                    self.renderer.gaussians.reset_opacity()
+                with self.profiler.span("densify"):
+                    # stats of the last random view (not its extra mvdream/imagedream views)
+                    last = -4 if (self.opt.mvdream or self.opt.imagedream) else -1
+                    viewspace_point_tensor, visibility_filter, radii = out["viewspace_points"][last], out["visibility_filter"][last], out["radii"][last]
+                    self.renderer.gaussians.max_radii2D[visibility_filter] = torch.max(self.renderer.gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
+                    self.renderer.gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
+
+                    if self.step % self.opt.densification_interval == 0:
+                        self.renderer.gaussians.densify_and_prune(self.opt.densify_grad_threshold, min_opacity=0.01, extent=4, max_screen_size=1)
+                    
+                    if self.step % self.opt.opacity_reset_interval == 0:
+                        self.renderer.gaussians.reset_opacity()
 
-        ender.record()
-        torch.cuda.synchronize()
-        t = starter.elapsed_time(ender)
+            self.profiler.counter("gaussians", self.renderer.gaussians.get_xyz.shape[0])
+            t += self.profiler.end_step()
 
         self.need_update = True
 
@@ -312,9 +294,7 @@ class GUI:
         if not self.need_update:
             return
 
-        starter = torch.cuda.Event(enable_timing=True)
-        ender = torch.cuda.Event(enable_timing=True)
-        starter.record()
+        self.frame_timer.begin_step(self.step)
 
         # should update image
         if self.need_update:
@@ -365,12 +345,10 @@ class GUI:
 
             self.need_update = False
 
-        ender.record()
-        torch.cuda.synchronize()
-        t = starter.elapsed_time(ender)
+        t = self.frame_timer.end_step()
 
         if self.gui:
-            dpg.set_value("_log_infer_time", f"{t:.4f}ms ({int(1000/t)} FPS)")
+            dpg.set_value("_log_infer_time", f"{t:.4f}ms ({int(1000/max(t, 1e-3))} FPS)")
             dpg.set_value(
                 "_texture", self.buffer_image
             )  # buffer must be contiguous, else seg fault!
@@ -382,7 +360,7 @@ class GUI:
         img = cv2.imread(file, cv2.IMREAD_UNCHANGED)
         if img.shape[-1] == 3:
             if self.bg_remover is None:
-                self.bg_remover = rembg.new_session()
+                self.bg_remover = registry.get("rembg", "cpu")
             img = rembg.remove(img, session=self.bg_remover)
 
         img = cv2.resize(img, (self.W, self.H), interpolation=cv2.INTER_AREA)
@@ -406,22 +384,18 @@ class GUI:
         os.makedirs(self.opt.outdir, exist_ok=True)
         if mode == 'geo':
             path = os.path.join(self.opt.outdir, self.opt.save_path + '_mesh.ply')
-            mesh = self.renderer.gaussians.extract_mesh(path, self.opt.density_thresh)
+            mesh = self.renderer.gaussians.extract_mesh(path, self.opt.density_thresh, remesh=self.opt.mesh_remesh, decimate_backend=self.opt.mesh_decimate_backend, cache_dir=self.opt.mesh_pipeline_cache or None)
             mesh.write_ply(path)
 
         elif mode == 'geo+tex':
             path = os.path.join(self.opt.outdir, self.opt.save_path + '_mesh.' + self.opt.mesh_format)
-            mesh = self.renderer.gaussians.extract_mesh(path, self.opt.density_thresh)
+            mesh = self.renderer.gaussians.extract_mesh(path, self.opt.density_thresh, remesh=self.opt.mesh_remesh, decimate_backend=self.opt.mesh_decimate_backend, cache_dir=self.opt.mesh_pipeline_cache or None)
 
             # perform texture extraction
             print(f"[INFO] unwrap uv...")
-            h = w = texture_size
             mesh.auto_uv()
             mesh.auto_normal()
 
-            albedo = torch.zeros((h, w, 3), device=self.device, dtype=torch.float32)
-            cnt = torch.zeros((h, w, 1), device=self.device, dtype=torch.float32)
-
             # self.prepare_train() # tmp fix for not loading 0123
             # vers = [0]
             # hors = [0]
@@ -430,112 +404,44 @@ class GUI:
 
             render_resolution = 512
 
-            import nvdiffrast.torch as dr
+            # nvdiffrast on gpu, the torch rasterizer of texture_bake otherwise
+            glctx = None
+            if self.device.type == 'cuda':
+                import nvdiffrast.torch as dr
 
-            if not self.opt.force_cuda_rast and (not self.opt.gui or os.name == 'nt'):
-                glctx = dr.RasterizeGLContext()
-            else:
-                glctx = dr.RasterizeCudaContext()
-
-            for ver, hor in zip(vers, hors):
-                # render image
-                pose = orbit_camera(ver, hor, self.cam.radius)
-
-                cur_cam = MiniCam(
-                    pose,
-                    render_resolution,
-                    render_resolution,
-                    self.cam.fovy,
-                    self.cam.fovx,
-                    self.cam.near,
-                    self.cam.far,
-                )
-                
-                cur_out = self.renderer.render(cur_cam)
-
-                rgbs = cur_out["image"].unsqueeze(0) # [1, 3, H, W] in [0, 1]
-
-                # enhance texture quality with zero123 [not working well]
-                # if self.opt.guidance_model == 'zero123':
-                #     rgbs = self.guidance.refine(rgbs, [ver], [hor], [0])
-                    # import kiui
-                    # kiui.vis.plot_image(rgbs)
-                    
-                # get coordinate in texture image
-                pose = torch.from_numpy(pose.astype(np.float32)).to(self.device)
-                proj = torch.from_numpy(self.cam.perspective.astype(np.float32)).to(self.device)
-
-                v_cam = torch.matmul(F.pad(mesh.v, pad=(0, 1), mode='constant', value=1.0), torch.inverse(pose).T).float().unsqueeze(0)
-                v_clip = v_cam @ proj.T
-                rast, rast_db = dr.rasterize(glctx, v_clip, mesh.f, (render_resolution, render_resolution))
-
-                depth, _ = dr.interpolate(-v_cam[..., [2]], rast, mesh.f) # [1, H, W, 1]
-                depth = depth.squeeze(0) # [H, W, 1]
-
-                alpha = (rast[0, ..., 3:] > 0).float()
-
-                uvs, _ = dr.interpolate(mesh.vt.unsqueeze(0), rast, mesh.ft)  # [1, 512, 512, 2] in [0, 1]
-
-                # use normal to produce a back-project mask
-                normal, _ = dr.interpolate(mesh.vn.unsqueeze(0).contiguous(), rast, mesh.fn)
-                normal = safe_normalize(normal[0])
-
-                # rotated normal (where [0, 0, 1] always faces camera)
-                rot_normal = normal @ pose[:3, :3]
-                viewcos = rot_normal[..., [2]]
-
-                mask = (alpha > 0) & (viewcos > 0.5)  # [H, W, 1]
-                mask = mask.view(-1)
-
-                uvs = uvs.view(-1, 2).clamp(0, 1)[mask]
-                rgbs = rgbs.view(3, -1).permute(1, 0)[mask].contiguous()
-                
-                # update texture image
-                cur_albedo, cur_cnt = mipmap_linear_grid_put_2d(
-                    h, w,
-                    uvs[..., [1, 0]] * 2 - 1,
-                    rgbs,
-                    min_resolution=256,
-                    return_count=True,
-                )
-                
-                # albedo += cur_albedo
-                # cnt += cur_cnt
-                mask = cnt.squeeze(-1) < 0.1
-                albedo[mask] += cur_albedo[mask]
-                cnt[mask] += cur_cnt[mask]
-
-            mask = cnt.squeeze(-1) > 0
-            albedo[mask] = albedo[mask] / cnt[mask].repeat(1, 3)
-
-            mask = mask.view(h, w)
-
-            albedo = albedo.detach().cpu().numpy()
-            mask = mask.detach().cpu().numpy()
-
-            # dilate texture
-            from sklearn.neighbors import NearestNeighbors
-            from scipy.ndimage import binary_dilation, binary_erosion
+                if not self.opt.force_cuda_rast and (not self.opt.gui or os.name == 'nt'):
+                    glctx = dr.RasterizeGLContext()
+                else:
+                    glctx = dr.RasterizeCudaContext()
 
-            inpaint_region = binary_dilation(mask, iterations=32)
-            inpaint_region[mask] = 0
+            baker = TextureBaker(mesh, texture_size, glctx=glctx)
 
-            search_region = mask.copy()
-            not_search_region = binary_erosion(search_region, iterations=3)
-            search_region[not_search_region] = 0
+            # render all images
+            poses = orbit_cameras(vers, hors, self.cam.radius) # [V, 4, 4]
+            cams = MiniCams(
+                poses,
+                render_resolution,
+                render_resolution,
+                self.cam.fovy,
+                self.cam.fovx,
+                self.cam.near,
+                self.cam.far,
+                device=self.device,
+            )
+            images = self.renderer.render_batch(cams)["image"] # [V, 3, H, W] in [0, 1]
 
-            search_coords = np.stack(np.nonzero(search_region), axis=-1)
-            inpaint_coords = np.stack(np.nonzero(inpaint_region), axis=-1)
+            # enhance texture quality with zero123 [not working well]
+            # if self.opt.guidance_model == 'zero123':
+            #     images = self.guidance.refine(images, vers, hors, [0] * len(vers))
 
-            knn = NearestNeighbors(n_neighbors=1, algorithm="kd_tree").fit(
-                search_coords
-            )
-            _, indices = knn.kneighbors(inpaint_coords)
+            # back-project every view, then splat all samples at once weighted by the view cosine
+            for pose, rgbs in zip(poses, images):
+                baker.add_view(rgbs.detach(), pose, self.cam.perspective)
 
-            albedo[tuple(inpaint_coords.T)] = albedo[tuple(search_coords[indices[:, 0]].T)]
+            albedo, _ = baker.bake(padding=self.opt.texture_padding)
 
-            mesh.albedo = torch.from_numpy(albedo).to(self.device)
-            mesh.write(path)
+            mesh.albedo = albedo
+            mesh.write(path, quantize=self.opt.glb_quantize, image_format=self.opt.glb_texture_format)
 
         else:
             path = os.path.join(self.opt.outdir, self.opt.save_path + '_model.ply')
@@ -893,6 +799,10 @@ class GUI:
                 self.train_step()
             # do a last prune
             self.renderer.gaussians.prune(min_opacity=0.01, extent=1, max_screen_size=1)
+            if self.opt.profile:
+                self.profiler.report()
+                os.makedirs(self.opt.outdir, exist_ok=True)
+                self.profiler.save(os.path.join(self.opt.outdir, self.opt.save_path + '_profile'))
         # save
         self.save_model(mode='model')
         self.save_model(mode='geo+tex')
@@ -13,6 +13,9 @@ import rembg
 
 from cam_utils import orbit_camera, OrbitCamera
 from mesh_renderer import Renderer
+from guidance.embedding_cache import EmbeddingCache
+from model_registry import registry
+from profiler import StepProfiler
 
 # from kiui.lpips import LPIPS
 
@@ -103,6 +106,9 @@ class GUI:
         # setup training
         self.optimizer = torch.optim.Adam(self.renderer.get_params())
 
+        # per-phase timing of the steps (only the step time without opt.profile)
+        self.profiler = StepProfiler(self.device, enabled=self.opt.profile)
+
         # default camera
         if self.opt.mvdream or self.opt.imagedream:
             # the second view is the front view for mvdream/imagedream.
@@ -118,30 +124,25 @@ class GUI:
 
         # lazy load guidance model
         if self.guidance_sd is None and self.enable_sd:
+            # loaded once per process by the registry
             if self.opt.mvdream:
-                print(f"[INFO] loading MVDream...")
-                from guidance.mvdream_utils import MVDream
-                self.guidance_sd = MVDream(self.device)
-                print(f"[INFO] loaded MVDream!")
+                self.guidance_sd = registry.get("mvdream", self.device)
             elif self.opt.imagedream:
-                print(f"[INFO] loading ImageDream...")
-                from guidance.imagedream_utils import ImageDream
-                self.guidance_sd = ImageDream(self.device)
-                print(f"[INFO] loaded ImageDream!")
+                self.guidance_sd = registry.get("imagedream", self.device)
             else:
-                print(f"[INFO] loading SD...")
-                from guidance.sd_utils import StableDiffusion
-                self.guidance_sd = StableDiffusion(self.device)
-                print(f"[INFO] loaded SD!")
+                self.guidance_sd = registry.get("sd", self.device, offload=self.opt.guidance_offload)
 
         if self.guidance_zero123 is None and self.enable_zero123:
-            print(f"[INFO] loading zero123...")
-            from guidance.zero123_utils import Zero123
             if self.opt.stable_zero123:
-                self.guidance_zero123 = Zero123(self.device, model_key='ashawkey/stable-zero123-diffusers')
+                self.guidance_zero123 = registry.get("zero123", self.device, model_key='ashawkey/stable-zero123-diffusers', offload=self.opt.guidance_offload)
             else:
-                self.guidance_zero123 = Zero123(self.device, model_key='ashawkey/zero123-xl-diffusers')
-            print(f"[INFO] loaded zero123!")
+                self.guidance_zero123 = registry.get("zero123", self.device, model_key='ashawkey/zero123-xl-diffusers', offload=self.opt.guidance_offload)
+
+        # embeddings of already seen prompts / images are reused (the cache stays with the models shared by the pipeline)
+        for guidance in (self.guidance_sd, self.guidance_zero123):
+            if guidance is not None and getattr(guidance, "embedding_cache", None) is None:
+                guidance.embedding_cache = EmbeddingCache(self.opt.embedding_cache_dir)
+
         # input image
         if self.input_img is not None:
             self.input_img_torch = torch.from_numpy(self.input_img).permute(2, 0, 1).unsqueeze(0).to(self.device)
@@ -164,28 +165,26 @@ class GUI:
                 self.guidance_zero123.get_img_embeds(self.input_img_torch)
 
     def train_step(self):
-        starter = torch.cuda.Event(enable_timing=True)
-        ender = torch.cuda.Event(enable_timing=True)
-        starter.record()
-
+        t = 0
 
         for _ in range(self.train_steps):
 
             self.step += 1
             step_ratio = min(1, self.step / self.opt.iters_refine)
+            self.profiler.begin_step(self.step)
 
             loss = 0
 
             ### known view
             if self.input_img_torch is not None and not self.opt.imagedream:
+                with self.profiler.span("reference loss"):
+                    ssaa = min(2.0, max(0.125, 2 * np.random.random()))
+                    out = self.renderer.render(*self.fixed_cam, self.opt.ref_size, self.opt.ref_size, ssaa=ssaa)
 
-                ssaa = min(2.0, max(0.125, 2 * np.random.random()))
-                out = self.renderer.render(*self.fixed_cam, self.opt.ref_size, self.opt.ref_size, ssaa=ssaa)
-
-                # rgb loss
-                image = out["image"] # [H, W, 3] in [0, 1]
-                valid_mask = ((out["alpha"] > 0) & (out["viewcos"] > 0.5)).detach()
-                loss = loss + F.mse_loss(image * valid_mask, self.input_img_torch_channel_last * valid_mask)
+                    # rgb loss
+                    image = out["image"] # [H, W, 3] in [0, 1]
+                    valid_mask = ((out["alpha"] > 0) & (out["viewcos"] > 0.5)).detach()
+                    loss = loss + F.mse_loss(image * valid_mask, self.input_img_torch_channel_last * valid_mask)
 
             ### novel view (manual batch)
             render_resolution = 512
@@ -198,20 +197,22 @@ class GUI:
             for _ in range(self.opt.batch_size):
 
                 # render random view
-                ver = np.random.randint(min_ver, max_ver)
-                hor = np.random.randint(-180, 180)
-                radius = 0
+                with self.profiler.span("view sampling"):
+                    ver = np.random.randint(min_ver, max_ver)
+                    hor = np.random.randint(-180, 180)
+                    radius = 0
 
-                vers.append(ver)
-                hors.append(hor)
-                radii.append(radius)
+                    vers.append(ver)
+                    hors.append(hor)
+                    radii.append(radius)
 
-                pose = orbit_camera(self.opt.elevation + ver, hor, self.opt.radius + radius)
-                poses.append(pose)
+                    pose = orbit_camera(self.opt.elevation + ver, hor, self.opt.radius + radius)
+                    poses.append(pose)
 
                 # random render resolution
                 ssaa = min(2.0, max(0.125, 2 * np.random.random()))
-                out = self.renderer.render(pose, self.cam.perspective, render_resolution, render_resolution, ssaa=ssaa)
+                with self.profiler.span("render"):
+                    out = self.renderer.render(pose, self.cam.perspective, render_resolution, render_resolution, ssaa=ssaa)
 
                 image = out["image"] # [H, W, 3] in [0, 1]
                 image = image.permute(2,0,1).contiguous().unsqueeze(0) # [1, 3, H, W] in [0, 1]
@@ -224,7 +225,8 @@ class GUI:
                         pose_i = orbit_camera(self.opt.elevation + ver, hor + 90 * view_i, self.opt.radius + radius)
                         poses.append(pose_i)
 
-                        out_i = self.renderer.render(pose_i, self.cam.perspective, render_resolution, render_resolution, ssaa=ssaa)
+                        with self.profiler.span("render"):
+                            out_i = self.renderer.render(pose_i, self.cam.perspective, render_resolution, render_resolution, ssaa=ssaa)
 
                         image = out_i["image"].permute(2,0,1).contiguous().unsqueeze(0) # [1, 3, H, W] in [0, 1]
                         images.append(image)
@@ -238,33 +240,34 @@ class GUI:
 
             # guidance loss
             strength = step_ratio * 0.15 + 0.8
-            if self.enable_sd:
-                if self.opt.mvdream or self.opt.imagedream:
-                    # loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, poses, step_ratio)
-                    refined_images = self.guidance_sd.refine(images, poses, strength=strength).float()
+            with self.profiler.span("guidance"):
+                if self.enable_sd:
+                    if self.opt.mvdream or self.opt.imagedream:
+                        # loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, poses, step_ratio)
+                        refined_images = self.guidance_sd.refine(images, poses, strength=strength).float()
+                        refined_images = F.interpolate(refined_images, (render_resolution, render_resolution), mode="bilinear", align_corners=False)
+                        loss = loss + self.opt.lambda_sd * F.mse_loss(images, refined_images)
+                    else:
+                        # loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, step_ratio)
+                        refined_images = self.guidance_sd.refine(images, strength=strength).float()
+                        refined_images = F.interpolate(refined_images, (render_resolution, render_resolution), mode="bilinear", align_corners=False)
+                        loss = loss + self.opt.lambda_sd * F.mse_loss(images, refined_images)
+
+                if self.enable_zero123:
+                    # loss = loss + self.opt.lambda_zero123 * self.guidance_zero123.train_step(images, vers, hors, radii, step_ratio)
+                    refined_images = self.guidance_zero123.refine(images, vers, hors, radii, strength=strength, default_elevation=self.opt.elevation).float()
                     refined_images = F.interpolate(refined_images, (render_resolution, render_resolution), mode="bilinear", align_corners=False)
-                    loss = loss + self.opt.lambda_sd * F.mse_loss(images, refined_images)
-                else:
-                    # loss = loss + self.opt.lambda_sd * self.guidance_sd.train_step(images, step_ratio)
-                    refined_images = self.guidance_sd.refine(images, strength=strength).float()
-                    refined_images = F.interpolate(refined_images, (render_resolution, render_resolution), mode="bilinear", align_corners=False)
-                    loss = loss + self.opt.lambda_sd * F.mse_loss(images, refined_images)
-
-            if self.enable_zero123:
-                # loss = loss + self.opt.lambda_zero123 * self.guidance_zero123.train_step(images, vers, hors, radii, step_ratio)
-                refined_images = self.guidance_zero123.refine(images, vers, hors, radii, strength=strength, default_elevation=self.opt.elevation).float()
-                refined_images = F.interpolate(refined_images, (render_resolution, render_resolution), mode="bilinear", align_corners=False)
-                loss = loss + self.opt.lambda_zero123 * F.mse_loss(images, refined_images)
-                # loss = loss + self.opt.lambda_zero123 * self.lpips_loss(images, refined_images)
+                    loss = loss + self.opt.lambda_zero123 * F.mse_loss(images, refined_images)
+                    # loss = loss + self.opt.lambda_zero123 * self.lpips_loss(images, refined_images)
 
             # optimize step
-            loss.backward()
-            self.optimizer.step()
-            self.optimizer.zero_grad()
+            with self.profiler.span("backward"):
+                loss.backward()
+            with self.profiler.span("optimizer"):
+                self.optimizer.step()
+                self.optimizer.zero_grad()
 
-        ender.record()
-        torch.cuda.synchronize()
-        t = starter.elapsed_time(ender)
+            t += self.profiler.end_step()
 
         self.need_update = True
 
@@ -333,7 +336,7 @@ class GUI:
         img = cv2.imread(file, cv2.IMREAD_UNCHANGED)
         if img.shape[-1] == 3:
             if self.bg_remover is None:
-                self.bg_remover = rembg.new_session()
+                self.bg_remover = registry.get("rembg", "cpu")
             img = rembg.remove(img, session=self.bg_remover)
 
         img = cv2.resize(
@@ -679,6 +682,10 @@ class GUI:
             self.prepare_train()
             for i in tqdm.trange(iters):
                 self.train_step()
+            if self.opt.profile:
+                self.profiler.report()
+                os.makedirs(self.opt.outdir, exist_ok=True)
+                self.profiler.save(os.path.join(self.opt.outdir, self.opt.save_path + '_refine_profile'))
         # save
         self.save_model()
         
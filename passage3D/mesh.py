@@ -1,5 +1,10 @@
 import os
+import re
 import cv2
+import glob
+import json
+import shutil
+import hashlib
 import torch
 import trimesh
 import numpy as np
@@ -15,6 +20,208 @@ def length(x, eps=1e-20):
 def safe_normalize(x, eps=1e-20):
     return x / length(x, eps)
 
+def parse_f_v(fv):
+    # pass in a vertex term of a face, return {v, vt, vn} (-1 if not provided)
+    # supported forms:
+    # f v1 v2 v3
+    # f v1/vt1 v2/vt2 v3/vt3
+    # f v1/vt1/vn1 v2/vt2/vn2 v3/vt3/vn3
+    # f v1//vn1 v2//vn2 v3//vn3
+    xs = [int(x) - 1 if x != "" else -1 for x in fv.split("/")]
+    xs.extend([-1] * (3 - len(xs)))
+    return xs[0], xs[1], xs[2]
+
+
+def parse_obj_lines(data):
+    # split the content of an obj file (bytes) into lines, return the buffer as an uint8 array,
+    # line start offsets and the first characters of each line.
+    if not data.endswith(b"\n"):
+        data = data + b"\n"
+    chars = np.frombuffer(data, dtype=np.uint8)
+    starts = np.concatenate([[0], np.flatnonzero(chars == ord("\n"))[:-1] + 1])
+    # pad so that short lines can still be looked ahead
+    padded = np.concatenate([chars, np.full(7, ord("\n"), dtype=np.uint8)])
+    heads = np.stack([padded[starts + i] for i in range(7)], axis=-1)
+    # indented lines (rare), strip and split again
+    if np.isin(heads[:, 0], [ord(" "), ord("\t")]).any():
+        return parse_obj_lines(re.sub(rb"(?m)^[ \t]+", b"", data))
+    return chars, starts, heads
+
+
+def parse_obj_block(chars, starts, heads, prefix):
+    # bytes of all the `prefix` lines (case insensitive) with the prefix blanked out, and the number of lines
+    select = np.isin(heads[:, len(prefix)], [ord(" "), ord("\t")])
+    for i, c in enumerate(prefix):
+        select &= (heads[:, i] | 0x20) == ord(c) # ascii lower case
+    index = np.flatnonzero(select)
+    if len(index) == 0:
+        return b"", 0
+    ends = np.append(starts[1:], len(chars))
+
+    # consecutive selected lines are copied as one run
+    breaks = np.flatnonzero(np.diff(index) != 1)
+    run_starts = starts[index[np.concatenate([[0], breaks + 1])]]
+    run_ends = ends[index[np.append(breaks, len(index) - 1)]]
+    block = np.concatenate([chars[s:e] for s, e in zip(run_starts, run_ends)])
+
+    # blank the prefix of each line
+    line_starts = np.cumsum(np.concatenate([[0], (ends - starts)[index][:-1]]))
+    for i in range(len(prefix)):
+        block[line_starts + i] = ord(" ")
+    return block.tobytes(), len(index)
+
+
+def parse_obj_floats(lines, prefix, columns=None):
+    # [N, C] float64 array of the `prefix` lines, C is given by the first line (or only the first `columns`)
+    block, num = parse_obj_block(*lines, prefix)
+    if num == 0:
+        return np.zeros((0,), dtype=np.float64)
+    ncols = len(block.split(b"\n", 1)[0].split())
+    values = np.fromstring(block, dtype=np.float64, sep=" ")
+    if values.size == num * ncols:
+        return values.reshape(num, ncols)[:, :columns]
+    # varying number of values per line
+    rows = [np.array(line.split(), dtype=np.float64)[:columns] for line in block.splitlines()]
+    return np.stack(rows, axis=0)
+
+
+def parse_obj_faces(lines):
+    # return [M, 3] int32 arrays of v/vt/vn indices (-1 if not provided), polygons are fan triangulated
+    block, num = parse_obj_block(*lines, "f")
+    if num == 0:
+        empty = np.zeros((0,), dtype=np.int32)
+        return empty, empty, empty
+    # empty fields (v//vn, v/) become 0, i.e. -1 after the 1-based --> 0-based shift, as in parse_f_v
+    block = block.replace(b"//", b"/0/")
+    for c in [b" ", b"\t", b"\r", b"\n"]:
+        if b"/" + c in block:
+            block = block.replace(b"/" + c, b"/0" + c)
+
+    # vertex terms per face and slashes per vertex term
+    chars = np.frombuffer(block, dtype=np.uint8)
+    newline = chars == ord("\n")
+    space = np.zeros(256, dtype=bool)
+    space[[ord(" "), ord("\t"), ord("\r"), ord("\n")]] = True
+    space = space[chars]
+    starts = np.flatnonzero(~space & np.concatenate([[True], space[:-1]]))
+    counts = np.bincount(np.searchsorted(np.flatnonzero(newline), starts), minlength=num)[:num]
+    slashes = np.bincount(np.searchsorted(starts, np.flatnonzero(chars == ord("/")), side="right") - 1, minlength=len(starts))
+
+    if (slashes == slashes[0]).all():
+        # same form everywhere: a single bulk int conversion
+        nfields = slashes[0] + 1
+        values = np.fromstring(block.replace(b"/", b" "), dtype=np.int64, sep=" ") - 1
+        values = values.reshape(-1, nfields)
+        values = np.concatenate([values, np.full((values.shape[0], 3 - nfields), -1, dtype=np.int64)], axis=1)
+    else:
+        # mixed forms
+        values = np.array([parse_f_v(x.decode()) for x in block.split()], dtype=np.int64)
+
+    # fan triangulation (assume vertices are ordered)
+    ntris = np.maximum(counts - 2, 0)
+    offsets = np.cumsum(counts) - counts
+    face = np.repeat(np.arange(num), ntris)
+    local = np.arange(face.shape[0]) - np.repeat(np.cumsum(ntris) - ntris, ntris)
+    first = offsets[face]
+    index = np.stack([first, first + local + 1, first + local + 2], axis=-1) # [M, 3]
+
+    tris = values[index].astype(np.int32) # [M, 3, 3]
+    return tris[..., 0], tris[..., 1], tris[..., 2]
+
+
+def parse_obj(data):
+    # data: content of an obj file (bytes)
+    # return: v, vt (with flipped v), vn, f, ft, fn as numpy arrays, and the mtllib path (or None)
+    lines = parse_obj_lines(data)
+
+    # (floats are parsed in double precision then rounded, like python floats)
+    vertices = parse_obj_floats(lines, "v").astype(np.float32)
+    normals = parse_obj_floats(lines, "vn").astype(np.float32)
+    texcoords = parse_obj_floats(lines, "vt", columns=2)
+    if len(texcoords) > 0:
+        texcoords = np.stack([texcoords[:, 0], 1.0 - texcoords[:, 1]], axis=-1)
+    texcoords = texcoords.astype(np.float32)
+    faces, tfaces, nfaces = parse_obj_faces(lines)
+
+    mtl_path, num = parse_obj_block(*lines, "mtllib")
+    mtl_path = mtl_path.splitlines()[-1].split()[0].decode() if num > 0 else None
+
+    return vertices, texcoords, normals, faces, tfaces, nfaces, mtl_path
+
+
+def format_rows(fmt, array):
+    # format every row of a [N, ...] array with fmt as a single string
+    # (%.9g keeps float32 values exact)
+    return (fmt * len(array)) % tuple(array.reshape(-1).tolist())
+
+
+def spatial_sort_faces(v, f):
+    # v: [N, 3], f: [M, 3] np.ndarray
+    # return f with triangles sorted along a morton (z-order) curve of their centers,
+    # so that consecutive triangles share vertices (gpu post-transform cache)
+    centers = v[f].mean(axis=1)
+    vmin = centers.min(axis=0)
+    extent = max(float((centers.max(axis=0) - vmin).max()), 1e-8)
+    q = ((centers - vmin) / extent * 1023).astype(np.int64) # 10 bits per axis
+
+    def spread(x):
+        # insert two zero bits between each bit
+        x = (x | (x << 16)) & 0x030000FF
+        x = (x | (x << 8)) & 0x0300F00F
+        x = (x | (x << 4)) & 0x030C30C3
+        x = (x | (x << 2)) & 0x09249249
+        return x
+
+    code = spread(q[:, 0]) | (spread(q[:, 1]) << 1) | (spread(q[:, 2]) << 2)
+    return f[np.argsort(code, kind="stable")]
+
+
+def optimize_vertex_fetch(f, num_vertices):
+    # renumber vertices in order of first use by f (unused vertices are dropped)
+    # return: new f, vmapping [K] with new vertex i = old vertex vmapping[i]
+    ids, first = np.unique(f.reshape(-1), return_index=True)
+    vmapping = ids[np.argsort(first)]
+    remap = np.full(num_vertices, -1, dtype=np.int64)
+    remap[vmapping] = np.arange(len(vmapping))
+    return remap[f], vmapping
+
+
+def pack_texture_atlas(textures, colors, padding=2):
+    # textures: list of uint8 [H, W, 3] (or None for a flat color tile), colors: list of [3] float in [0, 1]
+    # shelf packing into a single texture, tiles are padded by replicating their borders (for bilinear filtering)
+    # return: float32 [H, W, 3] atlas, per texture (x0, y0, w, h) rect in normalized uv (y down, as Mesh.vt)
+    tiles = []
+    for texture, color in zip(textures, colors):
+        if texture is None:
+            texture = np.tile((np.asarray(color) * 255).round().astype(np.uint8), (4, 4, 1))
+        tiles.append(cv2.copyMakeBorder(np.ascontiguousarray(texture), padding, padding, padding, padding, cv2.BORDER_REPLICATE))
+
+    # place tallest first, rows of at most ~sqrt(total area) width
+    order = sorted(range(len(tiles)), key=lambda i: -tiles[i].shape[0])
+    width = max(max(t.shape[1] for t in tiles), int(np.ceil(np.sqrt(sum(t.shape[0] * t.shape[1] for t in tiles)))))
+    positions = [None] * len(tiles)
+    x = y = row_height = 0
+    for i in order:
+        h, w = tiles[i].shape[:2]
+        if x + w > width:
+            x, y, row_height = 0, y + row_height, 0
+        positions[i] = (x, y)
+        x, row_height = x + w, max(row_height, h)
+    height = y + row_height
+
+    atlas = np.zeros((height, width, 3), dtype=np.float32)
+    rects = []
+    for tile, (x, y) in zip(tiles, positions):
+        h, w = tile.shape[:2]
+        atlas[y:y + h, x:x + w] = tile.astype(np.float32) / 255
+        rects.append(((x + padding) / width, (y + padding) / height, (w - 2 * padding) / width, (h - 2 * padding) / height))
+    return atlas, rects
+
+
+# bump when the layout of Mesh.save_cache changes
+MESH_CACHE_VERSION = 2
+
+
 class Mesh:
     def __init__(
         self,
@@ -43,8 +250,22 @@ class Mesh:
         self.ori_center = 0
         self.ori_scale = 1
 
+        # texture file the albedo was loaded from (if any)
+        self.albedo_path = None
+        # vertex / face ranges (and uv rect in the albedo atlas) of each part of a multi-geometry file
+        self.submeshes = None
+
     @classmethod
-    def load(cls, path=None, resize=True, renormal=True, retex=False, front_dir='+z', **kwargs):
+    def load(cls, path=None, resize=True, renormal=True, retex=False, front_dir='+z', cache=False, **kwargs):
+        # cache: reuse (or create) a binary copy of the loaded mesh next to the file, see load_cache
+        if cache and path is not None:
+            options = dict(resize=resize, renormal=renormal, retex=retex, front_dir=front_dir, albedo_path=kwargs.get("albedo_path"))
+            cache_dir = cls.cache_dir(path, options)
+            mesh = cls.load_cache(cache_dir, device=kwargs.get("device"))
+            if mesh is not None:
+                print(f"[Mesh loading] from cache {cache_dir}, v: {mesh.v.shape}, f: {mesh.f.shape}")
+                return mesh
+
         # assume init with kwargs
         if path is None:
             mesh = cls(**kwargs)
@@ -93,8 +314,91 @@ class Mesh:
             mesh.v @= T
             mesh.vn @= T
 
+        if cache and path is not None:
+            cls.prune_cache(path, cache_dir, options)
+            mesh.save_cache(cache_dir, options)
+
         return mesh
 
+    @staticmethod
+    def cache_dir(path, options):
+        # cache key: content of the file, load options and cache layout version
+        h = hashlib.sha1(f"{MESH_CACHE_VERSION} {json.dumps(options, sort_keys=True)}".encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 24), b""):
+                h.update(chunk)
+        return os.path.splitext(path)[0] + f"_cache_{h.hexdigest()[:16]}"
+
+    @staticmethod
+    def prune_cache(path, cache_dir, options):
+        # remove the caches of older contents of the file with the same load options (and unfinished ones),
+        # so re-exporting a mesh does not pile up <name>_cache_* directories. other load options keep their cache.
+        for other in glob.glob(glob.escape(os.path.splitext(path)[0]) + "_cache_" + "[0-9a-f]" * 16):
+            if other == cache_dir or not os.path.isdir(other):
+                continue
+            try:
+                with open(os.path.join(other, "meta.json"), "r") as f:
+                    stale = json.load(f)["options"] == options
+            except (OSError, ValueError, KeyError):
+                stale = True
+            if stale:
+                shutil.rmtree(other, ignore_errors=True)
+
+    @classmethod
+    def load_cache(cls, cache_dir, device=None):
+        # load a mesh saved by save_cache, arrays are memory-mapped (copy on write), nothing is parsed.
+        # return None if there is no valid cache.
+        meta_path = os.path.join(cache_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        # the texture may change without the mesh file
+        for source, stat in meta["sources"].items():
+            if not os.path.exists(source) or [os.path.getsize(source), os.stat(source).st_mtime_ns] != stat:
+                return None
+
+        if device is None:
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        mesh = cls(device=device)
+        for name in meta["arrays"]:
+            array = np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="c")
+            setattr(mesh, name, torch.from_numpy(array).to(device))
+        mesh.ori_center = torch.tensor(meta["ori_center"], dtype=torch.float32, device=device) if isinstance(meta["ori_center"], list) else meta["ori_center"]
+        mesh.ori_scale = meta["ori_scale"]
+        mesh.albedo_path = meta["albedo_path"]
+        mesh.submeshes = meta["submeshes"]
+        return mesh
+
+    def save_cache(self, cache_dir, options=None):
+        # save v/f/vn/fn/vt/ft/vc/albedo as .npy files (memory-mappable) and a meta.json describing them
+        os.makedirs(cache_dir, exist_ok=True)
+        arrays = []
+        for name in ["v", "f", "vn", "fn", "vt", "ft", "vc", "albedo"]:
+            value = getattr(self, name)
+            if value is not None:
+                np.save(os.path.join(cache_dir, name + ".npy"), value.detach().cpu().numpy())
+                arrays.append(name)
+
+        sources = {}
+        if self.albedo_path is not None and os.path.exists(self.albedo_path):
+            sources[self.albedo_path] = [os.path.getsize(self.albedo_path), os.stat(self.albedo_path).st_mtime_ns]
+
+        meta = {
+            "version": MESH_CACHE_VERSION,
+            "options": options,
+            "arrays": arrays,
+            "sources": sources,
+            "albedo_path": self.albedo_path,
+            "submeshes": self.submeshes,
+            "ori_center": self.ori_center.tolist() if torch.is_tensor(self.ori_center) else self.ori_center,
+            "ori_scale": self.ori_scale,
+        }
+        # written last, an interrupted save is not picked up
+        with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
     # load from obj file
     @classmethod
     def load_obj(cls, path, albedo_path=None, device=None):
@@ -109,76 +413,32 @@ class Mesh:
         mesh.device = device
 
         # load obj
-        with open(path, "r") as f:
-            lines = f.readlines()
-
-        def parse_f_v(fv):
-            # pass in a vertex term of a face, return {v, vt, vn} (-1 if not provided)
-            # supported forms:
-            # f v1 v2 v3
-            # f v1/vt1 v2/vt2 v3/vt3
-            # f v1/vt1/vn1 v2/vt2/vn2 v3/vt3/vn3
-            # f v1//vn1 v2//vn2 v3//vn3
-            xs = [int(x) - 1 if x != "" else -1 for x in fv.split("/")]
-            xs.extend([-1] * (3 - len(xs)))
-            return xs[0], xs[1], xs[2]
+        with open(path, "rb") as f:
+            data = f.read()
 
         # NOTE: we ignore usemtl, and assume the mesh ONLY uses one material (first in mtl)
-        vertices, texcoords, normals = [], [], []
-        faces, tfaces, nfaces = [], [], []
-        mtl_path = None
-
-        for line in lines:
-            split_line = line.split()
-            # empty line
-            if len(split_line) == 0:
-                continue
-            prefix = split_line[0].lower()
-            # mtllib
-            if prefix == "mtllib":
-                mtl_path = split_line[1]
-            # usemtl
-            elif prefix == "usemtl":
-                pass # ignored
-            # v/vn/vt
-            elif prefix == "v":
-                vertices.append([float(v) for v in split_line[1:]])
-            elif prefix == "vn":
-                normals.append([float(v) for v in split_line[1:]])
-            elif prefix == "vt":
-                val = [float(v) for v in split_line[1:]]
-                texcoords.append([val[0], 1.0 - val[1]])
-            elif prefix == "f":
-                vs = split_line[1:]
-                nv = len(vs)
-                v0, t0, n0 = parse_f_v(vs[0])
-                for i in range(nv - 2):  # triangulate (assume vertices are ordered)
-                    v1, t1, n1 = parse_f_v(vs[i + 1])
-                    v2, t2, n2 = parse_f_v(vs[i + 2])
-                    faces.append([v0, v1, v2])
-                    tfaces.append([t0, t1, t2])
-                    nfaces.append([n0, n1, n2])
-
-        mesh.v = torch.tensor(vertices, dtype=torch.float32, device=device)
+        vertices, texcoords, normals, faces, tfaces, nfaces, mtl_path = parse_obj(data)
+
+        mesh.v = torch.from_numpy(vertices).to(device)
         mesh.vt = (
-            torch.tensor(texcoords, dtype=torch.float32, device=device)
+            torch.from_numpy(texcoords).to(device)
             if len(texcoords) > 0
             else None
         )
         mesh.vn = (
-            torch.tensor(normals, dtype=torch.float32, device=device)
+            torch.from_numpy(normals).to(device)
             if len(normals) > 0
             else None
         )
 
-        mesh.f = torch.tensor(faces, dtype=torch.int32, device=device)
+        mesh.f = torch.from_numpy(faces).to(device)
         mesh.ft = (
-            torch.tensor(tfaces, dtype=torch.int32, device=device)
+            torch.from_numpy(tfaces).to(device)
             if len(texcoords) > 0
             else None
         )
         mesh.fn = (
-            torch.tensor(nfaces, dtype=torch.int32, device=device)
+            torch.from_numpy(nfaces).to(device)
             if len(normals) > 0
             else None
         )
@@ -232,6 +492,7 @@ class Mesh:
                 albedo = cv2.imread(albedo_path, cv2.IMREAD_UNCHANGED)
                 albedo = cv2.cvtColor(albedo, cv2.COLOR_BGR2RGB)
                 albedo = albedo.astype(np.float32) / 255
+                mesh.albedo_path = albedo_path
                 print(f"[load_obj] load texture: {albedo.shape}")
 
                 # import matplotlib.pyplot as plt
@@ -252,80 +513,123 @@ class Mesh:
 
         mesh.device = device
 
-        # use trimesh to load ply/glb, assume only has one single RootMesh...
+        # use trimesh to load ply/glb, scenes are flattened with their node transforms
         _data = trimesh.load(path)
         if isinstance(_data, trimesh.Scene):
-            if len(_data.geometry) == 1:
-                _mesh = list(_data.geometry.values())[0]
+            parts = []
+            for node in _data.graph.nodes_geometry:
+                transform, name = _data.graph[node]
+                if isinstance(_data.geometry[name], trimesh.Trimesh):
+                    parts.append((node, _data.geometry[name], transform))
+        else:
+            parts = [(None, _data, None)]
+
+        # texture (uint8 [H, W, 3], or None) / flat color of each part
+        textures, colors = [], []
+        for _, _mesh, _ in parts:
+            texture, color = None, np.array([0.5, 0.5, 0.5], dtype=np.float32)
+            if _mesh.visual.kind == 'vertex':
+                color = np.asarray(_mesh.visual.vertex_colors[:, :3], dtype=np.float32).mean(axis=0) / 255
+            elif _mesh.visual.kind == 'texture':
+                _material = _mesh.visual.material
+                if isinstance(_material, trimesh.visual.material.SimpleMaterial):
+                    _material = _material.to_pbr()
+                if not isinstance(_material, trimesh.visual.material.PBRMaterial):
+                    raise NotImplementedError(f"material type {type(_material)} not supported!")
+                if _material.baseColorTexture is not None:
+                    texture = np.asarray(_material.baseColorTexture.convert("RGB"))
+                elif _material.baseColorFactor is not None:
+                    color = np.asarray(_material.baseColorFactor[:3], dtype=np.float32) / 255
+            textures.append(texture)
+            colors.append(color)
+
+        # vertex uvs are kept if any part is textured (several textures are packed into an atlas)
+        has_uv = [t is not None and getattr(p[1].visual, "uv", None) is not None for t, p in zip(textures, parts)]
+        if len(parts) == 1:
+            if parts[0][1].visual.kind == 'vertex':
+                mode = "vertex"
             else:
-                # manual concat, will lose texture
-                _concat = []
-                for g in _data.geometry.values():
-                    if isinstance(g, trimesh.Trimesh):
-                        _concat.append(g)
-                _mesh = trimesh.util.concatenate(_concat)
+                mode = "texture" if textures[0] is not None else "none"
+            uv_rects = [(0, 0, 1, 1)]
+        elif any(has_uv):
+            mode = "texture"
+            albedo, uv_rects = pack_texture_atlas([t if uv else None for t, uv in zip(textures, has_uv)], colors)
+        elif all(p[1].visual.kind == 'vertex' for p in parts):
+            mode = "vertex"
         else:
-            _mesh = _data
-        
-        if _mesh.visual.kind == 'vertex':
-            vertex_colors = _mesh.visual.vertex_colors
-            vertex_colors = np.array(vertex_colors[..., :3]).astype(np.float32) / 255
-            mesh.vc = torch.tensor(vertex_colors, dtype=torch.float32, device=device)
+            mode = "none"
+
+        # concatenate into preallocated arrays (no intermediate copies)
+        num_v = sum(len(p[1].vertices) for p in parts)
+        num_f = sum(len(p[1].faces) for p in parts)
+        vertices = np.empty((num_v, 3), dtype=np.float32)
+        # normals of the file, computed by trimesh when it has none (as before the scene support)
+        normals = np.empty((num_v, 3), dtype=np.float32)
+        faces = np.empty((num_f, 3), dtype=np.int32)
+        texcoords = np.empty((num_v, 2), dtype=np.float32) if mode == "texture" and any(has_uv) else None
+        vertex_colors = np.empty((num_v, 3), dtype=np.float32) if mode == "vertex" else None
+
+        mesh.submeshes = []
+        v0 = f0 = 0
+        for i, (node, _mesh, transform) in enumerate(parts):
+            v1, f1 = v0 + len(_mesh.vertices), f0 + len(_mesh.faces)
+
+            vertices[v0:v1] = _mesh.vertices
+            if transform is not None:
+                vertices[v0:v1] = vertices[v0:v1] @ transform[:3, :3].T.astype(np.float32) + transform[:3, 3].astype(np.float32)
+            normals[v0:v1] = _mesh.vertex_normals
+            if transform is not None:
+                normals[v0:v1] = normals[v0:v1] @ np.linalg.inv(transform[:3, :3]).astype(np.float32)
+                normals[v0:v1] /= np.linalg.norm(normals[v0:v1], axis=-1, keepdims=True).clip(1e-20)
+            faces[f0:f1] = _mesh.faces + v0
+
+            if texcoords is not None:
+                x0, y0, w, h = uv_rects[i]
+                if has_uv[i]:
+                    uv = np.asarray(_mesh.visual.uv, dtype=np.float32)
+                    if len(parts) > 1:
+                        # repeated uvs can not be expressed in the atlas
+                        uv = np.where((uv < 0) | (uv > 1), uv - np.floor(uv), uv)
+                    texcoords[v0:v1, 0] = x0 + uv[:, 0] * w
+                    texcoords[v0:v1, 1] = y0 + (1 - uv[:, 1]) * h
+                else:
+                    # untextured part, center of its flat color tile
+                    texcoords[v0:v1] = [x0 + w / 2, y0 + h / 2]
+            elif mode == "vertex":
+                vertex_colors[v0:v1] = np.asarray(_mesh.visual.vertex_colors[:, :3], dtype=np.float32) / 255
+
+            mesh.submeshes.append({
+                "name": node,
+                "v_start": v0, "v_end": v1,
+                "f_start": f0, "f_end": f1,
+                "uv_rect": list(uv_rects[i]) if texcoords is not None else None,
+            })
+            v0, f0 = v1, f1
+
+        if mode == "vertex":
+            mesh.vc = torch.from_numpy(vertex_colors).to(device)
             print(f"[load_trimesh] use vertex color: {mesh.vc.shape}")
-        elif _mesh.visual.kind == 'texture':
-            _material = _mesh.visual.material
-            if isinstance(_material, trimesh.visual.material.PBRMaterial):
-                texture = np.array(_material.baseColorTexture).astype(np.float32) / 255
-            elif isinstance(_material, trimesh.visual.material.SimpleMaterial):
-                texture = np.array(_material.to_pbr().baseColorTexture).astype(np.float32) / 255
-            else:
-                raise NotImplementedError(f"material type {type(_material)} not supported!")
-            mesh.albedo = torch.tensor(texture, dtype=torch.float32, device=device)
-            print(f"[load_trimesh] load texture: {texture.shape}")
+        elif mode == "texture":
+            if len(parts) == 1:
+                albedo = textures[0].astype(np.float32) / 255
+            mesh.albedo = torch.from_numpy(albedo).to(device)
+            print(f"[load_trimesh] load texture: {albedo.shape}")
         else:
-            texture = np.ones((1024, 1024, 3), dtype=np.float32) * np.array([0.5, 0.5, 0.5])
-            mesh.albedo = torch.tensor(texture, dtype=torch.float32, device=device)
+            # flat base color (gray if unknown)
+            texture = np.ones((1024, 1024, 3), dtype=np.float32) * (colors[0] if len(parts) == 1 else np.array([0.5, 0.5, 0.5], dtype=np.float32))
+            mesh.albedo = torch.from_numpy(texture).to(device)
             print(f"[load_trimesh] failed to load texture.")
+        if len(parts) > 1:
+            print(f"[load_trimesh] {len(parts)} submeshes")
 
-        vertices = _mesh.vertices
-
-        try:
-            texcoords = _mesh.visual.uv
-            texcoords[:, 1] = 1 - texcoords[:, 1]
-        except Exception as e:
-            texcoords = None
-
-        try:
-            normals = _mesh.vertex_normals
-        except Exception as e:
-            normals = None
+        mesh.v = torch.from_numpy(vertices).to(device)
+        mesh.vn = torch.from_numpy(normals).to(device)
+        mesh.vt = torch.from_numpy(texcoords).to(device) if texcoords is not None else None
 
         # trimesh only support vertex uv...
-        faces = tfaces = nfaces = _mesh.faces
-
-        mesh.v = torch.tensor(vertices, dtype=torch.float32, device=device)
-        mesh.vt = (
-            torch.tensor(texcoords, dtype=torch.float32, device=device)
-            if texcoords is not None
-            else None
-        )
-        mesh.vn = (
-            torch.tensor(normals, dtype=torch.float32, device=device)
-            if normals is not None
-            else None
-        )
-
-        mesh.f = torch.tensor(faces, dtype=torch.int32, device=device)
-        mesh.ft = (
-            torch.tensor(tfaces, dtype=torch.int32, device=device)
-            if texcoords is not None
-            else None
-        )
-        mesh.fn = (
-            torch.tensor(nfaces, dtype=torch.int32, device=device)
-            if normals is not None
-            else None
-        )
+        mesh.f = torch.from_numpy(faces).to(device)
+        mesh.fn = mesh.f
+        mesh.ft = mesh.f if texcoords is not None else None
 
         return mesh
 
@@ -420,13 +724,14 @@ class Mesh:
                 setattr(self, name, tensor.to(device))
         return self
     
-    def write(self, path):
+    def write(self, path, **kwargs):
+        # kwargs: glb export options, see write_glb
         if path.endswith(".ply"):
             self.write_ply(path)
         elif path.endswith(".obj"):
             self.write_obj(path)
         elif path.endswith(".glb") or path.endswith(".gltf"):
-            self.write_glb(path)
+            self.write_glb(path, **kwargs)
         else:
             raise NotImplementedError(f"format {path} not supported!")
     
@@ -440,50 +745,160 @@ class Mesh:
         _mesh.export(path)
 
     # write to gltf/glb file (geom + texture)
-    def write_glb(self, path):
+    def write_glb(self, path, quantize=False, image_format="png", image_quality=90, optimize=True):
+        # quantize: store positions, normals, uvs and colors as (normalized) integers (KHR_mesh_quantization)
+        # image_format: "png" or "jpeg" for the embedded albedo, image_quality is the jpeg quality
+        # optimize: reorder triangles / vertices for locality (vertex cache & fetch), the geometry is unchanged
 
-        assert self.vn is not None and self.vt is not None # should be improved to support export without texture...
+        import pygltflib
 
+        textured = self.albedo is not None and self.vt is not None
+        
         # assert self.v.shape[0] == self.vn.shape[0] and self.v.shape[0] == self.vt.shape[0]
-        if self.v.shape[0] != self.vt.shape[0]:
+        if textured and self.v.shape[0] != self.vt.shape[0]:
             self.align_v_to_vt()
-
         # assume f == fn == ft
+        if self.vn is None or self.vn.shape[0] != self.v.shape[0]:
+            self.auto_normal()
+
+        f_np = self.f.detach().cpu().numpy().astype(np.int64)
+        attributes = {
+            "POSITION": self.v.detach().cpu().numpy().astype(np.float32),
+            "NORMAL": self.vn.detach().cpu().numpy().astype(np.float32),
+        }
+        if textured:
+            attributes["TEXCOORD_0"] = self.vt.detach().cpu().numpy().astype(np.float32)
+        if self.vc is not None:
+            attributes["COLOR_0"] = self.vc.detach().cpu().numpy().astype(np.float32).clip(0, 1)
+
+        if optimize:
+            f_np = spatial_sort_faces(attributes["POSITION"], f_np)
+            f_np, vmapping = optimize_vertex_fetch(f_np, len(attributes["POSITION"]))
+            attributes = {k: x[vmapping] for k, x in attributes.items()}
+
+        blobs, buffer_views, accessors = [], [], []
+        offset = 0
+
+        def add(array, target=None, stride=None, **accessor):
+            # append a 4-byte aligned buffer view (and an accessor on it if accessor fields are given)
+            nonlocal offset
+            blob = np.ascontiguousarray(array).tobytes()
+            blob += b"\0" * (-len(blob) % 4)
+            buffer_views.append(pygltflib.BufferView(buffer=0, byteOffset=offset, byteLength=len(blob), byteStride=stride, target=target))
+            blobs.append(blob)
+            offset += len(blob)
+            if accessor:
+                accessors.append(pygltflib.Accessor(bufferView=len(buffer_views) - 1, count=len(array), **accessor))
+                return len(accessors) - 1
+            return len(buffer_views) - 1
+
+        def padded(array, value=0):
+            # vec3 --> vec4 so that the vertex stride is a multiple of 4 bytes
+            return np.concatenate([array, np.full((len(array), 1), value, dtype=array.dtype)], axis=1)
+
+        # indices, 65535 is reserved for primitive restart
+        num_vertices = len(attributes["POSITION"])
+        indices = f_np.reshape(-1).astype(np.uint16 if num_vertices <= 65535 else np.uint32)
+        indices_accessor = add(
+            indices,
+            target=pygltflib.ELEMENT_ARRAY_BUFFER,
+            componentType=pygltflib.UNSIGNED_SHORT if indices.dtype == np.uint16 else pygltflib.UNSIGNED_INT,
+            type=pygltflib.SCALAR,
+            max=[int(indices.max())],
+            min=[int(indices.min())],
+        )
 
-        import pygltflib
-
-        f_np = self.f.detach().cpu().numpy().astype(np.uint32)
-        v_np = self.v.detach().cpu().numpy().astype(np.float32)
-        # vn_np = self.vn.detach().cpu().numpy().astype(np.float32)
-        vt_np = self.vt.detach().cpu().numpy().astype(np.float32)
+        node = pygltflib.Node(mesh=0)
+        primitive_attributes = {}
+        for name, x in attributes.items():
+            if not quantize:
+                primitive_attributes[name] = add(
+                    x,
+                    target=pygltflib.ARRAY_BUFFER,
+                    stride=x.shape[1] * 4,
+                    componentType=pygltflib.FLOAT,
+                    type=pygltflib.VEC3 if x.shape[1] == 3 else pygltflib.VEC2,
+                    max=x.max(axis=0).tolist() if name == "POSITION" or name == "TEXCOORD_0" else None,
+                    min=x.min(axis=0).tolist() if name == "POSITION" or name == "TEXCOORD_0" else None,
+                )
+            elif name == "POSITION":
+                # uint16 grid on the bounding box, uniform scale so that normals are not distorted.
+                # the node transform maps it back.
+                vmin = x.min(axis=0)
+                scale = max(float((x.max(axis=0) - vmin).max()), 1e-8) / 65535
+                q = np.round((x - vmin) / scale).clip(0, 65535).astype(np.uint16)
+                node.translation = vmin.tolist()
+                node.scale = [scale] * 3
+                primitive_attributes[name] = add(
+                    padded(q), target=pygltflib.ARRAY_BUFFER, stride=8,
+                    componentType=pygltflib.UNSIGNED_SHORT, type=pygltflib.VEC3,
+                    max=q.max(axis=0).tolist(), min=q.min(axis=0).tolist(),
+                )
+            elif name == "NORMAL":
+                q = np.round(x.clip(-1, 1) * 127).astype(np.int8)
+                primitive_attributes[name] = add(
+                    padded(q), target=pygltflib.ARRAY_BUFFER, stride=4,
+                    componentType=pygltflib.BYTE, type=pygltflib.VEC3, normalized=True,
+                )
+            elif name == "TEXCOORD_0" and x.min() >= 0 and x.max() <= 1:
+                q = np.round(x * 65535).astype(np.uint16)
+                primitive_attributes[name] = add(
+                    q, target=pygltflib.ARRAY_BUFFER, stride=4,
+                    componentType=pygltflib.UNSIGNED_SHORT, type=pygltflib.VEC2, normalized=True,
+                )
+            elif name == "COLOR_0":
+                q = np.round(x * 255).astype(np.uint8)
+                primitive_attributes[name] = add(
+                    padded(q, 255), target=pygltflib.ARRAY_BUFFER, stride=4,
+                    componentType=pygltflib.UNSIGNED_BYTE, type=pygltflib.VEC3, normalized=True,
+                )
+            else:
+                # uvs outside [0, 1] stay float
+                primitive_attributes[name] = add(
+                    x, target=pygltflib.ARRAY_BUFFER, stride=8, componentType=pygltflib.FLOAT, type=pygltflib.VEC2,
+                    max=x.max(axis=0).tolist(), min=x.min(axis=0).tolist(),
+                )
 
-        albedo = self.albedo.detach().cpu().numpy()
-        albedo = (albedo * 255).astype(np.uint8)
-        albedo = cv2.cvtColor(albedo, cv2.COLOR_RGB2BGR)
+        if textured:
+            albedo = self.albedo.detach().cpu().numpy()
+            albedo = (albedo * 255).astype(np.uint8)
+            albedo = cv2.cvtColor(albedo, cv2.COLOR_RGB2BGR)
+            if image_format == "png":
+                albedo_blob = cv2.imencode(".png", albedo)[1].tobytes()
+            elif image_format in ["jpeg", "jpg"]:
+                albedo_blob = cv2.imencode(".jpg", albedo, [cv2.IMWRITE_JPEG_QUALITY, image_quality])[1].tobytes()
+            else:
+                raise ValueError(f"[write_glb] unknown image format {image_format}")
+            images = [
+                # use embedded (buffer) image
+                pygltflib.Image(bufferView=add(np.frombuffer(albedo_blob, dtype=np.uint8)), mimeType="image/png" if image_format == "png" else "image/jpeg"),
+            ]
+            textures = [pygltflib.Texture(sampler=0, source=0)]
+            samplers = [
+                pygltflib.Sampler(magFilter=pygltflib.LINEAR, minFilter=pygltflib.LINEAR_MIPMAP_LINEAR, wrapS=pygltflib.REPEAT, wrapT=pygltflib.REPEAT),
+            ]
+            base_color_texture = pygltflib.TextureInfo(index=0, texCoord=0)
+        else:
+            # plain material, modulated by COLOR_0 if any
+            images, textures, samplers = [], [], []
+            base_color_texture = None
 
-        f_np_blob = f_np.flatten().tobytes()
-        v_np_blob = v_np.tobytes()
-        # vn_np_blob = vn_np.tobytes()
-        vt_np_blob = vt_np.tobytes()
-        albedo_blob = cv2.imencode('.png', albedo)[1].tobytes()
+        blob = b"".join(blobs)
 
         gltf = pygltflib.GLTF2(
             scene=0,
             scenes=[pygltflib.Scene(nodes=[0])],
-            nodes=[pygltflib.Node(mesh=0)],
+            nodes=[node],
             meshes=[pygltflib.Mesh(primitives=[
                 pygltflib.Primitive(
-                    # indices to accessors (0 is triangles)
-                    attributes=pygltflib.Attributes(
-                        POSITION=1, TEXCOORD_0=2, 
-                    ),
-                    indices=0, material=0,
+                    attributes=pygltflib.Attributes(**primitive_attributes),
+                    indices=indices_accessor, material=0,
                 )
             ])],
             materials=[
                 pygltflib.Material(
                     pbrMetallicRoughness=pygltflib.PbrMetallicRoughness(
-                        baseColorTexture=pygltflib.TextureInfo(index=0, texCoord=0),
+                        baseColorTexture=base_color_texture,
                         metallicFactor=0.0,
                         roughnessFactor=1.0,
                     ),
@@ -491,83 +906,19 @@ class Mesh:
                     doubleSided=True,
                 )
             ],
-            textures=[
-                pygltflib.Texture(sampler=0, source=0),
-            ],
-            samplers=[
-                pygltflib.Sampler(magFilter=pygltflib.LINEAR, minFilter=pygltflib.LINEAR_MIPMAP_LINEAR, wrapS=pygltflib.REPEAT, wrapT=pygltflib.REPEAT),
-            ],
-            images=[
-                # use embedded (buffer) image
-                pygltflib.Image(bufferView=3, mimeType="image/png"),
-            ],
-            buffers=[
-                pygltflib.Buffer(byteLength=len(f_np_blob) + len(v_np_blob) + len(vt_np_blob) + len(albedo_blob))
-            ],
-            # buffer view (based on dtype)
-            bufferViews=[
-                # triangles; as flatten (element) array
-                pygltflib.BufferView(
-                    buffer=0,
-                    byteLength=len(f_np_blob),
-                    target=pygltflib.ELEMENT_ARRAY_BUFFER, # GL_ELEMENT_ARRAY_BUFFER (34963)
-                ),
-                # positions; as vec3 array
-                pygltflib.BufferView(
-                    buffer=0,
-                    byteOffset=len(f_np_blob),
-                    byteLength=len(v_np_blob),
-                    byteStride=12, # vec3
-                    target=pygltflib.ARRAY_BUFFER, # GL_ARRAY_BUFFER (34962)
-                ),
-                # texcoords; as vec2 array
-                pygltflib.BufferView(
-                    buffer=0,
-                    byteOffset=len(f_np_blob) + len(v_np_blob),
-                    byteLength=len(vt_np_blob),
-                    byteStride=8, # vec2
-                    target=pygltflib.ARRAY_BUFFER,
-                ),
-                # texture; as none target
-                pygltflib.BufferView(
-                    buffer=0,
-                    byteOffset=len(f_np_blob) + len(v_np_blob) + len(vt_np_blob),
-                    byteLength=len(albedo_blob),
-                ),
-            ],
-            accessors=[
-                # 0 = triangles
-                pygltflib.Accessor(
-                    bufferView=0,
-                    componentType=pygltflib.UNSIGNED_INT, # GL_UNSIGNED_INT (5125)
-                    count=f_np.size,
-                    type=pygltflib.SCALAR,
-                    max=[int(f_np.max())],
-                    min=[int(f_np.min())],
-                ),
-                # 1 = positions
-                pygltflib.Accessor(
-                    bufferView=1,
-                    componentType=pygltflib.FLOAT, # GL_FLOAT (5126)
-                    count=len(v_np),
-                    type=pygltflib.VEC3,
-                    max=v_np.max(axis=0).tolist(),
-                    min=v_np.min(axis=0).tolist(),
-                ),
-                # 2 = texcoords
-                pygltflib.Accessor(
-                    bufferView=2,
-                    componentType=pygltflib.FLOAT,
-                    count=len(vt_np),
-                    type=pygltflib.VEC2,
-                    max=vt_np.max(axis=0).tolist(),
-                    min=vt_np.min(axis=0).tolist(),
-                ),
-            ],
+            textures=textures,
+            samplers=samplers,
+            images=images,
+            buffers=[pygltflib.Buffer(byteLength=len(blob))],
+            bufferViews=buffer_views,
+            accessors=accessors,
         )
+        if quantize:
+            gltf.extensionsUsed = ["KHR_mesh_quantization"]
+            gltf.extensionsRequired = ["KHR_mesh_quantization"]
 
         # set actual data
-        gltf.set_binary_blob(f_np_blob + v_np_blob + vt_np_blob + albedo_blob)
+        gltf.set_binary_blob(blob)
 
         # glb = b"".join(gltf.save_to_bytes())
         gltf.save(path)
@@ -585,27 +936,28 @@ class Mesh:
         ft_np = self.ft.detach().cpu().numpy() if self.ft is not None else None
         fn_np = self.fn.detach().cpu().numpy() if self.fn is not None else None
 
+        # face terms: v/vt/vn, v/vt, v//vn or v
+        if ft_np is not None and fn_np is not None:
+            f_fmt, f_cols = "%d/%d/%d", np.stack([f_np, ft_np, fn_np], axis=-1)
+        elif ft_np is not None:
+            f_fmt, f_cols = "%d/%d", np.stack([f_np, ft_np], axis=-1)
+        elif fn_np is not None:
+            f_fmt, f_cols = "%d//%d", np.stack([f_np, fn_np], axis=-1)
+        else:
+            f_fmt, f_cols = "%d", f_np[..., None]
+
+        # each section is formatted at once and written in one call
         with open(path, "w") as fp:
             fp.write(f"mtllib {os.path.basename(mtl_path)} \n")
-
-            for v in v_np:
-                fp.write(f"v {v[0]} {v[1]} {v[2]} \n")
-
+            fp.write(format_rows("v %.9g %.9g %.9g\n", v_np))
             if vt_np is not None:
-                for v in vt_np:
-                    fp.write(f"vt {v[0]} {1 - v[1]} \n")
-
+                # flip in double precision so that loading flips back to the exact value
+                vt_np = vt_np.astype(np.float64)
+                fp.write(format_rows("vt %.9g %.17g\n", np.stack([vt_np[:, 0], 1 - vt_np[:, 1]], axis=-1)))
             if vn_np is not None:
-                for v in vn_np:
-                    fp.write(f"vn {v[0]} {v[1]} {v[2]} \n")
-
+                fp.write(format_rows("vn %.9g %.9g %.9g\n", vn_np))
             fp.write(f"usemtl defaultMat \n")
-            for i in range(len(f_np)):
-                fp.write(
-                    f'f {f_np[i, 0] + 1}/{ft_np[i, 0] + 1 if ft_np is not None else ""}/{fn_np[i, 0] + 1 if fn_np is not None else ""} \
-                             {f_np[i, 1] + 1}/{ft_np[i, 1] + 1 if ft_np is not None else ""}/{fn_np[i, 1] + 1 if fn_np is not None else ""} \
-                             {f_np[i, 2] + 1}/{ft_np[i, 2] + 1 if ft_np is not None else ""}/{fn_np[i, 2] + 1 if fn_np is not None else ""} \n'
-                )
+            fp.write(format_rows(f"f {f_fmt} {f_fmt} {f_fmt}\n", f_cols + 1))
 
         with open(mtl_path, "w") as fp:
             fp.write(f"newmtl defaultMat \n")
@@ -10,6 +10,8 @@ import torch.nn.functional as F
 
 import nvdiffrast.torch as dr
 from mesh import Mesh, safe_normalize
+from texture_bake import uv_coverage
+from texture_padding import pad_texture
 
 def scale_img_nhwc(x, size, mag='bilinear', min='bilinear'):
     assert (x.shape[1] >= size[0] and x.shape[2] >= size[1]) or (x.shape[1] < size[0] and x.shape[2] < size[1]), "Trying to magnify image in one dimension and minify in the other"
@@ -46,7 +48,7 @@ class Renderer(nn.Module):
 
         self.opt = opt
 
-        self.mesh = Mesh.load(self.opt.mesh, resize=False)
+        self.mesh = Mesh.load(self.opt.mesh, resize=False, cache=self.opt.mesh_cache)
 
         if not self.opt.force_cuda_rast and (not self.opt.gui or os.name == 'nt'):
             self.glctx = dr.RasterizeGLContext()
@@ -72,8 +74,11 @@ class Renderer(nn.Module):
     @torch.no_grad()
     def export_mesh(self, save_path):
         self.mesh.v = (self.mesh.v + self.v_offsets).detach()
-        self.mesh.albedo = torch.sigmoid(self.raw_albedo.detach())
-        self.mesh.write(save_path)
+        albedo = torch.sigmoid(self.raw_albedo.detach())
+        # re-pad the texels outside the uv charts so that filtering near the seams does not pick up stale colors
+        mask = uv_coverage(self.mesh.vt, self.mesh.ft, albedo.shape[0])
+        self.mesh.albedo = pad_texture(albedo, mask, self.opt.texture_padding)
+        self.mesh.write(save_path, quantize=self.opt.glb_quantize, image_format=self.opt.glb_texture_format)
 
     
     def render(self, pose, proj, h0, w0, ssaa=1, bg_color=1, texture_filter='linear-mipmap-linear'):
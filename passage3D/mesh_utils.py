@@ -1,6 +1,13 @@
+import os
+import glob
+import json
+import time
+import hashlib
 import numpy as np
 import pymeshlab as pml
 
+MESH_PIPELINE_CACHE_VERSION = 1
+
 
 def poisson_mesh_reconstruction(points, normals=None):
     # points/normals: [N, 3] np.ndarray
@@ -41,42 +48,194 @@ def poisson_mesh_reconstruction(points, normals=None):
     return vertices, triangles
 
 
-def decimate_mesh(
-    verts, faces, target, backend="pymeshlab", remesh=False, optimalplacement=True
-):
+def filter_clean(ms, v_pct=1, min_f=64, min_d=20, repair=True):
+    # remove unreferenced / duplicated / degenerated elements and small connected components
+
+    ms.meshing_remove_unreferenced_vertices()  # verts not refed by any faces
+
+    if v_pct > 0:
+        ms.meshing_merge_close_vertices(
+            threshold=pml.PercentageValue(v_pct)
+        )  # 1/10000 of bounding box diagonal
+
+    ms.meshing_remove_duplicate_faces()  # faces defined by the same verts
+    ms.meshing_remove_null_faces()  # faces with area == 0
+
+    if min_d > 0:
+        ms.meshing_remove_connected_component_by_diameter(
+            mincomponentdiag=pml.PercentageValue(min_d)
+        )
+
+    if min_f > 0:
+        ms.meshing_remove_connected_component_by_face_number(mincomponentsize=min_f)
+
+    if repair:
+        # ms.meshing_remove_t_vertices(method=0, threshold=40, repeat=True)
+        ms.meshing_repair_non_manifold_edges(method=0)
+        ms.meshing_repair_non_manifold_vertices(vertdispratio=0)
+
+
+def filter_remesh(ms, size=None, pct=1, iterations=3):
+    # isotropic remeshing, target edge length is an absolute size or a percentage of the bounding box diagonal
+    # ms.apply_coord_taubin_smoothing()
+    targetlen = pml.PureValue(size) if size is not None else pml.PercentageValue(pct)
+    ms.meshing_isotropic_explicit_remeshing(iterations=iterations, targetlen=targetlen)
+
+
+def filter_decimate(ms, target, backend="pymeshlab", optimalplacement=True):
     # optimalplacement: default is True, but for flat mesh must turn False to prevent spike artifect.
+    # meshes already below the target face count are left untouched.
 
-    _ori_vert_shape = verts.shape
-    _ori_face_shape = faces.shape
+    if ms.current_mesh().face_number() <= target:
+        return
 
     if backend == "pyfqmr":
         import pyfqmr
 
+        # pyfqmr works on arrays, the result replaces the mesh of the set
+        m = ms.current_mesh()
         solver = pyfqmr.Simplify()
-        solver.setMesh(verts, faces)
-        solver.simplify_mesh(target_count=target, preserve_border=False, verbose=False)
+        solver.setMesh(m.vertex_matrix(), m.face_matrix())
+        solver.simplify_mesh(target_count=int(target), preserve_border=False, verbose=False)
         verts, faces, normals = solver.getMesh()
+        ms.clear()
+        ms.add_mesh(pml.Mesh(verts, faces), "mesh")
     else:
-        m = pml.Mesh(verts, faces)
-        ms = pml.MeshSet()
-        ms.add_mesh(m, "mesh")  # will copy!
-
-        # filters
         # ms.meshing_decimation_clustering(threshold=pml.PercentageValue(1))
         ms.meshing_decimation_quadric_edge_collapse(
             targetfacenum=int(target), optimalplacement=optimalplacement
         )
 
-        if remesh:
-            # ms.apply_coord_taubin_smoothing()
-            ms.meshing_isotropic_explicit_remeshing(
-                iterations=3, targetlen=pml.PercentageValue(1)
-            )
+
+MESH_FILTERS = {
+    "clean": filter_clean,
+    "remesh": filter_remesh,
+    "decimate": filter_decimate,
+}
+
+
+class MeshPipeline:
+    # a chain of post-processing filters (see MESH_FILTERS) applied inside a single MeshSet,
+    # so the mesh is copied in and out of pymeshlab once per run instead of once per step.
+    # results are cached on disk by hash of the input arrays and the stage parameters when cache_dir is set,
+    # the max_items most recently used results are kept.
+    #   pipeline = MeshPipeline().add("clean", min_f=64).add("decimate", target=1e5, backend="pyfqmr")
+    #   verts, faces = pipeline.run(verts, faces)
+    def __init__(self, stages=None, cache_dir=None, max_items=32, verbose=True):
+        # stages: list of (filter name, kwargs)
+        self.stages = []
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.verbose = verbose
+        # (filter name, seconds) of the last run
+        self.timings = []
+
+        for name, kwargs in stages or []:
+            self.add(name, **kwargs)
+
+    def add(self, name, **kwargs):
+        if name not in MESH_FILTERS:
+            raise ValueError(f"unknown mesh filter {name}, expected one of {list(MESH_FILTERS)}")
+        self.stages.append((name, kwargs))
+        return self
+
+    def cache_path(self, verts, faces):
+        # cache key: input arrays, stages and cache layout version
+        h = hashlib.sha1(f"{MESH_PIPELINE_CACHE_VERSION} {json.dumps(self.stages, sort_keys=True)}".encode())
+        for x in (verts, faces):
+            x = np.ascontiguousarray(x)
+            h.update(f"{x.dtype} {x.shape}".encode())
+            h.update(x.data)
+        return os.path.join(self.cache_dir, f"{h.hexdigest()}.npz")
+
+    def run(self, verts, faces):
+        # verts: [N, 3], faces: [M, 3] np.ndarray
+        _ori_vert_shape = verts.shape
+        _ori_face_shape = faces.shape
+
+        if self.cache_dir is not None:
+            cache_path = self.cache_path(verts, faces)
+            if os.path.exists(cache_path):
+                data = np.load(cache_path)
+                # recently used, see evict
+                os.utime(cache_path)
+                self.timings = []
+                if self.verbose:
+                    print(f"[INFO] mesh pipeline: {_ori_vert_shape} --> {data['verts'].shape}, {_ori_face_shape} --> {data['faces'].shape} (cached)")
+                return data["verts"], data["faces"]
+
+        self.timings = []
+        t0 = time.perf_counter()
+        ms = pml.MeshSet()
+        ms.add_mesh(pml.Mesh(verts, faces), "mesh")  # will copy!
+        self.timings.append(("load", time.perf_counter() - t0))
+
+        for name, kwargs in self.stages:
+            t0 = time.perf_counter()
+            MESH_FILTERS[name](ms, **kwargs)
+            self.timings.append((name, time.perf_counter() - t0))
 
         # extract mesh
+        t0 = time.perf_counter()
         m = ms.current_mesh()
         verts = m.vertex_matrix()
         faces = m.face_matrix()
+        self.timings.append(("extract", time.perf_counter() - t0))
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # written under a temporary name, concurrent runs never read a partial file
+            tmp_path = cache_path[:-4] + f".{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, verts=verts, faces=faces)
+            os.replace(tmp_path, cache_path)
+            self.evict()
+
+        if self.verbose:
+            timings = ", ".join(f"{name} {t:.2f}s" for name, t in self.timings)
+            print(f"[INFO] mesh pipeline: {_ori_vert_shape} --> {verts.shape}, {_ori_face_shape} --> {faces.shape} ({timings})")
+
+        return verts, faces
+
+    def evict(self):
+        # drop the least recently used results beyond max_items
+        paths = glob.glob(os.path.join(glob.escape(self.cache_dir), "*.npz"))
+        paths = [p for p in paths if ".tmp." not in p]
+        if len(paths) <= self.max_items:
+            return
+        paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for p in paths[:len(paths) - self.max_items]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def run_batch(self, meshes, processes=None):
+        # meshes: list of (verts, faces), cleaned in a process pool (pymeshlab filters are single threaded)
+        # return: list of (verts, faces) in the same order
+        if processes == 1 or len(meshes) <= 1:
+            return [self.run(verts, faces) for verts, faces in meshes]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(self.run, *zip(*meshes)))
+
+
+def decimate_mesh(
+    verts, faces, target, backend="pymeshlab", remesh=False, optimalplacement=True
+):
+    # optimalplacement: default is True, but for flat mesh must turn False to prevent spike artifect.
+
+    pipeline = MeshPipeline(verbose=False).add(
+        "decimate", target=target, backend=backend, optimalplacement=optimalplacement
+    )
+    if remesh:
+        pipeline.add("remesh", pct=1)
+
+    _ori_vert_shape = verts.shape
+    _ori_face_shape = faces.shape
+
+    verts, faces = pipeline.run(verts, faces)
 
     print(
         f"[INFO] mesh decimation: {_ori_vert_shape} --> {verts.shape}, {_ori_face_shape} --> {faces.shape}"
@@ -98,47 +257,16 @@ def clean_mesh(
     # verts: [N, 3]
     # faces: [N, 3]
 
+    pipeline = MeshPipeline(verbose=False).add(
+        "clean", v_pct=v_pct, min_f=min_f, min_d=min_d, repair=repair
+    )
+    if remesh:
+        pipeline.add("remesh", size=remesh_size)
+
     _ori_vert_shape = verts.shape
     _ori_face_shape = faces.shape
 
-    m = pml.Mesh(verts, faces)
-    ms = pml.MeshSet()
-    ms.add_mesh(m, "mesh")  # will copy!
-
-    # filters
-    ms.meshing_remove_unreferenced_vertices()  # verts not refed by any faces
-
-    if v_pct > 0:
-        ms.meshing_merge_close_vertices(
-            threshold=pml.PercentageValue(v_pct)
-        )  # 1/10000 of bounding box diagonal
-
-    ms.meshing_remove_duplicate_faces()  # faces defined by the same verts
-    ms.meshing_remove_null_faces()  # faces with area == 0
-
-    if min_d > 0:
-        ms.meshing_remove_connected_component_by_diameter(
-            mincomponentdiag=pml.PercentageValue(min_d)
-        )
-
-    if min_f > 0:
-        ms.meshing_remove_connected_component_by_face_number(mincomponentsize=min_f)
-
-    if repair:
-        # ms.meshing_remove_t_vertices(method=0, threshold=40, repeat=True)
-        ms.meshing_repair_non_manifold_edges(method=0)
-        ms.meshing_repair_non_manifold_vertices(vertdispratio=0)
-
-    if remesh:
-        # ms.apply_coord_taubin_smoothing()
-        ms.meshing_isotropic_explicit_remeshing(
-            iterations=3, targetlen=pml.PureValue(remesh_size)
-        )
-
-    # extract mesh
-    m = ms.current_mesh()
-    verts = m.vertex_matrix()
-    faces = m.face_matrix()
+    verts, faces = pipeline.run(verts, faces)
 
     print(
         f"[INFO] mesh cleaning: {_ori_vert_shape} --> {verts.shape}, {_ori_face_shape} --> {faces.shape}"
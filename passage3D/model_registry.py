@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+
+import torch
+
+# name -> (default model key, default dtype)
+MODEL_DEFAULTS = {
+    "sd": ("stabilityai/stable-diffusion-2-1-base", torch.float16),
+    "mvdream": ("sd-v2.1-base-4view", torch.float32),
+    "imagedream": ("sd-v2.1-base-4view-ipmv", torch.float32),
+    "zero123": ("ashawkey/zero123-xl-diffusers", torch.float16),
+    "blip2": ("Salesforce/blip2-opt-2.7b", torch.float16),
+    "rembg": ("u2net", None),
+}
+
+
+def resident_bytes():
+    # resident memory of the process, None if unknown
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def model_bytes(model):
+    # bytes of the parameters and buffers of a model (or of the torch modules it holds), per device type
+    modules = [model] if isinstance(model, torch.nn.Module) else [m for m in vars(model).values() if isinstance(m, torch.nn.Module)]
+    sizes = {}
+    seen = set()
+    for module in modules:
+        for x in list(module.parameters()) + list(module.buffers()):
+            if id(x) in seen:
+                continue
+            seen.add(id(x))
+            sizes[x.device.type] = sizes.get(x.device.type, 0) + x.numel() * x.element_size()
+    return sizes
+
+
+def load_sd(device, dtype, model_key, offload):
+    from guidance.sd_utils import StableDiffusion
+    return StableDiffusion(device, fp16=dtype == torch.float16, vram_O=offload, hf_key=model_key)
+
+
+def load_mvdream(device, dtype, model_key, offload):
+    from guidance.mvdream_utils import MVDream
+    return MVDream(device, model_name=model_key)
+
+
+def load_imagedream(device, dtype, model_key, offload):
+    from guidance.imagedream_utils import ImageDream
+    return ImageDream(device, model_name=model_key)
+
+
+def load_zero123(device, dtype, model_key, offload):
+    from guidance.zero123_utils import Zero123
+    return Zero123(device, fp16=dtype == torch.float16, model_key=model_key, vram_O=offload)
+
+
+def load_blip2(device, dtype, model_key, offload):
+    from process import BLIP2
+    return BLIP2(device, model_key=model_key, dtype=dtype)
+
+
+def load_rembg(device, dtype, model_key, offload):
+    import rembg
+    return rembg.new_session(model_name=model_key)
+
+
+class ModelRegistry:
+    # one instance per process of each heavy model, keyed by (name, model_key, dtype, device, offload).
+    # models are only built on the first get, from memory-mapped safetensors when the checkpoint has them,
+    # so the stages of a batch, the Rendu3D / job queue workers and the gradio app share the loaded weights.
+    #   sd = registry.get("sd", "cuda")
+    #   zero123 = registry.get("zero123", "cuda", model_key="ashawkey/stable-zero123-diffusers", offload=True)
+    #   registry.report()
+    def __init__(self):
+        self.loaders = {
+            "sd": load_sd,
+            "mvdream": load_mvdream,
+            "imagedream": load_imagedream,
+            "zero123": load_zero123,
+            "blip2": load_blip2,
+            "rembg": load_rembg,
+        }
+        self.models = {}
+        # key -> {"load_time", "rss_bytes", "cuda_bytes", "param_bytes"}
+        self.metrics = {}
+        self.lock = threading.RLock()
+
+    def register(self, name, loader, model_key=None, dtype=None):
+        # loader: callable (device, dtype, model_key, offload) -> model
+        self.loaders[name] = loader
+        MODEL_DEFAULTS.setdefault(name, (model_key, dtype))
+
+    def key(self, name, device, dtype=None, model_key=None, offload=False):
+        if name not in self.loaders:
+            raise ValueError(f"unknown model {name}, expected one of {list(self.loaders)}")
+        default_key, default_dtype = MODEL_DEFAULTS.get(name, (None, None))
+        model_key = model_key if model_key is not None else default_key
+        dtype = dtype if dtype is not None else default_dtype
+        return name, model_key, str(dtype).replace("torch.", "") if dtype is not None else None, str(torch.device(device)), bool(offload)
+
+    def get(self, name, device, dtype=None, model_key=None, offload=False):
+        key = self.key(name, device, dtype, model_key, offload)
+        with self.lock:
+            if key in self.models:
+                return self.models[key]
+
+            _, model_key, _, device, offload = key
+            dtype = dtype if dtype is not None else MODEL_DEFAULTS.get(name, (None, None))[1]
+            print(f"[INFO] loading {name} ({model_key})...")
+            cuda = torch.cuda.is_available() and torch.device(device).type == "cuda"
+            if cuda:
+                torch.cuda.synchronize(device)
+            rss, vram = resident_bytes(), torch.cuda.memory_allocated(device) if cuda else 0
+            t0 = time.perf_counter()
+
+            model = self.loaders[name](device, dtype, model_key, offload)
+
+            if cuda:
+                torch.cuda.synchronize(device)
+            rss_after = resident_bytes()
+            self.metrics[key] = {
+                "load_time": time.perf_counter() - t0,
+                "rss_bytes": rss_after - rss if rss is not None and rss_after is not None else None,
+                "cuda_bytes": torch.cuda.memory_allocated(device) - vram if cuda else 0,
+                "param_bytes": model_bytes(model),
+            }
+            print(f"[INFO] loaded {name} in {self.metrics[key]['load_time']:.1f}s")
+            self.models[key] = model
+            return model
+
+    def release(self, name=None):
+        # drop the instances of a model (all of them if name is None), the memory is freed once nothing else references them
+        with self.lock:
+            for key in [k for k in self.models if name is None or k[0] == name]:
+                del self.models[key]
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def summary(self):
+        # json-friendly load metrics of the loaded models
+        with self.lock:
+            return [
+                {"name": key[0], "model_key": key[1], "dtype": key[2], "device": key[3], "offload": key[4], **self.metrics[key]}
+                for key in self.models
+            ]
+
+    def report(self):
+        mb = lambda x: f"{x / 2 ** 20:.0f}MB" if x is not None else "?"
+        for m in self.summary():
+            params = ", ".join(f"{device} {mb(size)}" for device, size in m["param_bytes"].items())
+            print(f"[INFO] {m['name']} ({m['model_key']}, {m['dtype']}, {m['device']}{', offload' if m['offload'] else ''}): "
+                  f"loaded in {m['load_time']:.1f}s, rss +{mb(m['rss_bytes'])}, cuda +{mb(m['cuda_bytes'])}, weights {params or '-'}")
+
+
+# shared by everything running in this process
+registry = ModelRegistry()
@@ -0,0 +1,250 @@
+import os
+import gc
+import glob
+import time
+import hashlib
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from omegaconf import OmegaConf
+
+from artifact_cache import hash_file, stage_key
+from cam_utils import orbit_camera, OrbitCamera
+from mesh import Mesh
+from texture_bake import rasterize_torch, interpolate_torch
+
+STAGES = ("segment", "stage1", "stage2", "video")
+
+
+def image_name(path):
+    # default save_path of an input image
+    return os.path.basename(path).split('.')[0].replace('_rgba', '')
+
+
+def render_video(mesh_path, video_path, elevation=0, resolution=512, radius=3, fovy=50, num_frames=120):
+    # turntable of the albedo-textured mesh on a white background, same framing as `python -m kiui.render --save_video`
+    import imageio
+
+    mesh = Mesh.load(mesh_path, front_dir="+z")
+    cam = OrbitCamera(resolution, resolution, r=radius, fovy=fovy)
+    proj = torch.from_numpy(cam.perspective.astype(np.float32)).to(mesh.v.device)
+
+    albedo = None
+    if mesh.albedo is not None and mesh.vt is not None:
+        albedo = mesh.albedo.permute(2, 0, 1).unsqueeze(0) # [1, 3, H, W]
+
+    frames = []
+    for azimuth in np.linspace(0, 360, num_frames, endpoint=False):
+        pose = torch.from_numpy(orbit_camera(elevation, azimuth, radius).astype(np.float32)).to(mesh.v.device)
+        v_clip = F.pad(mesh.v, pad=(0, 1), mode='constant', value=1.0) @ torch.inverse(pose).T @ proj.T
+        rast = rasterize_torch(v_clip, mesh.f, (resolution, resolution))
+        alpha = (rast[..., 3:] > 0).float() # [1, H, W, 1]
+
+        if albedo is not None:
+            uvs = interpolate_torch(mesh.vt, rast, mesh.ft) # [1, H, W, 2]
+            color = F.grid_sample(albedo, uvs * 2 - 1, mode='bilinear', align_corners=False).permute(0, 2, 3, 1)
+        elif mesh.vc is not None:
+            color = interpolate_torch(mesh.vc, rast, mesh.f)
+        else:
+            color = torch.full_like(rast[..., :3], 0.5)
+
+        image = (color * alpha + (1 - alpha))[0]
+        frames.append((image.clamp(0, 1) * 255).byte().cpu().numpy())
+
+    os.makedirs(os.path.dirname(video_path) or ".", exist_ok=True)
+    imageio.mimwrite(video_path, np.stack(frames), fps=30, quality=8, macro_block_size=1)
+
+
+class Pipeline:
+    # image to 3d in a single process: segmentation -> stage 1 (gaussians, main.py) -> stage 2 (mesh refinement, main2.py) -> video.
+    # the background remover and the guidance models are loaded once and shared by every image.
+    #   pipeline = Pipeline(OmegaConf.load("configs/image.yaml"))
+    #   pipeline.run(["data/cat.jpg", "data/dog.png"])
+    def __init__(self, opt, stages=STAGES, video_dir="videos", bg_remover=None, guidance_sd=None, guidance_zero123=None, video_renderer=None, cache=None):
+        # opt: config shared by both stages (input / save_path are set per image)
+        # stages: subset of STAGES to run
+        # cache: artifact_cache.ArtifactCache, stages whose input, options and code did not change are restored from it
+        # bg_remover: callable [H, W, 3/4] uint8 -> [H, W, 4], guidance_*: preloaded guidance models (e.g. stubs for tests),
+        # video_renderer: callable (mesh_path, video_path, elevation), default render_video
+        for stage in stages:
+            if stage not in STAGES:
+                raise ValueError(f"unknown stage {stage}, expected one of {STAGES}")
+
+        self.opt = opt
+        self.stages = stages
+        self.video_dir = video_dir
+        self.bg_remover = bg_remover
+        self.guidance_sd = guidance_sd
+        self.guidance_zero123 = guidance_zero123
+        self.video_renderer = video_renderer if video_renderer is not None else render_video
+        self.cache = cache
+        self.input_hashes = {}
+
+        # name -> {stage: seconds} of the last run
+        self.timings = {}
+
+    def get_bg_remover(self):
+        if self.bg_remover is None:
+            import rembg
+            from model_registry import registry
+            session = registry.get("rembg", "cpu")
+            self.bg_remover = lambda image: rembg.remove(image, session=session)
+        return self.bg_remover
+
+    def input_path(self, path):
+        # input of the training stages: the segmented image next to the raw one when segmenting, *_rgba.png are used as is
+        # (None for text to 3d)
+        if path is None or "segment" not in self.stages or path.endswith("_rgba.png"):
+            return path
+        return os.path.join(os.path.dirname(path), os.path.basename(path).split('.')[0] + '_rgba.png')
+
+    def segment(self, path):
+        out_rgba = self.input_path(path)
+        if out_rgba == path:
+            return
+        # process.py pulls rembg / torchvision / matplotlib, only needed when segmenting
+        from process import segment_image
+
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        cv2.imwrite(out_rgba, segment_image(image, self.get_bg_remover(), size=self.opt.ref_size))
+
+    def share_models(self, gui):
+        # hand the given models to a stage, prepare_train takes the missing ones from model_registry
+        gui.guidance_sd = self.guidance_sd
+        gui.guidance_zero123 = self.guidance_zero123
+
+    def keep_models(self, gui):
+        self.guidance_sd = gui.guidance_sd
+        self.guidance_zero123 = gui.guidance_zero123
+
+    def stage1(self, opt):
+        from main import GUI
+
+        gui = GUI(opt)
+        self.share_models(gui)
+        gui.train(opt.iters)
+        self.keep_models(gui)
+        del gui
+
+    def stage2(self, opt):
+        from main2 import GUI
+
+        # stage 1 output
+        if opt.mesh is None:
+            opt.mesh = os.path.join(opt.outdir, opt.save_path + '_mesh.' + opt.mesh_format)
+        gui = GUI(opt)
+        self.share_models(gui)
+        gui.train(opt.iters_refine)
+        self.keep_models(gui)
+        del gui
+
+    def video(self, opt):
+        mesh_path = os.path.join(opt.outdir, opt.save_path + '.' + opt.mesh_format)
+        if not os.path.exists(mesh_path):
+            # stage 2 skipped, show the stage 1 mesh
+            mesh_path = os.path.join(opt.outdir, opt.save_path + '_mesh.' + opt.mesh_format)
+        self.video_renderer(mesh_path, os.path.join(self.video_dir, opt.save_path + '.mp4'), opt.elevation)
+
+    def stage_outputs(self, stage, path, opt):
+        # return: directory and files written by a stage
+        if stage == "segment":
+            out_rgba = self.input_path(path)
+            return os.path.dirname(out_rgba), ([out_rgba] if out_rgba != path else [])
+        elif stage == "stage1":
+            files = [os.path.join(opt.outdir, opt.save_path + '_model.ply')] + glob.glob(os.path.join(opt.outdir, opt.save_path + '_mesh*'))
+            return opt.outdir, files
+        elif stage == "stage2":
+            files = glob.glob(os.path.join(opt.outdir, opt.save_path + '.*')) + glob.glob(os.path.join(opt.outdir, opt.save_path + '_albedo.*'))
+            return opt.outdir, files
+        else:
+            return self.video_dir, [os.path.join(self.video_dir, opt.save_path + '.mp4')]
+
+    def stage_inputs(self, stage, path, opt):
+        # files read by a stage whose producing stage is not part of this run (written by another run, or by hand)
+        if stage == "segment":
+            return [path]
+        inputs = [self.input_path(path)]
+        if stage == "stage2":
+            inputs += [opt.mesh] if opt.mesh is not None else self.stage_outputs("stage1", path, opt)[1]
+        elif stage == "video":
+            # the final mesh, or the stage 1 mesh when stage 2 never ran (same fallback as video)
+            final = self.stage_outputs("stage2", path, opt)[1]
+            inputs = final if final else self.stage_outputs("stage1", path, opt)[1]
+        return inputs
+
+    def stage_key(self, stage, path, opt):
+        # cache key of a stage: chained over the previous stages of this run, from the hash of the input image.
+        # when the previous stage is not run, the chain restarts from the content of the files the stage reads.
+        # (text to 3d has no input file, the prompt is part of the options of the stages)
+        if path not in self.input_hashes:
+            self.input_hashes[path] = hash_file(path).hexdigest() if path is not None else "text"
+        key = self.input_hashes[path]
+        for i, s in enumerate(STAGES):
+            if s not in self.stages:
+                continue
+            if i > 0 and STAGES[i - 1] not in self.stages:
+                h = hashlib.sha1(key.encode())
+                for f in sorted(f for f in self.stage_inputs(s, path, opt) if f is not None and os.path.isfile(f)):
+                    h.update(os.path.basename(f).encode())
+                    hash_file(f, h)
+                key = h.hexdigest()
+            if s == "segment":
+                # entries are restored by file name, the name of the segmented image is part of its key
+                key = f"{key} {os.path.basename(self.input_path(path))}"
+            key = stage_key(s, key, opt)
+            if s == stage:
+                return key
+
+    def run_stage(self, stage, path, name, overrides=None):
+        # run a single stage of one image (used by run and by the job scheduler), return its duration in seconds
+        # path: input image, None for text to 3d
+        # overrides: options of this job only (e.g. {"prompt": ...})
+        opt = OmegaConf.merge(self.opt, {"input": self.input_path(path), "save_path": name}, overrides or {})
+
+        t0 = time.perf_counter()
+        key = None
+        if self.cache is not None:
+            key = self.stage_key(stage, path, opt)
+            out_dir, _ = self.stage_outputs(stage, path, opt)
+            if self.cache.get(key, out_dir) is not None:
+                print(f"[INFO] {name}: {stage} restored from cache")
+                t = self.timings.setdefault(name, {})[stage] = time.perf_counter() - t0
+                return t
+
+        if stage == "segment":
+            self.segment(path)
+        else:
+            getattr(self, stage)(opt)
+        t = time.perf_counter() - t0
+        self.timings.setdefault(name, {})[stage] = t
+
+        if key is not None:
+            self.cache.put(key, self.stage_outputs(stage, path, opt)[1])
+
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        return t
+
+    def run(self, images, names=None):
+        # images: list of image paths (raw or *_rgba.png)
+        # names: save_path of each image, default to the image name
+        # return: {name: {stage: seconds}}
+        if names is None:
+            names = [image_name(path) for path in images]
+
+        os.makedirs(self.opt.outdir, exist_ok=True)
+
+        for path, name in zip(images, names):
+            print(f'======== processing {name} ========')
+            self.timings[name] = {}
+            for stage in STAGES:
+                if stage in self.stages:
+                    self.run_stage(stage, path, name)
+
+            print(f"[INFO] {name}: " + ", ".join(f"{stage} {t:.1f}s" for stage, t in self.timings[name].items()))
+
+        return self.timings
@@ -14,16 +14,19 @@ from PIL import Image
 import rembg
 
 class BLIP2():
-    def __init__(self, device='cuda'):
+    # prefer model_registry.registry.get("blip2", device), the 2.7b weights are then loaded once per process
+    def __init__(self, device='cuda', model_key="Salesforce/blip2-opt-2.7b", dtype=torch.float16):
         self.device = device
+        self.dtype = dtype
         from transformers import AutoProcessor, Blip2ForConditionalGeneration
-        self.processor = AutoProcessor.from_pretrained("Salesforce/blip2-opt-2.7b")
-        self.model = Blip2ForConditionalGeneration.from_pretrained("Salesforce/blip2-opt-2.7b", torch_dtype=torch.float16).to(device)
+        self.processor = AutoProcessor.from_pretrained(model_key)
+        # shards are memory-mapped and loaded straight to the device
+        self.model = Blip2ForConditionalGeneration.from_pretrained(model_key, torch_dtype=dtype, low_cpu_mem_usage=True, device_map={"": device})
 
     @torch.no_grad()
     def __call__(self, image):
         image = Image.fromarray(image)
-        inputs = self.processor(image, return_tensors="pt").to(self.device, torch.float16)
+        inputs = self.processor(image, return_tensors="pt").to(self.device, self.dtype)
 
         generated_ids = self.model.generate(**inputs, max_new_tokens=20)
         generated_text = self.processor.batch_decode(generated_ids, skip_special_tokens=True)[0].strip()
@@ -31,6 +34,35 @@ class BLIP2():
         return generated_text
 
 
+def segment_image(image, bg_remover, size=256, border_ratio=0.2, recenter=True):
+    # image: [H, W, 3/4] uint8 (bgr), bg_remover: callable returning the carved [H, W, 4] image
+    # return: [size, size, 4] uint8 with the object recentered, or the carved image if not recenter
+    carved_image = bg_remover(image) # [H, W, 4]
+    mask = carved_image[..., -1] > 0
+
+    if not recenter:
+        return carved_image
+
+    final_rgba = np.zeros((size, size, 4), dtype=np.uint8)
+
+    coords = np.nonzero(mask)
+    x_min, x_max = coords[0].min(), coords[0].max()
+    y_min, y_max = coords[1].min(), coords[1].max()
+    h = x_max - x_min
+    w = y_max - y_min
+    desired_size = int(size * (1 - border_ratio))
+    scale = desired_size / max(h, w)
+    h2 = int(h * scale)
+    w2 = int(w * scale)
+    x2_min = (size - h2) // 2
+    x2_max = x2_min + h2
+    y2_min = (size - w2) // 2
+    y2_max = y2_min + w2
+    final_rgba[x2_min:x2_max, y2_min:y2_max] = cv2.resize(carved_image[x_min:x_max, y_min:y_max], (w2, h2), interpolation=cv2.INTER_AREA)
+
+    return final_rgba
+
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
@@ -62,31 +94,7 @@ if __name__ == '__main__':
         
         # carve background
         print(f'[INFO] background removal...')
-        carved_image = rembg.remove(image, session=session) # [H, W, 4]
-        mask = carved_image[..., -1] > 0
-
-        # recenter
-        if opt.recenter:
-            print(f'[INFO] recenter...')
-            final_rgba = np.zeros((opt.size, opt.size, 4), dtype=np.uint8)
-            
-            coords = np.nonzero(mask)
-            x_min, x_max = coords[0].min(), coords[0].max()
-            y_min, y_max = coords[1].min(), coords[1].max()
-            h = x_max - x_min
-            w = y_max - y_min
-            desired_size = int(opt.size * (1 - opt.border_ratio))
-            scale = desired_size / max(h, w)
-            h2 = int(h * scale)
-            w2 = int(w * scale)
-            x2_min = (opt.size - h2) // 2
-            x2_max = x2_min + h2
-            y2_min = (opt.size - w2) // 2
-            y2_max = y2_min + w2
-            final_rgba[x2_min:x2_max, y2_min:y2_max] = cv2.resize(carved_image[x_min:x_max, y_min:y_max], (w2, h2), interpolation=cv2.INTER_AREA)
-            
-        else:
-            final_rgba = carved_image
+        final_rgba = segment_image(image, lambda x: rembg.remove(x, session=session), opt.size, opt.border_ratio, opt.recenter)
         
         # write image
         cv2.imwrite(out_rgba, final_rgba)
\ No newline at end of file
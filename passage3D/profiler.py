@@ -0,0 +1,178 @@
+import json
+import time
+import contextlib
+
+import torch
+
+from model_registry import resident_bytes
+
+
+def peak_resident_bytes():
+    # peak resident memory of the process, None if unknown (no resource module on windows)
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class StepProfiler:
+    # per-phase timing of the training steps, timed with cuda events on gpu (resolved once per step, at its end)
+    # and with time.perf_counter on cpu, plus memory counters and user counters (gaussian count...).
+    #   profiler = StepProfiler(device, enabled=True)
+    #   profiler.begin_step(step)
+    #   with profiler.span("render"):
+    #       out = renderer.render_batch(cams)
+    #   profiler.counter("gaussians", n)
+    #   t = profiler.end_step() # ms of the whole step
+    #   profiler.report(); profiler.save("logs/name_profile") # chrome trace (.json) and one line per step (.jsonl)
+    # with enabled=False only the whole step is timed (what the gui shows), span() and counter() are no-ops.
+    def __init__(self, device=None, enabled=True):
+        self.device = torch.device(device) if device is not None else torch.device("cpu")
+        self.cuda = self.device.type == "cuda" and torch.cuda.is_available()
+        self.enabled = enabled
+        # one dict per finished step: {"step", "start_ms", "time_ms", "spans": [(name, start_ms, time_ms, depth)], "counters"}
+        self.steps = []
+        self.origin = time.perf_counter()
+        self.current = None
+
+    def now(self):
+        # cpu timestamp (ms) relative to the creation of the profiler
+        return (time.perf_counter() - self.origin) * 1000
+
+    def mark(self):
+        if self.cuda:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            return event
+        return time.perf_counter()
+
+    def elapsed(self, start, end):
+        # ms between two marks (only called once the step is synchronized)
+        if self.cuda:
+            return start.elapsed_time(end)
+        return (end - start) * 1000
+
+    def begin_step(self, step):
+        if self.enabled and self.cuda:
+            torch.cuda.reset_peak_memory_stats(self.device)
+            allocations = torch.cuda.memory_stats(self.device).get("allocation.all.allocated", 0)
+        else:
+            allocations = None
+        self.current = {
+            "step": step,
+            "start_ms": self.now(),
+            "start": self.mark(),
+            "marks": [],
+            "depth": 0,
+            "counters": {},
+            "allocations": allocations,
+        }
+
+    @contextlib.contextmanager
+    def span(self, name):
+        if not self.enabled or self.current is None:
+            yield
+            return
+        current = self.current
+        depth = current["depth"]
+        current["depth"] += 1
+        start = self.mark()
+        try:
+            yield
+        finally:
+            current["marks"].append((name, start, self.mark(), depth))
+            current["depth"] = depth
+
+    def counter(self, name, value):
+        if self.enabled and self.current is not None:
+            self.current["counters"][name] = value
+
+    def end_step(self):
+        # synchronize, resolve the marks of the step and record its memory counters, return the step time (ms)
+        current, self.current = self.current, None
+        end = self.mark()
+        if self.cuda:
+            torch.cuda.synchronize(self.device)
+
+        start = current["start"]
+        time_ms = self.elapsed(start, end)
+        if not self.enabled:
+            # nothing else is kept, the memory stays flat over long gui sessions
+            return time_ms
+
+        counters = current["counters"]
+        if self.cuda:
+            counters["memory_bytes"] = torch.cuda.memory_allocated(self.device)
+            counters["peak_memory_bytes"] = torch.cuda.max_memory_allocated(self.device)
+            counters["allocations"] = torch.cuda.memory_stats(self.device).get("allocation.all.allocated", 0) - current["allocations"]
+        else:
+            counters["memory_bytes"] = resident_bytes()
+            counters["peak_memory_bytes"] = peak_resident_bytes()
+
+        self.steps.append({
+            "step": current["step"],
+            "start_ms": current["start_ms"],
+            "time_ms": time_ms,
+            # spans in start order (they are closed innermost first)
+            "spans": sorted(
+                [(name, self.elapsed(start, s), self.elapsed(s, e), depth) for name, s, e, depth in current["marks"]],
+                key=lambda x: (x[1], x[3]),
+            ),
+            "counters": counters,
+        })
+        return time_ms
+
+    def summary(self):
+        # per span name: number of calls, total and mean ms, share of the total step time (top level spans sum to <= 1)
+        total = sum(s["time_ms"] for s in self.steps)
+        spans = {}
+        for record in self.steps:
+            for name, _, t, depth in record["spans"]:
+                x = spans.setdefault(name, {"calls": 0, "total_ms": 0.0, "depth": depth})
+                x["calls"] += 1
+                x["total_ms"] += t
+        for x in spans.values():
+            x["mean_ms"] = x["total_ms"] / x["calls"]
+            x["share"] = x["total_ms"] / total if total > 0 else 0.0
+        return {"steps": len(self.steps), "total_ms": total, "spans": spans}
+
+    def report(self):
+        summary = self.summary()
+        if summary["steps"] == 0:
+            return
+        print(f"[INFO] {summary['steps']} steps in {summary['total_ms'] / 1000:.1f}s ({summary['total_ms'] / summary['steps']:.1f}ms per step)")
+        for name, x in sorted(summary["spans"].items(), key=lambda kv: -kv[1]["total_ms"]):
+            print(f"[INFO] {'  ' * x['depth']}{name:<{24 - 2 * x['depth']}} {x['total_ms'] / 1000:>8.2f}s {100 * x['share']:>6.1f}%  {x['mean_ms']:>9.2f}ms x {x['calls']}")
+        last = self.steps[-1]["counters"]
+        print("[INFO] last step: " + ", ".join(f"{k} = {v}" for k, v in last.items() if v is not None))
+
+    def chrome_trace(self):
+        # chrome://tracing / perfetto events: one complete event per step and per span, counters as counter events
+        # (gpu spans are placed at their gpu offset from the start of the step)
+        events = []
+        for record in self.steps:
+            ts = record["start_ms"] * 1000
+            events.append({"name": f"step {record['step']}", "cat": "step", "ph": "X", "pid": 0, "tid": 0, "ts": ts, "dur": record["time_ms"] * 1000})
+            for name, start, t, depth in record["spans"]:
+                events.append({"name": name, "cat": "span", "ph": "X", "pid": 0, "tid": 0, "ts": ts + start * 1000, "dur": t * 1000, "args": {"step": record["step"]}})
+            for name, value in record["counters"].items():
+                if value is not None:
+                    events.append({"name": name, "ph": "C", "pid": 0, "ts": ts, "args": {name: value}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        # path without extension: path.json (chrome trace) and path.jsonl (one record per step)
+        with open(path + ".json", "w") as f:
+            json.dump(self.chrome_trace(), f)
+        with open(path + ".jsonl", "w") as f:
+            for record in self.steps:
+                f.write(json.dumps({
+                    "step": record["step"],
+                    "time_ms": record["time_ms"],
+                    "spans": [{"name": name, "start_ms": start, "time_ms": t, "depth": depth} for name, start, t, depth in record["spans"]],
+                    "counters": record["counters"],
+                }) + "\n")
+        print(f"[INFO] saved profile to {path}.json and {path}.jsonl")
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+from omegaconf import OmegaConf
+
+sys.path.append('./')
+
+from artifact_cache import ArtifactCache
+from pipeline import Pipeline, STAGES
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config', default='configs/image.yaml', type=str)
+parser.add_argument('--assets', default=4, type=int)
+parser.add_argument('--scale', default=0.1, type=float, help='seconds per unit of synthetic work')
+parser.add_argument('--output_size', default=2 ** 20, type=int, help='bytes written by each stage')
+args = parser.parse_args()
+
+# relative cost of each stage
+COSTS = {"segment": 1, "stage1": 6, "stage2": 3, "video": 2}
+
+
+class SyntheticPipeline(Pipeline):
+    # the real stage bookkeeping and cache, stages replaced by sleeps writing random outputs
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.computed = []
+
+    def work(self, stage, files):
+        self.computed.append(stage)
+        time.sleep(COSTS[stage] * args.scale)
+        for f in files:
+            os.makedirs(os.path.dirname(f), exist_ok=True)
+            with open(f, 'wb') as fp:
+                fp.write(os.urandom(args.output_size))
+
+    def segment(self, path):
+        self.work("segment", [self.input_path(path)])
+
+    def stage1(self, opt):
+        self.work("stage1", [os.path.join(opt.outdir, opt.save_path + suffix) for suffix in ('_model.ply', '_mesh.obj', '_mesh.mtl', '_mesh_albedo.png')])
+
+    def stage2(self, opt):
+        self.work("stage2", [os.path.join(opt.outdir, opt.save_path + suffix) for suffix in ('.obj', '.mtl', '_albedo.png')])
+
+    def video(self, opt):
+        self.work("video", [os.path.join(self.video_dir, opt.save_path + '.mp4')])
+
+
+def run(tmp, opt, cache, stages=STAGES, images=None):
+    pipeline = SyntheticPipeline(opt, stages=stages, video_dir=os.path.join(tmp, 'videos'), cache=cache)
+    if images is None:
+        images = [os.path.join(tmp, 'data', f'asset{i}.png') for i in range(args.assets)]
+    t0 = time.perf_counter()
+    pipeline.run(images)
+    t = time.perf_counter() - t0
+    counts = {stage: pipeline.computed.count(stage) for stage in COSTS}
+    return t, counts
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, 'data'))
+        rng = np.random.default_rng(0)
+        for i in range(args.assets):
+            cv2.imwrite(os.path.join(tmp, 'data', f'asset{i}.png'), rng.integers(0, 255, (64, 64, 3), dtype=np.uint8))
+
+        opt = OmegaConf.merge(OmegaConf.load(args.config), {'outdir': os.path.join(tmp, 'logs')})
+        cache = ArtifactCache(os.path.join(tmp, 'cache'))
+
+        results = [
+            ('cold', run(tmp, opt, cache)),
+            ('warm', run(tmp, opt, cache)),
+            # a stage 2 option: segmentation and stage 1 restored, stage 2 and the video recomputed
+            ('iters_refine changed', run(tmp, OmegaConf.merge(opt, {'iters_refine': opt.iters_refine + 1}), cache)),
+            # a stage 1 option: everything after the segmentation is recomputed
+            ('iters changed', run(tmp, OmegaConf.merge(opt, {'iters': opt.iters + 1}), cache)),
+            # stage 1 rerun on its own, then stage 2 and the video: keyed by the stage 1 files they read, recomputed once
+            ('stage1 alone', run(tmp, opt, cache, stages=('stage1',))),
+            ('stage2 + video', run(tmp, opt, cache, stages=('stage2', 'video'))),
+            ('stage2 + video again', run(tmp, opt, cache, stages=('stage2', 'video'))),
+        ]
+
+        # same content under another name: segmented again, not restored under the name of the other image
+        copy = os.path.join(tmp, 'data', 'copy.png')
+        shutil.copy2(os.path.join(tmp, 'data', 'asset0.png'), copy)
+        _, counts = run(tmp, opt, cache, stages=('segment',), images=[copy])
+        assert counts['segment'] == 1 and os.path.exists(os.path.join(tmp, 'data', 'copy_rgba.png'))
+        size = cache.size()
+
+        # size limit: the least recently used entries are evicted
+        small = ArtifactCache(os.path.join(tmp, 'small'), max_bytes=args.output_size * 8)
+        run(tmp, opt, small)
+        _, evicted = run(tmp, opt, small)
+
+        print(f'{args.assets} assets, stages {COSTS} x {args.scale}s')
+        for name, (t, counts) in results:
+            print(f'{name:>22} {t:>7.2f}s computed {counts}')
+        print(f'{"cache size":>22} {size / 2 ** 20:.1f} MB')
+        print(f'{"limited cache":>22} {small.size() / 2 ** 20:.1f} MB <= {small.max_bytes / 2 ** 20:.1f} MB, computed on rerun {evicted}')
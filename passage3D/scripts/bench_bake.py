@@ -0,0 +1,135 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+sys.path.append('./')
+
+from cam_utils import orbit_camera, OrbitCamera
+from grid_put import mipmap_linear_grid_put_2d
+from mesh import Mesh
+from texture_bake import TextureBaker, rasterize_torch, interpolate_torch
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--texture_size', default=[512, 1024, 2048, 4096], type=int, nargs='+')
+parser.add_argument('--render_resolution', default=512, type=int)
+parser.add_argument('--faces', default=20000, type=int, help='approximate face count of the uv sphere')
+parser.add_argument('--no_reference', action='store_true', help='skip the per-view mipmap + kd-tree dilation baseline')
+args = parser.parse_args()
+
+# same views as save_model('geo+tex')
+vers = [0] * 8 + [-45] * 8 + [45] * 8 + [-89.9, 89.9]
+hors = [0, 45, -45, 90, -90, 135, -135, 180] * 3 + [0, 0]
+
+
+def make_sphere(num_faces, radius=0.5):
+    rows = max(2, int(np.sqrt(num_faces / 4)))
+    cols = 2 * rows
+    theta, phi = np.meshgrid(np.linspace(0, np.pi, rows + 1), np.linspace(0, 2 * np.pi, cols + 1), indexing='ij')
+    vn = np.stack([np.sin(theta) * np.cos(phi), np.cos(theta), np.sin(theta) * np.sin(phi)], axis=-1).reshape(-1, 3)
+    vt = np.stack([phi / (2 * np.pi), theta / np.pi], axis=-1).reshape(-1, 2)
+    ids = np.arange((rows + 1) * (cols + 1)).reshape(rows + 1, cols + 1)
+    quads = np.stack([ids[:-1, :-1], ids[1:, :-1], ids[1:, 1:], ids[:-1, 1:]], axis=-1).reshape(-1, 4)
+    f = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]], axis=0)
+    f = torch.from_numpy(f.astype(np.int32))
+    return Mesh(
+        v=torch.from_numpy((vn * radius).astype(np.float32)), f=f,
+        vn=torch.from_numpy(vn.astype(np.float32)), fn=f,
+        vt=torch.from_numpy(vt.astype(np.float32)), ft=f,
+        device=torch.device('cpu'),
+    )
+
+
+def make_texture(size=2048):
+    # smooth color ramps plus a checker, [H, W, 3]
+    v, u = torch.meshgrid(torch.linspace(0, 1, size), torch.linspace(0, 1, size), indexing='ij')
+    checker = ((u * 16).floor() + (v * 8).floor()) % 2
+    return torch.stack([u, v, 0.25 + 0.5 * checker], dim=-1)
+
+
+def render_views(mesh, texture, cam):
+    # ground truth renders of the textured mesh, [V, 3, H, W]
+    images = []
+    proj = torch.from_numpy(cam.perspective.astype(np.float32))
+    for ver, hor in zip(vers, hors):
+        pose = torch.from_numpy(orbit_camera(ver, hor, cam.radius).astype(np.float32))
+        v_clip = F.pad(mesh.v, pad=(0, 1), mode='constant', value=1.0) @ torch.inverse(pose).T @ proj.T
+        rast = rasterize_torch(v_clip, mesh.f, (cam.H, cam.W))
+        uvs = interpolate_torch(mesh.vt, rast, mesh.ft) # [1, H, W, 2]
+        rgb = F.grid_sample(texture.permute(2, 0, 1).unsqueeze(0), uvs * 2 - 1, mode='bilinear', align_corners=True)
+        alpha = (rast[..., 3] > 0).float().unsqueeze(1)
+        images.append((rgb * alpha + (1 - alpha))[0])
+    return torch.stack(images)
+
+
+def reference_bake(mesh, images, cam, texture_size):
+    # previous save_model path: per-view mipmap splat, first view wins, kd-tree dilation
+    from sklearn.neighbors import NearestNeighbors
+    from scipy.ndimage import binary_dilation, binary_erosion
+
+    h = w = texture_size
+    albedo = torch.zeros((h, w, 3), dtype=torch.float32)
+    cnt = torch.zeros((h, w, 1), dtype=torch.float32)
+    baker = TextureBaker(mesh, texture_size)
+    for ver, hor, rgbs in zip(vers, hors, images):
+        baker.uvs, baker.colors, baker.weights = [], [], []
+        baker.add_view(rgbs, orbit_camera(ver, hor, cam.radius), cam.perspective)
+        cur_albedo, cur_cnt = mipmap_linear_grid_put_2d(
+            h, w, baker.uvs[0][..., [1, 0]] * 2 - 1, baker.colors[0], min_resolution=256, return_count=True,
+        )
+        mask = cnt.squeeze(-1) < 0.1
+        albedo[mask] += cur_albedo[mask]
+        cnt[mask] += cur_cnt[mask]
+
+    mask = cnt.squeeze(-1) > 0
+    albedo[mask] = albedo[mask] / cnt[mask].repeat(1, 3)
+    albedo = albedo.numpy()
+    mask = mask.numpy()
+
+    inpaint_region = binary_dilation(mask, iterations=32)
+    inpaint_region[mask] = 0
+    search_region = mask.copy()
+    not_search_region = binary_erosion(search_region, iterations=3)
+    search_region[not_search_region] = 0
+    search_coords = np.stack(np.nonzero(search_region), axis=-1)
+    inpaint_coords = np.stack(np.nonzero(inpaint_region), axis=-1)
+    knn = NearestNeighbors(n_neighbors=1, algorithm="kd_tree").fit(search_coords)
+    _, indices = knn.kneighbors(inpaint_coords)
+    albedo[tuple(inpaint_coords.T)] = albedo[tuple(search_coords[indices[:, 0]].T)]
+    return torch.from_numpy(albedo)
+
+
+def psnr(a, b):
+    return (-10 * torch.log10(((a - b) ** 2).mean())).item()
+
+
+if __name__ == '__main__':
+    mesh = make_sphere(args.faces)
+    texture = make_texture()
+    cam = OrbitCamera(args.render_resolution, args.render_resolution, r=2, fovy=49.1)
+
+    t0 = time.perf_counter()
+    images = render_views(mesh, texture, cam)
+    print(f'[INFO] {mesh.f.shape[0]} faces, {len(images)} views rendered in {time.perf_counter() - t0:.2f}s')
+
+    print(f'{"size":>6} {"views s":>8} {"bake s":>8} {"total s":>8} {"covered":>8} {"psnr":>7} {"ref s":>8} {"ref psnr":>8}')
+    for size in args.texture_size:
+        gt = F.interpolate(texture.permute(2, 0, 1).unsqueeze(0), (size, size), mode='bilinear', align_corners=True)[0].permute(1, 2, 0)
+
+        t0 = time.perf_counter()
+        baker = TextureBaker(mesh, size)
+        for ver, hor, rgbs in zip(vers, hors, images):
+            baker.add_view(rgbs, orbit_camera(ver, hor, cam.radius), cam.perspective)
+        t1 = time.perf_counter()
+        albedo, mask = baker.bake()
+        t2 = time.perf_counter()
+
+        line = f'{size:>6} {t1 - t0:>8.2f} {t2 - t1:>8.2f} {t2 - t0:>8.2f} {mask.float().mean().item():>8.3f} {psnr(albedo, gt):>7.2f}'
+        if not args.no_reference:
+            t0 = time.perf_counter()
+            ref = reference_bake(mesh, images, cam, size)
+            line += f' {time.perf_counter() - t0:>8.2f} {psnr(ref, gt):>8.2f}'
+        print(line)
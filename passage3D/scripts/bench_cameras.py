@@ -0,0 +1,85 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+
+sys.path.append('./')
+
+from cam_utils import orbit_camera, orbit_cameras, look_at, OrbitCamera
+from gs_renderer import MiniCam, MiniCams
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', default=[4, 16, 64, 256], type=int, nargs='+', help='number of cameras')
+parser.add_argument('--repeat', default=20, type=int)
+args = parser.parse_args()
+
+
+def check_parity(n, device):
+    # batched functions against the scalar ones, numpy and torch inputs
+    rng = np.random.default_rng(n)
+    vers = rng.uniform(-89, 89, n)
+    hors = rng.uniform(-180, 180, n)
+    radii = rng.uniform(1, 3, n)
+    cam = OrbitCamera(512, 512, r=2, fovy=49.1)
+
+    ref = np.stack([orbit_camera(v, h, r) for v, h, r in zip(vers, hors, radii)])
+    poses = orbit_cameras(vers, hors, radii)
+    assert poses.dtype == np.float32 and poses.shape == (n, 4, 4)
+    np.testing.assert_allclose(poses, ref, atol=1e-6)
+
+    poses_torch = orbit_cameras(torch.from_numpy(vers).float().to(device), torch.from_numpy(hors).float().to(device), torch.from_numpy(radii).float().to(device))
+    np.testing.assert_allclose(poses_torch.cpu().numpy(), ref, atol=1e-5)
+
+    # scalar radius and target, opencv convention
+    target = np.array([0.1, -0.2, 0.3], dtype=np.float32)
+    ref = np.stack([orbit_camera(v, h, 2, target=target, opengl=False) for v, h in zip(vers, hors)])
+    np.testing.assert_allclose(orbit_cameras(vers, hors, 2, target=target, opengl=False), ref, atol=1e-6)
+
+    campos = ref[:, :3, 3]
+    np.testing.assert_allclose(look_at(torch.from_numpy(campos), torch.from_numpy(target)).numpy(), np.stack([look_at(c, target) for c in campos]), atol=1e-6)
+
+    ref_cams = [MiniCam(pose, 256, 256, cam.fovy, cam.fovx, cam.near, cam.far, device=device) for pose in poses]
+    cams = MiniCams(poses, 256, 256, cam.fovy, cam.fovx, cam.near, cam.far, device=device)
+    for name in ('world_view_transform', 'full_proj_transform', 'camera_center'):
+        ref_value = torch.stack([getattr(c, name) for c in ref_cams])
+        torch.testing.assert_close(getattr(cams, name), ref_value, atol=1e-5, rtol=1e-5)
+
+
+def timed(fn):
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return (time.perf_counter() - t0) / args.repeat
+
+
+if __name__ == '__main__':
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    cam = OrbitCamera(512, 512, r=2, fovy=49.1)
+
+    for n in args.sizes:
+        check_parity(n, device)
+    print(f'[INFO] parity ok for {args.sizes} cameras on {device}')
+
+    for n in args.sizes:
+        vers = np.random.randint(-30, 30, n)
+        hors = np.random.randint(-180, 180, n)
+
+        def loop():
+            # previous train_step: one orbit_camera and one MiniCam per view, then np.stack
+            poses = [orbit_camera(v, h, 2) for v, h in zip(vers, hors)]
+            cams = [MiniCam(pose, 256, 256, cam.fovy, cam.fovx, cam.near, cam.far, device=device) for pose in poses]
+            return torch.from_numpy(np.stack(poses)).to(device), cams
+
+        def batched():
+            poses = orbit_cameras(vers, hors, 2)
+            cams = MiniCams(poses, 256, 256, cam.fovy, cam.fovx, cam.near, cam.far, device=device)
+            return torch.from_numpy(poses).to(device), cams
+
+        t_loop, t_batched = timed(loop), timed(batched)
+        print(f'{n:>5} cameras  loop {t_loop * 1000:>8.2f}ms  batched {t_batched * 1000:>8.2f}ms  x{t_loop / t_batched:.1f}')
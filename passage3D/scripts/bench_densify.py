@@ -0,0 +1,89 @@
+import sys
+import time
+import argparse
+
+import torch
+from torch import nn
+from torch.profiler import profile, ProfilerActivity
+from omegaconf import OmegaConf
+
+sys.path.append('./')
+
+from gs_renderer import GaussianModel, inverse_sigmoid
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config', default='configs/image.yaml', type=str, help='config providing the optimizer / densification settings')
+parser.add_argument('--num', default=[10000, 50000, 100000, 500000], type=int, nargs='+', help='initial gaussian counts')
+parser.add_argument('--interval', default=10, type=int, help='optimizer steps per densification interval')
+parser.add_argument('--repeat', default=5, type=int, help='densification intervals per measurement')
+parser.add_argument('--ratio', default=0.05, type=float, help='fraction of gaussians densified / pruned per interval')
+args = parser.parse_args()
+
+opt = OmegaConf.load(args.config)
+device = torch.device('cpu')
+
+
+def make_gaussians(num, pooled):
+    gaussians = GaussianModel(opt.sh_degree, pooled=pooled)
+    gaussians._xyz = nn.Parameter(torch.randn(num, 3, device=device) * 0.3)
+    gaussians._features_dc = nn.Parameter(torch.rand(num, 1, 3, device=device))
+    gaussians._features_rest = nn.Parameter(torch.zeros(num, (opt.sh_degree + 1) ** 2 - 1, 3, device=device))
+    gaussians._scaling = nn.Parameter(torch.log(torch.rand(num, 3, device=device) * 0.02 + 1e-3))
+    gaussians._rotation = nn.Parameter(torch.nn.functional.normalize(torch.randn(num, 4, device=device)))
+    gaussians._opacity = nn.Parameter(inverse_sigmoid(0.1 * torch.ones(num, 1, device=device)))
+    gaussians.max_radii2D = torch.zeros(num, device=device)
+    gaussians.spatial_lr_scale = 1
+    gaussians.training_setup(opt)
+    return gaussians
+
+
+def run_interval(gaussians):
+    # optimizer steps with a dummy loss touching every parameter
+    for _ in range(args.interval):
+        loss = 0
+        for param in [gaussians._xyz, gaussians._features_dc, gaussians._features_rest, gaussians._opacity, gaussians._scaling, gaussians._rotation]:
+            loss = loss + (param * torch.randn_like(param)).sum()
+        loss.backward()
+        gaussians.optimizer.step()
+        gaussians.optimizer.zero_grad()
+
+    # fake densification stats / low opacities so that ~ratio of points are cloned, split and pruned
+    with torch.no_grad():
+        n = gaussians.get_xyz.shape[0]
+        gaussians.xyz_gradient_accum[:] = torch.where(torch.rand(n, 1, device=device) < 2 * args.ratio, 1.0, 0.0)
+        gaussians.denom[:] = 1
+        gaussians._opacity[torch.rand(n, device=device) < args.ratio] = -10
+
+
+def densify(gaussians):
+    gaussians.densify_and_prune(opt.densify_grad_threshold, min_opacity=0.01, extent=4, max_screen_size=None)
+
+
+print(f'{"num":>8} {"mode":>7} {"final":>8} {"step ms":>9} {"densify ms":>11} {"allocs":>7} {"alloc MB":>9}')
+
+for num in args.num:
+    for pooled in [False, True]:
+        torch.manual_seed(0)
+        gaussians = make_gaussians(num, pooled)
+
+        t_step, t_densify = 0, 0
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            run_interval(gaussians)
+            t1 = time.perf_counter()
+            densify(gaussians)
+            t2 = time.perf_counter()
+            t_step += t1 - t0
+            t_densify += t2 - t1
+
+        # one more interval under the profiler to count allocations made by densify & prune
+        run_interval(gaussians)
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            densify(gaussians)
+        allocs = [e.self_cpu_memory_usage for e in prof.events() if e.self_cpu_memory_usage > 0]
+
+        print(
+            f'{num:>8} {"pooled" if pooled else "legacy":>7} {gaussians.get_xyz.shape[0]:>8} '
+            f'{t_step / args.repeat / args.interval * 1000:>9.2f} {t_densify / args.repeat * 1000:>11.2f} '
+            f'{len(allocs):>7} {sum(allocs) / 2 ** 20:>9.1f}'
+        )
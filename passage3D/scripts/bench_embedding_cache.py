@@ -0,0 +1,64 @@
+import sys
+import time
+import argparse
+import tempfile
+
+import torch
+import torch.nn.functional as F
+
+sys.path.append('./')
+
+from guidance.embedding_cache import EmbeddingCache
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--input', default='data/anya_rgba.png', type=str, help='reference image of zero123')
+parser.add_argument('--prompt', default='a photo of a cat', type=str, help='prompt of stable diffusion')
+parser.add_argument('--ref_size', default=256, type=int)
+parser.add_argument('--runs', default=5, type=int)
+args = parser.parse_args()
+
+
+def sync():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def timed(fn, *inputs):
+    sync()
+    t0 = time.perf_counter()
+    fn(*inputs)
+    sync()
+    return time.perf_counter() - t0
+
+
+def bench(name, fn, *inputs, guidance, cache_dir):
+    # uncached, then a fresh disk cache (first run computes, the next ones hit memory), then a new cache on the same directory
+    guidance.embedding_cache = None
+    t_none = min(timed(fn, *inputs) for _ in range(args.runs))
+
+    guidance.embedding_cache = EmbeddingCache(cache_dir)
+    t_cold = timed(fn, *inputs)
+    t_memory = min(timed(fn, *inputs) for _ in range(args.runs))
+
+    guidance.embedding_cache = EmbeddingCache(cache_dir)
+    t_disk = timed(fn, *inputs)
+    print(f'{name:>16} encoders {t_none * 1000:>8.1f}ms  first {t_cold * 1000:>8.1f}ms  memory {t_memory * 1000:>8.1f}ms  disk {t_disk * 1000:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    import kiui
+
+    device = torch.device('cuda')
+    image = kiui.read_image(args.input, mode='tensor')[..., :3]
+    image = image.permute(2, 0, 1).unsqueeze(0).contiguous().to(device)
+    image = F.interpolate(image, (args.ref_size, args.ref_size), mode='bilinear', align_corners=False)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        from guidance.zero123_utils import Zero123
+        zero123 = Zero123(device)
+        bench('zero123 image', zero123.get_img_embeds, image, guidance=zero123, cache_dir=cache_dir)
+        del zero123
+
+        from guidance.sd_utils import StableDiffusion
+        sd = StableDiffusion(device)
+        bench('sd text', sd.get_text_embeds, [args.prompt], [''], guidance=sd, cache_dir=cache_dir)
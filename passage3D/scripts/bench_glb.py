@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+import trimesh
+
+sys.path.append('./')
+
+from mesh import Mesh
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--mesh', default=None, type=str, help='mesh to export (default: a textured uv sphere)')
+parser.add_argument('--faces', default=[20000, 500000], type=int, nargs='+', help='approximate face counts of the generated spheres')
+parser.add_argument('--texture_size', default=1024, type=int)
+args = parser.parse_args()
+
+VARIANTS = {
+    'baseline': dict(quantize=False, image_format='png', optimize=False),
+    'optimize': dict(quantize=False, image_format='png', optimize=True),
+    'quantize': dict(quantize=True, image_format='png', optimize=True),
+    'quant+jpg': dict(quantize=True, image_format='jpeg', optimize=True),
+}
+
+
+def make_sphere(num_faces):
+    # uv sphere with vertex uvs and a smooth texture
+    rows = max(2, int(np.sqrt(num_faces / 4)))
+    cols = 2 * rows
+    theta, phi = np.meshgrid(np.linspace(0, np.pi, rows + 1), np.linspace(0, 2 * np.pi, cols + 1), indexing='ij')
+    v = np.stack([np.sin(theta) * np.cos(phi), np.cos(theta), np.sin(theta) * np.sin(phi)], axis=-1).reshape(-1, 3)
+    vt = np.stack([phi / (2 * np.pi), theta / np.pi], axis=-1).reshape(-1, 2)
+    ids = np.arange((rows + 1) * (cols + 1)).reshape(rows + 1, cols + 1)
+    quads = np.stack([ids[:-1, :-1], ids[1:, :-1], ids[1:, 1:], ids[:-1, 1:]], axis=-1).reshape(-1, 4)
+    f = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]], axis=0)
+
+    u, w = np.meshgrid(np.linspace(0, 1, args.texture_size), np.linspace(0, 1, args.texture_size))
+    albedo = np.stack([u, w, 0.5 + 0.5 * np.sin(20 * u) * np.cos(20 * w)], axis=-1)
+
+    mesh = Mesh(
+        v=torch.from_numpy(v).float(), f=torch.from_numpy(f).int(),
+        vt=torch.from_numpy(vt).float(), ft=torch.from_numpy(f).int(),
+        albedo=torch.from_numpy(albedo).float(), device='cpu',
+    )
+    mesh.vc = mesh.v * 0.5 + 0.5
+    return mesh
+
+
+meshes = [(os.path.basename(args.mesh), Mesh.load(args.mesh, resize=False, device='cpu'))] if args.mesh is not None else [(f'sphere {n}', make_sphere(n)) for n in args.faces]
+
+print(f'{"mesh":>14} {"variant":>10} {"KB":>9} {"write s":>8} {"load s":>7} {"max v err":>10}')
+
+with tempfile.TemporaryDirectory() as workspace:
+    path = os.path.join(workspace, 'bench.glb')
+    for name, mesh in meshes:
+        for variant, options in VARIANTS.items():
+            t0 = time.perf_counter()
+            mesh.write_glb(path, **options)
+            t_write = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            loaded = trimesh.load(path, force='mesh', process=False)
+            t_load = time.perf_counter() - t0
+
+            # positions are compared as point sets, the vertex order may change
+            err = trimesh.proximity.ProximityQuery(loaded).vertex(mesh.v.numpy())[0].max() if len(mesh.v) < 100000 else float('nan')
+
+            print(f'{name:>14} {variant:>10} {os.path.getsize(path) / 1024:>9.1f} {t_write:>8.2f} {t_load:>7.2f} {err:>10.2e}')
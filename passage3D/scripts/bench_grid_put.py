@@ -0,0 +1,102 @@
+import sys
+import time
+import argparse
+
+import torch
+
+sys.path.append('./')
+
+from grid_put import scatter_add_nd_with_count, linear_grid_put_2d, linear_grid_put_3d
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--num', default=[100000, 1000000, 10000000], type=int, nargs='+', help='number of samples')
+parser.add_argument('--res2d', default=1024, type=int)
+parser.add_argument('--res3d', default=128, type=int)
+parser.add_argument('--channels', default=3, type=int)
+parser.add_argument('--repeat', default=3, type=int)
+args = parser.parse_args()
+
+
+def reference_linear_grid_put_2d(H, W, coords, values):
+    # previous implementation: one scatter_add_nd_with_count per bilinear corner
+    C = values.shape[-1]
+    indices = (coords * 0.5 + 0.5) * torch.tensor([H - 1, W - 1], dtype=torch.float32, device=coords.device)
+    indices_00 = indices.floor().long()
+    indices_00[:, 0].clamp_(0, H - 2)
+    indices_00[:, 1].clamp_(0, W - 2)
+    h = indices[..., 0] - indices_00[..., 0].float()
+    w = indices[..., 1] - indices_00[..., 1].float()
+
+    result = torch.zeros(H, W, C, device=values.device, dtype=values.dtype)
+    count = torch.zeros(H, W, 1, device=values.device, dtype=values.dtype)
+    weights = torch.ones_like(values[..., :1])
+    for offset, wc in [
+        ([0, 0], (1 - h) * (1 - w)),
+        ([0, 1], (1 - h) * w),
+        ([1, 0], h * (1 - w)),
+        ([1, 1], h * w),
+    ]:
+        corner = indices_00 + torch.tensor(offset, dtype=torch.long, device=indices.device)
+        result, count = scatter_add_nd_with_count(result, count, corner, values * wc.unsqueeze(1), weights * wc.unsqueeze(1))
+    return result, count
+
+
+def reference_linear_grid_put_3d(H, W, D, coords, values):
+    # previous implementation with each corner weighted by its own trilinear coefficient
+    # (the old code paired corner [0, 0, 1] with the [0, 1, 0] coefficient and so on)
+    C = values.shape[-1]
+    indices = (coords * 0.5 + 0.5) * torch.tensor([H - 1, W - 1, D - 1], dtype=torch.float32, device=coords.device)
+    indices_000 = indices.floor().long()
+    indices_000[:, 0].clamp_(0, H - 2)
+    indices_000[:, 1].clamp_(0, W - 2)
+    indices_000[:, 2].clamp_(0, D - 2)
+    h = indices[..., 0] - indices_000[..., 0].float()
+    w = indices[..., 1] - indices_000[..., 1].float()
+    d = indices[..., 2] - indices_000[..., 2].float()
+
+    result = torch.zeros(H, W, D, C, device=values.device, dtype=values.dtype)
+    count = torch.zeros(H, W, D, 1, device=values.device, dtype=values.dtype)
+    weights = torch.ones_like(values[..., :1])
+    for offset, wc in [
+        ([0, 0, 0], (1 - h) * (1 - w) * (1 - d)),
+        ([0, 0, 1], (1 - h) * (1 - w) * d),
+        ([0, 1, 0], (1 - h) * w * (1 - d)),
+        ([0, 1, 1], (1 - h) * w * d),
+        ([1, 0, 0], h * (1 - w) * (1 - d)),
+        ([1, 0, 1], h * (1 - w) * d),
+        ([1, 1, 0], h * w * (1 - d)),
+        ([1, 1, 1], h * w * d),
+    ]:
+        corner = indices_000 + torch.tensor(offset, dtype=torch.long, device=indices.device)
+        result, count = scatter_add_nd_with_count(result, count, corner, values * wc.unsqueeze(1), weights * wc.unsqueeze(1))
+    return result, count
+
+
+def timed(fn, *inputs):
+    best = float('inf')
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        out = fn(*inputs)
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+if __name__ == '__main__':
+    torch.manual_seed(0)
+    print(f'{"dim":>4} {"N":>10} {"ref s":>8} {"fused s":>8} {"speedup":>8} {"equal":>6}')
+    for N in args.num:
+        values = torch.rand(N, args.channels)
+
+        R = args.res2d
+        coords = torch.rand(N, 2) * 2 - 1
+        ref, t_ref = timed(reference_linear_grid_put_2d, R, R, coords, values)
+        out, t_out = timed(linear_grid_put_2d, R, R, coords, values, True)
+        equal = torch.equal(ref[0], out[0]) and torch.equal(ref[1], out[1])
+        print(f'{2:>4} {N:>10} {t_ref:>8.3f} {t_out:>8.3f} {t_ref / t_out:>8.2f} {str(equal):>6}')
+
+        R = args.res3d
+        coords = torch.rand(N, 3) * 2 - 1
+        ref, t_ref = timed(reference_linear_grid_put_3d, R, R, R, coords, values)
+        out, t_out = timed(linear_grid_put_3d, R, R, R, coords, values, True)
+        equal = torch.equal(ref[0], out[0]) and torch.equal(ref[1], out[1])
+        print(f'{3:>4} {N:>10} {t_ref:>8.3f} {t_out:>8.3f} {t_ref / t_out:>8.2f} {str(equal):>6}')
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.append('./')
+
+from job_queue import JobQueue, Scheduler, STAGE_CLASSES
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--assets', default=8, type=int)
+parser.add_argument('--scale', default=0.1, type=float, help='seconds per unit of synthetic work')
+parser.add_argument('--cpu_workers', default=2, type=int)
+parser.add_argument('--fail_prob', default=0.2, type=float, help='probability that a job fails on its first attempt')
+args = parser.parse_args()
+
+# relative cost of each stage (sleeping releases the gil like the real kernels / external libraries do)
+COSTS = {"segment": 1, "stage1": 6, "stage2": 3, "video": 2}
+STAGES = list(COSTS)
+
+
+def make_runner(fail_prob=0, seed=0):
+    rng = random.Random(seed)
+    failed = set()
+    lock = threading.Lock()
+
+    def runner(stage, asset, payload):
+        with lock:
+            fail = (asset, stage) not in failed and rng.random() < fail_prob
+            if fail:
+                failed.add((asset, stage))
+        time.sleep(COSTS[stage] * args.scale * (0.5 if fail else 1))
+        if fail:
+            raise RuntimeError(f"synthetic failure of {asset}/{stage}")
+
+    return runner
+
+
+def run_queue(path, runner, workers):
+    queue = JobQueue(path)
+    for i in range(args.assets):
+        queue.add(f"asset{i}", STAGES, {"index": i})
+    t0 = time.perf_counter()
+    summary = Scheduler(queue, runner, workers=workers, verbose=False).run()
+    t = time.perf_counter() - t0
+    queue.close()
+    return summary, t
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        # sequential baseline, like runall.py
+        runner = make_runner()
+        t0 = time.perf_counter()
+        for i in range(args.assets):
+            for stage in STAGES:
+                runner(stage, f"asset{i}", None)
+        t_seq = time.perf_counter() - t0
+
+        summary, t_one = run_queue(os.path.join(tmp, 'one.db'), make_runner(), {"cpu": 1, "gpu": 1})
+        summary, t_pool = run_queue(os.path.join(tmp, 'pool.db'), make_runner(), {"cpu": args.cpu_workers, "gpu": 1})
+        summary_fail, t_fail = run_queue(os.path.join(tmp, 'fail.db'), make_runner(args.fail_prob), {"cpu": args.cpu_workers, "gpu": 1})
+
+        # crash in the middle: jobs left running are resumed by the next scheduler
+        path = os.path.join(tmp, 'crash.db')
+        queue = JobQueue(path)
+        for i in range(args.assets):
+            queue.add(f"asset{i}", STAGES, {"index": i})
+        for _ in range(3):
+            queue.claim(STAGES) # claimed, never completed
+        queue.close()
+        summary_crash, t_crash = run_queue(path, make_runner(), {"cpu": args.cpu_workers, "gpu": 1})
+
+        gpu_bound = args.assets * sum(c for s, c in COSTS.items() if STAGE_CLASSES[s] == "gpu") * args.scale
+        print(f'{args.assets} assets, stages {COSTS} x {args.scale}s, gpu-bound lower limit {gpu_bound:.2f}s')
+        print(f'{"sequential":>24} {t_seq:>7.2f}s {args.assets / t_seq:>6.2f} assets/s')
+        print(f'{"queue 1 cpu + 1 gpu":>24} {t_one:>7.2f}s {args.assets / t_one:>6.2f} assets/s')
+        print(f'{f"queue {args.cpu_workers} cpu + 1 gpu":>24} {t_pool:>7.2f}s {args.assets / t_pool:>6.2f} assets/s  {summary}')
+        print(f'{"with retries":>24} {t_fail:>7.2f}s {args.assets / t_fail:>6.2f} assets/s  {summary_fail}')
+        print(f'{"resumed after crash":>24} {t_crash:>7.2f}s {args.assets / t_crash:>6.2f} assets/s  {summary_crash}')
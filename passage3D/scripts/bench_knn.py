@@ -0,0 +1,61 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+
+sys.path.append('./')
+
+from knn_utils import distCPU2, distCUDA2
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--num', default=[5000, 50000, 200000, 1000000], type=int, nargs='+', help='point counts')
+parser.add_argument('--repeat', default=3, type=int)
+args = parser.parse_args()
+
+
+def sample_points(num, seed=0):
+    # same init distribution as Renderer.initialize (uniform in a ball of radius 0.5)
+    rng = np.random.default_rng(seed)
+    phis = rng.random(num) * 2 * np.pi
+    costheta = rng.random(num) * 2 - 1
+    thetas = np.arccos(costheta)
+    radius = 0.5 * np.cbrt(rng.random(num))
+    xyz = np.stack([radius * np.sin(thetas) * np.cos(phis), radius * np.sin(thetas) * np.sin(phis), radius * np.cos(thetas)], axis=1)
+    return torch.from_numpy(xyz).float()
+
+
+def timeit(fn, *inputs):
+    fn(*inputs) # warmup
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        out = fn(*inputs)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return out, (time.perf_counter() - t0) / args.repeat * 1000
+
+
+# exactness check against brute force on a small fixture (with duplicated points)
+points = sample_points(1000)
+points = torch.cat([points, points[:10]], dim=0)
+brute = torch.cdist(points.double(), points.double()) ** 2
+brute.fill_diagonal_(float('inf'))
+brute = brute.topk(3, dim=-1, largest=False).values.mean(-1).float()
+err = (distCPU2(points) - brute).abs().max().item()
+print(f'[INFO] cpu vs brute force max abs err: {err:.3e}')
+
+use_cuda = distCUDA2 is not None and torch.cuda.is_available()
+print(f'{"num":>8} {"cpu ms":>9}' + (f' {"cuda ms":>9} {"max rel err":>12}' if use_cuda else ''))
+
+for num in args.num:
+    points = sample_points(num)
+    d_cpu, t_cpu = timeit(distCPU2, points)
+    line = f'{num:>8} {t_cpu:>9.2f}'
+    if use_cuda:
+        d_cuda, t_cuda = timeit(distCUDA2, points.cuda())
+        rel = ((d_cpu - d_cuda.cpu()).abs() / d_cuda.cpu().clamp_min(1e-12)).max().item()
+        line += f' {t_cuda:>9.2f} {rel:>12.3e}'
+    print(line)
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+
+sys.path.append('./')
+
+from mesh import Mesh, parse_f_v
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--faces', default=[100000, 500000, 2000000], type=int, nargs='+', help='approximate face counts')
+parser.add_argument('--forms', default=['v', 'v/vt/vn', 'v//vn', 'quad'], type=str, nargs='+', help='face forms to test')
+parser.add_argument('--no_reference', action='store_true', help='skip the (slow) line by line reference parser / writer')
+args = parser.parse_args()
+
+
+def make_obj(path, num_faces, form):
+    # uv sphere written with the given face form ('quad' writes v/vt/vn quads)
+    rows = max(2, int(np.sqrt(num_faces / 4)))
+    cols = 2 * rows
+    theta, phi = np.meshgrid(np.linspace(0, np.pi, rows + 1), np.linspace(0, 2 * np.pi, cols + 1), indexing='ij')
+    v = np.stack([np.sin(theta) * np.cos(phi), np.cos(theta), np.sin(theta) * np.sin(phi)], axis=-1).reshape(-1, 3)
+    vt = np.stack([phi / (2 * np.pi), theta / np.pi], axis=-1).reshape(-1, 2)
+
+    ids = np.arange((rows + 1) * (cols + 1)).reshape(rows + 1, cols + 1) + 1
+    quads = np.stack([ids[:-1, :-1], ids[1:, :-1], ids[1:, 1:], ids[:-1, 1:]], axis=-1).reshape(-1, 4)
+    if form == 'quad':
+        f = quads
+    else:
+        f = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]], axis=0)
+
+    with open(path, 'w') as fp:
+        np.savetxt(fp, v, fmt='v %.6f %.6f %.6f')
+        np.savetxt(fp, vt, fmt='vt %.6f %.6f')
+        np.savetxt(fp, v, fmt='vn %.6f %.6f %.6f')
+        if form == 'v':
+            np.savetxt(fp, f, fmt='f' + ' %d' * f.shape[1])
+        elif form == 'v//vn':
+            np.savetxt(fp, np.repeat(f, 2, axis=1), fmt='f' + ' %d//%d' * f.shape[1])
+        else:
+            np.savetxt(fp, np.repeat(f, 3, axis=1), fmt='f' + ' %d/%d/%d' * f.shape[1])
+    return f.shape[0]
+
+
+def reference_parse(path):
+    # line by line parser load_obj used before the bulk one
+    with open(path, 'r') as fp:
+        lines = fp.readlines()
+    vertices, texcoords, normals = [], [], []
+    faces, tfaces, nfaces = [], [], []
+    for line in lines:
+        split_line = line.split()
+        if len(split_line) == 0:
+            continue
+        prefix = split_line[0].lower()
+        if prefix == 'v':
+            vertices.append([float(v) for v in split_line[1:]])
+        elif prefix == 'vn':
+            normals.append([float(v) for v in split_line[1:]])
+        elif prefix == 'vt':
+            val = [float(v) for v in split_line[1:]]
+            texcoords.append([val[0], 1.0 - val[1]])
+        elif prefix == 'f':
+            vs = split_line[1:]
+            v0, t0, n0 = parse_f_v(vs[0])
+            for i in range(len(vs) - 2):
+                v1, t1, n1 = parse_f_v(vs[i + 1])
+                v2, t2, n2 = parse_f_v(vs[i + 2])
+                faces.append([v0, v1, v2])
+                tfaces.append([t0, t1, t2])
+                nfaces.append([n0, n1, n2])
+    return {
+        'v': torch.tensor(vertices, dtype=torch.float32),
+        'vt': torch.tensor(texcoords, dtype=torch.float32),
+        'vn': torch.tensor(normals, dtype=torch.float32),
+        'f': torch.tensor(faces, dtype=torch.int32),
+        'ft': torch.tensor(tfaces, dtype=torch.int32),
+        'fn': torch.tensor(nfaces, dtype=torch.int32),
+    }
+
+
+def reference_write(mesh, path):
+    # line by line writer write_obj used before the bulk one (geometry only)
+    v_np, vt_np, vn_np = mesh.v.numpy(), mesh.vt.numpy(), mesh.vn.numpy()
+    f_np, ft_np, fn_np = mesh.f.numpy(), mesh.ft.numpy(), mesh.fn.numpy()
+    with open(path, 'w') as fp:
+        for v in v_np:
+            fp.write(f'v {v[0]} {v[1]} {v[2]} \n')
+        for v in vt_np:
+            fp.write(f'vt {v[0]} {1 - v[1]} \n')
+        for v in vn_np:
+            fp.write(f'vn {v[0]} {v[1]} {v[2]} \n')
+        for i in range(len(f_np)):
+            fp.write(f'f {f_np[i, 0] + 1}/{ft_np[i, 0] + 1}/{fn_np[i, 0] + 1} {f_np[i, 1] + 1}/{ft_np[i, 1] + 1}/{fn_np[i, 1] + 1} {f_np[i, 2] + 1}/{ft_np[i, 2] + 1}/{fn_np[i, 2] + 1} \n')
+
+
+print(f'{"faces":>8} {"form":>8} {"MB":>6} {"ref s":>7} {"load s":>7} {"speedup":>8} {"equal":>6} {"ref w s":>8} {"write s":>8} {"speedup":>8} {"reload":>7}')
+
+with tempfile.TemporaryDirectory() as workspace:
+    path = os.path.join(workspace, 'bench.obj')
+    for num_faces in args.faces:
+        for form in args.forms:
+            num_lines = make_obj(path, num_faces, form)
+
+            t0 = time.perf_counter()
+            mesh = Mesh.load_obj(path, device='cpu')
+            t_load = time.perf_counter() - t0
+
+            if args.no_reference:
+                t_ref, equal = float('nan'), '-'
+            else:
+                t0 = time.perf_counter()
+                ref = reference_parse(path)
+                t_ref = time.perf_counter() - t0
+                equal = all(torch.equal(ref[k], getattr(mesh, k)) for k in ref)
+
+            # write back, and check that the written file loads to the same mesh
+            out_path = os.path.join(workspace, 'out.obj')
+            t0 = time.perf_counter()
+            mesh.write_obj(out_path)
+            t_write = time.perf_counter() - t0
+            reloaded = Mesh.load_obj(out_path, device='cpu')
+            same = all(torch.equal(getattr(reloaded, k), getattr(mesh, k)) for k in ['v', 'vt', 'vn', 'f', 'ft', 'fn'])
+
+            if args.no_reference or form != 'v/vt/vn':
+                t_ref_write = float('nan')
+            else:
+                t0 = time.perf_counter()
+                reference_write(mesh, out_path)
+                t_ref_write = time.perf_counter() - t0
+
+            print(
+                f'{mesh.f.shape[0]:>8} {form:>8} {os.path.getsize(path) / 2 ** 20:>6.1f} '
+                f'{t_ref:>7.2f} {t_load:>7.2f} {t_ref / t_load:>8.1f} {str(equal):>6} '
+                f'{t_ref_write:>8.2f} {t_write:>8.2f} {t_ref_write / t_write:>8.1f} {str(same):>7}'
+            )
@@ -0,0 +1,98 @@
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pymeshlab as pml
+
+sys.path.append('./')
+
+from mesh_utils import MeshPipeline
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--resolution', default=128, type=int, help='marching cubes resolution, same as extract_mesh')
+parser.add_argument('--decimate_target', default=1e5, type=float)
+parser.add_argument('--batch', default=4, type=int, help='number of meshes for the process pool comparison')
+parser.add_argument('--processes', default=None, type=int)
+args = parser.parse_args()
+
+
+def make_mesh(resolution, seed=0):
+    # marching cubes of a few noisy blobs plus floaters, like extract_mesh output
+    import mcubes
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-1, 1, resolution)
+    xx, yy, zz = np.meshgrid(x, x, x, indexing='ij')
+    occ = np.zeros_like(xx)
+    for c, r in zip(rng.uniform(-0.4, 0.4, (6, 3)), rng.uniform(0.15, 0.35, 6)):
+        occ += np.exp(-((xx - c[0]) ** 2 + (yy - c[1]) ** 2 + (zz - c[2]) ** 2) / (2 * r ** 2))
+    occ += rng.normal(0, 0.05, occ.shape)
+    vertices, triangles = mcubes.marching_cubes(occ, 0.5)
+    vertices = vertices / (resolution - 1.0) * 2 - 1
+    return vertices, triangles.astype(np.int64)
+
+
+def reference(verts, faces, target):
+    # previous extract_mesh post-processing: clean_mesh then decimate_mesh, a new MeshSet each
+    ms = pml.MeshSet()
+    ms.add_mesh(pml.Mesh(verts, faces), "mesh")
+    ms.meshing_remove_unreferenced_vertices()
+    ms.meshing_merge_close_vertices(threshold=pml.PercentageValue(1))
+    ms.meshing_remove_duplicate_faces()
+    ms.meshing_remove_null_faces()
+    ms.meshing_remove_connected_component_by_diameter(mincomponentdiag=pml.PercentageValue(20))
+    ms.meshing_remove_connected_component_by_face_number(mincomponentsize=64)
+    ms.meshing_repair_non_manifold_edges(method=0)
+    ms.meshing_repair_non_manifold_vertices(vertdispratio=0)
+    ms.meshing_isotropic_explicit_remeshing(iterations=3, targetlen=pml.PureValue(0.015))
+    m = ms.current_mesh()
+    verts, faces = m.vertex_matrix(), m.face_matrix()
+    if faces.shape[0] > target:
+        ms = pml.MeshSet()
+        ms.add_mesh(pml.Mesh(verts, faces), "mesh")
+        ms.meshing_decimation_quadric_edge_collapse(targetfacenum=int(target), optimalplacement=True)
+        m = ms.current_mesh()
+        verts, faces = m.vertex_matrix(), m.face_matrix()
+    return verts, faces
+
+
+def make_pipeline(remesh=True, backend="pymeshlab", cache_dir=None):
+    pipeline = MeshPipeline(cache_dir=cache_dir, verbose=False).add("clean")
+    if remesh:
+        pipeline.add("remesh", size=0.015)
+    return pipeline.add("decimate", target=args.decimate_target, backend=backend)
+
+
+def timed(fn, *inputs):
+    t0 = time.perf_counter()
+    out = fn(*inputs)
+    return out, time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    verts, faces = make_mesh(args.resolution)
+    print(f'[INFO] input: {verts.shape[0]} vertices, {faces.shape[0]} faces')
+
+    (v, f), t = timed(reference, verts, faces, args.decimate_target)
+    print(f'{"reference":>22} {t:>7.2f}s {f.shape[0]:>8} faces')
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, pipeline in [
+            ('pipeline', make_pipeline()),
+            ('pipeline no remesh', make_pipeline(remesh=False)),
+            ('pipeline pyfqmr', make_pipeline(remesh=False, backend="pyfqmr")),
+            ('pipeline cached', make_pipeline(cache_dir=cache_dir)),
+        ]:
+            (v, f), t = timed(pipeline.run, verts, faces)
+            if name == 'pipeline cached':
+                (v, f), t = timed(pipeline.run, verts, faces)
+            timings = ', '.join(f'{k} {s:.2f}s' for k, s in pipeline.timings)
+            print(f'{name:>22} {t:>7.2f}s {f.shape[0]:>8} faces  {timings}')
+
+    meshes = [make_mesh(args.resolution, seed) for seed in range(args.batch)]
+    pipeline = make_pipeline()
+    _, t_serial = timed(pipeline.run_batch, meshes, 1)
+    _, t_pool = timed(pipeline.run_batch, meshes, args.processes)
+    print(f'{"batch of " + str(args.batch):>22} serial {t_serial:.2f}s, process pool {t_pool:.2f}s')
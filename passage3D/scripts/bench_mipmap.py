@@ -0,0 +1,94 @@
+import sys
+import time
+import argparse
+
+import torch
+import torch.nn.functional as F
+
+sys.path.append('./')
+
+from grid_put import linear_grid_put_2d, linear_grid_put_3d, mipmap_linear_grid_put_2d, mipmap_linear_grid_put_3d
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--res2d', default=[1024, 2048], type=int, nargs='+')
+parser.add_argument('--res3d', default=[128, 256], type=int, nargs='+')
+parser.add_argument('--num', default=1000000, type=int, help='number of samples')
+parser.add_argument('--reference_max3d', default=128, type=int, help='largest 3d resolution to run the dense reference at')
+args = parser.parse_args()
+
+
+def reference_mipmap_2d(H, W, coords, values, min_resolution=32):
+    # previous implementation: a linear splat per level, each upsampled to full resolution before masking
+    C = values.shape[-1]
+    result = torch.zeros(H, W, C)
+    count = torch.zeros(H, W, 1)
+    cur_H, cur_W = H, W
+    while min(cur_H, cur_W) > min_resolution:
+        mask = (count.squeeze(-1) == 0)
+        if not mask.any():
+            break
+        cur_result, cur_count = linear_grid_put_2d(cur_H, cur_W, coords, values, return_count=True)
+        result[mask] = result[mask] + F.interpolate(cur_result.permute(2, 0, 1).unsqueeze(0).contiguous(), (H, W), mode='bilinear', align_corners=False).squeeze(0).permute(1, 2, 0).contiguous()[mask]
+        count[mask] = count[mask] + F.interpolate(cur_count.view(1, 1, cur_H, cur_W), (H, W), mode='bilinear', align_corners=False).view(H, W, 1)[mask]
+        cur_H //= 2
+        cur_W //= 2
+    mask = (count.squeeze(-1) > 0)
+    result[mask] = result[mask] / count[mask].repeat(1, C)
+    return result
+
+
+def reference_mipmap_3d(H, W, D, coords, values, min_resolution=32):
+    C = values.shape[-1]
+    result = torch.zeros(H, W, D, C)
+    count = torch.zeros(H, W, D, 1)
+    cur_H, cur_W, cur_D = H, W, D
+    while min(cur_H, cur_W, cur_D) > min_resolution:
+        mask = (count.squeeze(-1) == 0)
+        if not mask.any():
+            break
+        cur_result, cur_count = linear_grid_put_3d(cur_H, cur_W, cur_D, coords, values, return_count=True)
+        result[mask] = result[mask] + F.interpolate(cur_result.permute(3, 0, 1, 2).unsqueeze(0).contiguous(), (H, W, D), mode='trilinear', align_corners=False).squeeze(0).permute(1, 2, 3, 0).contiguous()[mask]
+        count[mask] = count[mask] + F.interpolate(cur_count.view(1, 1, cur_H, cur_W, cur_D), (H, W, D), mode='trilinear', align_corners=False).view(H, W, D, 1)[mask]
+        cur_H //= 2
+        cur_W //= 2
+        cur_D //= 2
+    mask = (count.squeeze(-1) > 0)
+    result[mask] = result[mask] / count[mask].repeat(1, C)
+    return result
+
+
+def timed(fn, *inputs):
+    t0 = time.perf_counter()
+    out = fn(*inputs)
+    return out, time.perf_counter() - t0
+
+
+def compare(name, res, fn, ref_fn, coords, values):
+    out, t_out = timed(fn, *res, coords, values)
+    filled = (out != 0).any(-1).float().mean().item()
+    line = f'{name:>4} {"x".join(map(str, res)):>12} {filled:>7.3f} {t_out:>8.2f}'
+    if ref_fn is None:
+        return line + f' {"-":>8} {"-":>8} {"-":>9}'
+    ref, t_ref = timed(ref_fn, *res, coords, values)
+    diff = (out - ref).abs().mean().item()
+    return line + f' {t_ref:>8.2f} {t_ref / t_out:>8.2f} {diff:>9.4f}'
+
+
+if __name__ == '__main__':
+    torch.manual_seed(0)
+    print(f'{"dim":>4} {"grid":>12} {"filled":>7} {"new s":>8} {"ref s":>8} {"speedup":>8} {"mean diff":>9}')
+
+    # 2d: samples on a few uv-chart like discs with a smooth color
+    centers = torch.rand(16, 2) * 1.6 - 0.8
+    coords = centers[torch.randint(0, 16, (args.num,))] + torch.randn(args.num, 2) * 0.08
+    coords = coords.clamp(-1, 1)
+    values = torch.cat([coords * 0.5 + 0.5, torch.rand(args.num, 1) * 0.1], dim=-1)
+    for res in args.res2d:
+        print(compare(2, (res, res), mipmap_linear_grid_put_2d, reference_mipmap_2d, coords, values))
+
+    # 3d: samples on a sphere surface, most of the volume is a hole
+    coords = F.normalize(torch.randn(args.num, 3), dim=-1) * 0.8
+    values = coords * 0.5 + 0.5
+    for res in args.res3d:
+        ref_fn = reference_mipmap_3d if res <= args.reference_max3d else None
+        print(compare(3, (res, res, res), mipmap_linear_grid_put_3d, ref_fn, coords, values))
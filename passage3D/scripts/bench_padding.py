@@ -0,0 +1,75 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+
+sys.path.append('./')
+
+from texture_padding import push_pull_fill, nearest_fill
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--texture_size', default=[1024, 2048, 4096], type=int, nargs='+')
+parser.add_argument('--charts', default=64, type=int, help='number of random disc charts in the known region')
+parser.add_argument('--no_reference', action='store_true', help='skip the kd-tree dilation baseline')
+args = parser.parse_args()
+
+
+def make_texture(size, charts, seed=0):
+    # random disc charts over a smooth texture, [H, W, 3] and [H, W] bool
+    rng = np.random.default_rng(seed)
+    yy, xx = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    mask = np.zeros((size, size), dtype=bool)
+    for cy, cx, r in zip(rng.uniform(0, size, charts), rng.uniform(0, size, charts), rng.uniform(0.02, 0.08, charts) * size):
+        mask |= (yy - cy) ** 2 + (xx - cx) ** 2 < r ** 2
+    image = np.stack([xx / size, yy / size, 0.5 + 0.5 * np.sin(xx / 37) * np.cos(yy / 23)], axis=-1).astype(np.float32)
+    image[~mask] = 0
+    return torch.from_numpy(image), torch.from_numpy(mask)
+
+
+def reference_fill(image, mask):
+    # previous save_model dilation: 32 iterations around the charts, kd-tree nearest boundary texel
+    from sklearn.neighbors import NearestNeighbors
+    from scipy.ndimage import binary_dilation, binary_erosion
+
+    albedo = image.numpy().copy()
+    mask = mask.numpy()
+    inpaint_region = binary_dilation(mask, iterations=32)
+    inpaint_region[mask] = 0
+    search_region = mask.copy()
+    not_search_region = binary_erosion(search_region, iterations=3)
+    search_region[not_search_region] = 0
+    search_coords = np.stack(np.nonzero(search_region), axis=-1)
+    inpaint_coords = np.stack(np.nonzero(inpaint_region), axis=-1)
+    knn = NearestNeighbors(n_neighbors=1, algorithm="kd_tree").fit(search_coords)
+    _, indices = knn.kneighbors(inpaint_coords)
+    albedo[tuple(inpaint_coords.T)] = albedo[tuple(search_coords[indices[:, 0]].T)]
+    return torch.from_numpy(albedo)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    print(f'{"size":>6} {"known":>6} {"push-pull s":>12} {"nearest s":>10} {"kd-tree s":>10} {"unchanged":>10} {"match kd":>9}')
+    for size in args.texture_size:
+        image, mask = make_texture(size, args.charts)
+
+        pp, t_pp = timed(push_pull_fill, image, mask)
+        nn, t_nn = timed(nearest_fill, image, mask)
+        unchanged = torch.equal(pp[mask], image[mask]) and torch.equal(nn[mask], image[mask])
+
+        line = f'{size:>6} {mask.float().mean().item():>6.3f} {t_pp:>12.3f} {t_nn:>10.3f}'
+        if args.no_reference:
+            line += f' {"-":>10} {str(unchanged):>10} {"-":>9}'
+        else:
+            ref, t_ref = timed(reference_fill, image, mask)
+            # the kd-tree only fills a 32 texel band, compare there (ties between equidistant texels may differ)
+            band = (ref != image).any(-1)
+            match = (nn[band] == ref[band]).all(-1).float().mean().item()
+            line += f' {t_ref:>10.3f} {str(unchanged):>10} {match:>9.4f}'
+        print(line)
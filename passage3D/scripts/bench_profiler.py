@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from omegaconf import OmegaConf
+
+sys.path.append('./')
+
+from cam_utils import orbit_cameras, OrbitCamera
+from gs_renderer import Renderer, MiniCams
+from view_sampler import ViewSampler
+from profiler import StepProfiler
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config', default='configs/image.yaml', type=str)
+parser.add_argument('--iters', default=40, type=int)
+parser.add_argument('--res', default=64, type=int, help='render resolution of the novel views')
+parser.add_argument('--num_pts', default=2000, type=int)
+parser.add_argument('--backend', default='tile', type=str, help='rasterizer backend (tile = cpu reference)')
+parser.add_argument('--outdir', default='logs', type=str)
+args = parser.parse_args()
+
+# stage 1 loop without the diffusion guidance (a l2 loss against a fixed target stands for it), on the cpu reference
+# rasterizer: checks the spans / counters / trace output, and the overhead of the profiler against the step time only.
+opt = OmegaConf.load(args.config)
+opt.iters = args.iters
+opt.density_start_iter, opt.density_end_iter, opt.densification_interval = 0, args.iters, 10
+device = torch.device('cuda' if torch.cuda.is_available() and args.backend != 'tile' else 'cpu')
+cam = OrbitCamera(args.res, args.res, r=opt.radius, fovy=opt.fovy)
+
+
+def run(enabled):
+    torch.manual_seed(0)
+    np.random.seed(0)
+    renderer = Renderer(sh_degree=0, device=device, backend=args.backend)
+    renderer.initialize(num_pts=args.num_pts)
+    renderer.gaussians.training_setup(opt)
+    optimizer = renderer.gaussians.optimizer
+    sampler = ViewSampler.from_opt(opt, seed=0)
+    target = torch.full((3, args.res, args.res), 0.5, device=device)
+    profiler = StepProfiler(device, enabled=enabled)
+
+    t0 = time.perf_counter()
+    for step in range(1, args.iters + 1):
+        profiler.begin_step(step)
+        renderer.gaussians.update_learning_rate(step)
+
+        with profiler.span("view sampling"):
+            vers, hors, radii, bg_colors, resolution = sampler.views(step)
+            cams = MiniCams(orbit_cameras(vers, hors, radii), args.res, args.res, cam.fovy, cam.fovx, cam.near, cam.far, device=device)
+        with profiler.span("render"):
+            out = renderer.render_batch(cams, bg_color=torch.tensor(bg_colors, device=device))
+        with profiler.span("guidance"):
+            loss = F.mse_loss(out["image"], target.expand_as(out["image"]))
+        with profiler.span("backward"):
+            loss.backward()
+        with profiler.span("optimizer"):
+            optimizer.step()
+            optimizer.zero_grad()
+        with profiler.span("densify"):
+            g = renderer.gaussians
+            visibility_filter, radii = out["visibility_filter"][-1], out["radii"][-1]
+            g.max_radii2D[visibility_filter] = torch.max(g.max_radii2D[visibility_filter], radii[visibility_filter])
+            g.add_densification_stats(out["viewspace_points"][-1], visibility_filter)
+            if step % opt.densification_interval == 0:
+                g.densify_and_prune(opt.densify_grad_threshold, min_opacity=0.01, extent=4, max_screen_size=1)
+
+        profiler.counter("gaussians", renderer.gaussians.get_xyz.shape[0])
+        profiler.end_step()
+    return profiler, time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    _, t_off = run(False)
+    profiler, t_on = run(True)
+    profiler.report()
+    print(f'[INFO] {args.iters} steps: step time only {t_off:.2f}s, spans and counters {t_on:.2f}s ({100 * (t_on / t_off - 1):+.1f}%)')
+
+    os.makedirs(args.outdir, exist_ok=True)
+    path = os.path.join(args.outdir, 'bench_profile')
+    profiler.save(path)
+    with open(path + '.jsonl') as f:
+        assert sum(1 for _ in f) == args.iters
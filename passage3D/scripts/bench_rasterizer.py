@@ -0,0 +1,54 @@
+import sys
+import time
+import argparse
+
+import torch
+
+sys.path.append('./')
+
+from gs_renderer import Renderer, MiniCam
+from cam_utils import orbit_camera, OrbitCamera
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--num', default=[5000, 20000], type=int, nargs='+', help='gaussian counts')
+parser.add_argument('--res', default=[128, 256, 512], type=int, nargs='+', help='render resolutions')
+parser.add_argument('--backends', default=['tile', 'torch'], type=str, nargs='+', help='rasterizer backends to time')
+parser.add_argument('--views', default=4, type=int, help='orbit views rendered per measurement')
+parser.add_argument('--device', default='cpu', type=str)
+args = parser.parse_args()
+
+device = torch.device(args.device)
+orbit = OrbitCamera(512, 512, r=2, fovy=49.1)
+
+
+def render_views(renderer, res):
+    outs = []
+    for i in range(args.views):
+        pose = orbit_camera(-15, 360 / args.views * i, orbit.radius)
+        cam = MiniCam(pose, res, res, orbit.fovy, orbit.fovx, orbit.near, orbit.far, device=device)
+        outs.append(renderer.render(cam))
+    return outs
+
+
+print(f'{"num":>7} {"res":>5} {"backend":>8} {"fps":>8} {"max diff":>9}')
+
+for num in args.num:
+    torch.manual_seed(0)
+    renderer = Renderer(sh_degree=0, device=device)
+    renderer.initialize(num_pts=num)
+
+    for res in args.res:
+        reference = None
+        for backend in args.backends:
+            renderer.backend = backend
+            with torch.no_grad():
+                t0 = time.perf_counter()
+                outs = render_views(renderer, res)
+                t1 = time.perf_counter()
+
+            # parity against the first backend (image, depth, alpha)
+            flat = torch.cat([torch.cat([o['image'], o['depth'], o['alpha']]).flatten() for o in outs])
+            diff = 0.0 if reference is None else (flat - reference).abs().max().item()
+            reference = flat if reference is None else reference
+
+            print(f'{num:>7} {res:>5} {backend:>8} {args.views / (t1 - t0):>8.2f} {diff:>9.2e}')
@@ -0,0 +1,59 @@
+import sys
+import time
+import argparse
+
+import torch
+
+sys.path.append('./')
+
+from gs_renderer import Renderer, MiniCam
+from cam_utils import orbit_camera, OrbitCamera
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--num', default=[5000, 20000], type=int, nargs='+', help='gaussian counts')
+parser.add_argument('--views', default=[4, 16], type=int, nargs='+', help='views per batch')
+parser.add_argument('--res', default=128, type=int, help='render resolution')
+parser.add_argument('--sh_degree', default=3, type=int)
+parser.add_argument('--backend', default='tile', type=str, help='rasterizer backend, see gs_rasterizer.RASTERIZERS')
+parser.add_argument('--device', default='cpu', type=str)
+parser.add_argument('--repeat', default=3, type=int)
+args = parser.parse_args()
+
+device = torch.device(args.device)
+orbit = OrbitCamera(args.res, args.res, r=2, fovy=49.1)
+
+
+def timed(fn):
+    # forward + backward, as in a training step
+    t = 0
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        images = fn()
+        images.mean().backward()
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        t += time.perf_counter() - t0
+    return images.detach(), t / args.repeat
+
+
+print(f'{"num":>7} {"views":>6} {"loop ms":>9} {"batch ms":>9} {"speedup":>8} {"max diff":>9}')
+
+for num in args.num:
+    torch.manual_seed(0)
+    renderer = Renderer(sh_degree=args.sh_degree, device=device, backend=args.backend)
+    renderer.initialize(num_pts=num)
+    renderer.gaussians.active_sh_degree = args.sh_degree
+
+    for views in args.views:
+        cams = [
+            MiniCam(orbit_camera(-15, 360 / views * i, orbit.radius), args.res, args.res, orbit.fovy, orbit.fovx, orbit.near, orbit.far, device=device)
+            for i in range(views)
+        ]
+
+        loop, t_loop = timed(lambda: torch.stack([renderer.render(cam)['image'] for cam in cams]))
+        batch, t_batch = timed(lambda: renderer.render_batch(cams)['image'])
+
+        print(
+            f'{num:>7} {views:>6} {t_loop * 1000:>9.1f} {t_batch * 1000:>9.1f} '
+            f'{t_loop / t_batch:>8.2f} {(loop - batch).abs().max().item():>9.2e}'
+        )
@@ -0,0 +1,89 @@
+import sys
+import time
+import argparse
+
+import torch
+import torch.nn.functional as F
+
+sys.path.append('./')
+
+from sh_utils import eval_sh, eval_sh_fused
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--degrees', default=[0, 1, 2, 3], type=int, nargs='+')
+parser.add_argument('--sizes', default=[10_000, 100_000, 1_000_000], type=int, nargs='+', help='number of gaussians')
+parser.add_argument('--views', default=4, type=int, help='views of the batched case (dirs [V, N, 3])')
+parser.add_argument('--repeat', default=5, type=int)
+parser.add_argument('--device', default='cpu', type=str)
+args = parser.parse_args()
+
+
+def sync():
+    if torch.device(args.device).type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def timed(fn):
+    fn()
+    sync()
+    times = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        fn()
+        sync()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def inputs(deg, n, views=None, requires_grad=False):
+    # sh [N, 3, K] as given by the renderers (features transposed), unit dirs [N, 3] or [V, N, 3]
+    sh = torch.randn(n, 3, (deg + 1) ** 2, device=args.device, requires_grad=requires_grad)
+    dirs = F.normalize(torch.randn(*(() if views is None else (views,)), n, 3, device=args.device), dim=-1)
+    return sh, dirs.requires_grad_(requires_grad)
+
+
+def check_parity():
+    # float64, every degree, single and multi-view, values and gradients
+    for deg in range(5):
+        sh = torch.randn(512, 3, 25, dtype=torch.float64, requires_grad=True)
+        for shape in ((512, 3), (args.views, 512, 3)):
+            dirs = F.normalize(torch.randn(*shape, dtype=torch.float64), dim=-1).requires_grad_()
+            ref, out = eval_sh(deg, sh, dirs), eval_sh_fused(deg, sh, dirs)
+            torch.testing.assert_close(out.expand_as(ref), ref, rtol=1e-12, atol=1e-12)
+            grad = torch.randn_like(ref)
+            ref_grads = torch.autograd.grad(ref, (sh, dirs), grad, allow_unused=True)
+            grads = torch.autograd.grad(out.expand_as(ref), (sh, dirs), grad, allow_unused=True)
+            for g_ref, g in zip(ref_grads, grads):
+                if g_ref is None:
+                    assert g is None or not g.any()
+                else:
+                    torch.testing.assert_close(g, g_ref, rtol=1e-10, atol=1e-10)
+
+
+def report(name, t_ref, t_fused):
+    print(f'{name:>36}  eval_sh {t_ref * 1000:>9.2f}ms  fused {t_fused * 1000:>9.2f}ms  x{t_ref / t_fused:.2f}')
+
+
+if __name__ == '__main__':
+    torch.manual_seed(0)
+    check_parity()
+    print('[INFO] parity ok (degrees 0-4, values and gradients)')
+    print(f'[INFO] {args.device}, {torch.get_num_threads()} threads, min of {args.repeat} runs')
+
+    for deg in args.degrees:
+        for n in args.sizes:
+            with torch.no_grad():
+                sh, dirs = inputs(deg, n)
+                report(f'deg {deg}  N {n}', timed(lambda: eval_sh(deg, sh, dirs)), timed(lambda: eval_sh_fused(deg, sh, dirs)))
+
+                # multi-view render_batch case, sh shared by the views
+                n_view = n // args.views
+                sh, dirs = inputs(deg, n_view, args.views)
+                report(f'deg {deg}  V {args.views} x N {n_view}', timed(lambda: eval_sh(deg, sh, dirs)), timed(lambda: eval_sh_fused(deg, sh, dirs)))
+
+    # forward + backward, as in a training step
+    for deg in args.degrees:
+        n = max(args.sizes)
+        sh, dirs = inputs(deg, n, requires_grad=True)
+        step = lambda fn: fn(deg, sh, dirs).sum().backward()
+        report(f'deg {deg}  N {n}  forward + backward', timed(lambda: step(eval_sh)), timed(lambda: step(eval_sh_fused)))
@@ -0,0 +1,126 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from omegaconf import OmegaConf
+
+sys.path.append('./')
+
+from cam_utils import orbit_cameras, OrbitCamera
+from gs_renderer import Renderer, MiniCams
+from sh_utils import RGB2SH
+from view_sampler import ViewSampler, SAMPLER_MODES
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config', default='configs/image.yaml', type=str)
+parser.add_argument('--modes', default=list(SAMPLER_MODES), type=str, nargs='+')
+parser.add_argument('--iters', default=120, type=int)
+parser.add_argument('--batch_size', default=2, type=int)
+parser.add_argument('--res', default=32, type=int, help='render resolution of the training and evaluation views')
+parser.add_argument('--teacher', default=1500, type=int, help='gaussians of the target')
+parser.add_argument('--student', default=800, type=int, help='gaussians of the fitted model')
+parser.add_argument('--seeds', default=3, type=int, help='runs averaged per mode')
+parser.add_argument('--evals', default=6, type=int, help='evaluations along the training')
+parser.add_argument('--backend', default='tile', type=str, help='rasterizer backend (tile = cpu reference)')
+args = parser.parse_args()
+
+# multiview fitting on the cpu reference rasterizer: a student is fitted to renders of a colorful teacher from the
+# views of the schedule, and evaluated on a dense orbit (the part of the stage 1 loss that depends on view coverage).
+opt = OmegaConf.load(args.config)
+orbit = OrbitCamera(args.res, args.res, r=opt.radius, fovy=opt.fovy)
+device = torch.device('cpu')
+
+
+def make_cams(vers, hors, radii):
+    return MiniCams(orbit_cameras(vers, hors, radii), args.res, args.res, orbit.fovy, orbit.fovx, orbit.near, orbit.far, device=device)
+
+
+def make_teacher():
+    torch.manual_seed(0)
+    np.random.seed(0)
+    teacher = Renderer(sh_degree=0, device=device, backend=args.backend)
+    teacher.initialize(num_pts=args.teacher)
+    g = teacher.gaussians
+    # colors varying around the object, so every side has to be seen to be fitted
+    xyz = g.get_xyz.detach()
+    colors = 0.5 + 0.5 * torch.sin(torch.stack([7 * xyz[:, 0] + 2, 9 * xyz[:, 2], 5 * (xyz[:, 0] - xyz[:, 2]) + 4 * xyz[:, 1]], dim=-1))
+    with torch.no_grad():
+        g._features_dc.copy_(RGB2SH(colors).unsqueeze(1))
+        g._opacity.fill_(2.0)
+    return teacher
+
+
+def render(renderer, cams, bg_colors):
+    return renderer.render_batch(cams, bg_color=bg_colors)["image"]
+
+
+def psnr(a, b):
+    return (-10 * torch.log10(F.mse_loss(a, b))).item()
+
+
+def fit(teacher, mode, seed, eval_cams, eval_images, eval_bg):
+    torch.manual_seed(100 + seed)
+    np.random.seed(100 + seed)
+    student = Renderer(sh_degree=0, device=device, backend=args.backend)
+    student.initialize(num_pts=args.student)
+    student.gaussians.training_setup(opt)
+    optimizer = student.gaussians.optimizer
+
+    sampler = ViewSampler(
+        args.iters, args.batch_size, opt.elevation, opt.radius, opt.min_ver, opt.max_ver, opt.invert_bg_prob,
+        mode=mode, seed=seed, resolution_schedule=((1.0, args.res),),
+    )
+    checkpoints = set(np.linspace(0, args.iters, args.evals + 1).astype(int)[1:])
+    scores = []
+    for step in range(1, args.iters + 1):
+        student.gaussians.update_learning_rate(step)
+        vers, hors, radii, bg_colors, _ = sampler.views(step)
+        cams = make_cams(vers, hors, radii)
+        bg_colors = torch.from_numpy(bg_colors)
+        with torch.no_grad():
+            target = render(teacher, cams, bg_colors)
+        loss = F.mse_loss(render(student, cams, bg_colors), target)
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+
+        if step in checkpoints:
+            with torch.no_grad():
+                scores.append(psnr(render(student, eval_cams, eval_bg), eval_images))
+    return sorted(checkpoints), scores
+
+
+if __name__ == '__main__':
+    teacher = make_teacher()
+
+    # dense evaluation orbit over the training elevation range
+    eval_vers, eval_hors = np.meshgrid(np.linspace(opt.min_ver, opt.max_ver, 4), np.arange(-180, 180, 30))
+    eval_vers, eval_hors = opt.elevation + eval_vers.reshape(-1), eval_hors.reshape(-1)
+    eval_cams = make_cams(eval_vers, eval_hors, opt.radius)
+    eval_bg = torch.ones(len(eval_cams), 3)
+    with torch.no_grad():
+        eval_images = render(teacher, eval_cams, eval_bg)
+
+    results = {}
+    for mode in args.modes:
+        t0 = time.perf_counter()
+        runs = [fit(teacher, mode, seed, eval_cams, eval_images, eval_bg) for seed in range(args.seeds)]
+        steps = runs[0][0]
+        results[mode] = np.mean([scores for _, scores in runs], axis=0)
+        print(f'[INFO] {mode}: {(time.perf_counter() - t0) / args.seeds:.1f}s per run')
+
+    print(f'{args.iters} iters x {args.batch_size} views, {args.res}px, teacher {args.teacher} / student {args.student} gaussians, '
+          f'PSNR on {len(eval_cams)} orbit views (mean of {args.seeds} seeds)')
+    print(f'{"step":>12}' + ''.join(f'{s:>8}' for s in steps))
+    for mode, scores in results.items():
+        print(f'{mode:>12}' + ''.join(f'{x:>8.2f}' for x in scores))
+
+    # step (interpolated between evaluations) reaching the final PSNR of the independent random draws
+    if 'random' in results:
+        final = results['random'][-1]
+        for mode, scores in results.items():
+            reached = f'{np.interp(final, np.maximum.accumulate(scores), steps):.0f}' if max(scores) >= final else '-'
+            print(f'{mode:>12} reaches {final:.2f} dB at step {reached}')
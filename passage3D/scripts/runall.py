@@ -1,7 +1,17 @@
 import os
+import sys
 import glob
 import argparse
 
+from omegaconf import OmegaConf
+
+sys.path.append('./')
+
+from pipeline import Pipeline, image_name
+from job_queue import JobQueue, Scheduler
+from artifact_cache import ArtifactCache
+from model_registry import registry
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--dir', default='data', type=str, help='Directory where processed images are stored')
 parser.add_argument('--out', default='logs', type=str, help='Directory where obj files will be saved')
@@ -9,8 +19,16 @@ parser.add_argument('--video-out', default='videos', type=str, help='Directory w
 parser.add_argument('--gpu', default=0, type=int, help='ID of GPU to use')
 parser.add_argument('--elevation', default=0, type=int, help='Elevation angle of view in degrees')
 parser.add_argument('--config', default='configs', type=str, help='Path to config directory, which contains image.yaml')
+parser.add_argument('--db', default=None, type=str, help='Job queue database (default: <out>/jobs.db)')
+parser.add_argument('--resume', action='store_true', help='Only run the jobs not done yet (after a crash), by default every image is processed again')
+parser.add_argument('--cache-dir', default=None, type=str, help='Artifact cache of unchanged stages (default: <out>/cache, "" to disable)')
+parser.add_argument('--cache-size', default=20, type=float, help='Artifact cache size limit in GB')
+parser.add_argument('--cpu-workers', default=2, type=int, help='Workers for the video stage, overlapping with the training of the next images')
 args = parser.parse_args()
 
+# before the first cuda call
+os.environ['CUDA_VISIBLE_DEVICES'] = str(args.gpu)
+
 files = glob.glob(f'{args.dir}/*_rgba.png')
 configs_dir = args.config
 
@@ -27,22 +45,27 @@ video_dir = args.video_out
 os.makedirs(video_dir, exist_ok=True)
 
 
+# segmentation is already done (*_rgba.png), models are loaded once for all images
+opt = OmegaConf.merge(OmegaConf.load(os.path.join(configs_dir, 'image.yaml')), {'outdir': out_dir, 'elevation': args.elevation})
+stages = ('stage1', 'stage2', 'video')
+cache_dir = os.path.join(out_dir, 'cache') if args.cache_dir is None else args.cache_dir
+cache = ArtifactCache(cache_dir, max_bytes=int(args.cache_size * 2 ** 30)) if cache_dir else None
+pipeline = Pipeline(opt, stages=stages, video_dir=video_dir, cache=cache)
+
+queue = JobQueue(args.db or os.path.join(out_dir, 'jobs.db'))
 for file in files:
-    name = os.path.basename(file).replace("_rgba.png", "")
-    print(f'======== processing {name} ========')
-    # first stage
-    os.system(f'CUDA_VISIBLE_DEVICES={args.gpu} python main.py '
-              f'--config {configs_dir}/image.yaml '
-              f'input={file} '
-              f'save_path={name} elevation={args.elevation}')
-    # second stage
-    os.system(f'CUDA_VISIBLE_DEVICES={args.gpu} python main2.py '
-              f'--config {configs_dir}/image.yaml '
-              f'input={file} '
-              f'save_path={name} elevation={args.elevation}')
-    # export video
-    mesh_path = os.path.join(out_dir, f'{name}.obj')
-    os.system(f'python -m kiui.render {mesh_path} '
-              f'--save_video {video_dir}/{name}.mp4 '
-              f'--wogui '
-              f'--elevation {args.elevation}')
+    queue.add(image_name(file), stages, {'path': file}, fresh=not args.resume)
+scheduler = Scheduler(
+    queue,
+    lambda stage, asset, payload: pipeline.run_stage(stage, payload['path'], asset),
+    workers={'cpu': args.cpu_workers, 'gpu': 1},
+)
+print(f'[INFO] jobs: {scheduler.run()}')
+timings = pipeline.timings
+
+totals = {}
+for stages in timings.values():
+    for stage, t in stages.items():
+        totals[stage] = totals.get(stage, 0) + t
+print(f'[INFO] {len(timings)} images: ' + ', '.join(f'{stage} {t:.1f}s' for stage, t in totals.items()))
+registry.report()
@@ -1,11 +1,31 @@
 import os
-import glob
+import sys
 import argparse
 
+from omegaconf import OmegaConf
+
+sys.path.append('./')
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--gpu', default=0, type=int)
+parser.add_argument('--config', default='configs/text_mv.yaml', type=str)
+parser.add_argument('--out', default='logs', type=str, help='Directory where obj files will be saved')
+parser.add_argument('--video-out', default='videos', type=str, help='Directory where videos will be saved')
+parser.add_argument('--db', default=None, type=str, help='Job queue database (default: <out>/jobs_text_mv.db)')
+parser.add_argument('--resume', action='store_true', help='Only run the jobs not done yet (after a crash), by default every prompt is processed again')
+parser.add_argument('--cache-dir', default=None, type=str, help='Artifact cache of unchanged stages (default: <out>/cache, "" to disable)')
+parser.add_argument('--cache-size', default=20, type=float, help='Artifact cache size limit in GB')
+parser.add_argument('--cpu-workers', default=2, type=int, help='Workers for the video stage, overlapping with the training of the next prompts')
 args = parser.parse_args()
 
+# before the first cuda call
+os.environ['CUDA_VISIBLE_DEVICES'] = str(args.gpu)
+
+from pipeline import Pipeline
+from job_queue import JobQueue, Scheduler
+from artifact_cache import ArtifactCache
+from model_registry import registry
+
 prompts = [
     ('lamp', 'lamp, zen, realistic, 8K, HDR'),
     ('snowman', 'a cute snowman'),
@@ -54,13 +74,21 @@ prompts = [
 
 ]
 
+# text to 3d: no input image, the prompt is an option of each job. guidance models are loaded once for all prompts
+opt = OmegaConf.merge(OmegaConf.load(args.config), {'outdir': args.out})
+stages = ('stage1', 'stage2', 'video')
+cache_dir = os.path.join(args.out, 'cache') if args.cache_dir is None else args.cache_dir
+cache = ArtifactCache(cache_dir, max_bytes=int(args.cache_size * 2 ** 30)) if cache_dir else None
+pipeline = Pipeline(opt, stages=stages, video_dir=args.video_out, cache=cache)
+os.makedirs(args.out, exist_ok=True)
+
+queue = JobQueue(args.db or os.path.join(args.out, 'jobs_text_mv.db'))
 for name, prompt in prompts:
-    print(f'======== processing {name} ========')
-    # first stage
-    os.system(f'CUDA_VISIBLE_DEVICES={args.gpu} python main.py --config configs/text_mv.yaml prompt="{prompt}" save_path={name}')
-    # second stage
-    os.system(f'CUDA_VISIBLE_DEVICES={args.gpu} python main2.py --config configs/text_mv.yaml  prompt="{prompt}" save_path={name}')
-    # export video
-    mesh_path = os.path.join('logs', f'{name}.obj')
-    os.makedirs('videos', exist_ok=True)
-    os.system(f'python -m kiui.render {mesh_path} --save_video videos/{name}.mp4 --wogui')
\ No newline at end of file
+    queue.add(name, stages, {'prompt': prompt}, fresh=not args.resume)
+scheduler = Scheduler(
+    queue,
+    lambda stage, asset, payload: pipeline.run_stage(stage, None, asset, {'prompt': payload['prompt']}),
+    workers={'cpu': args.cpu_workers, 'gpu': 1},
+)
+print(f'[INFO] jobs: {scheduler.run()}')
+registry.report()
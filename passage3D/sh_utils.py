@@ -111,6 +111,84 @@ def eval_sh(deg, sh, dirs):
                             C4[8] * (xx * (xx - 3 * yy) - yy * (3 * xx - yy)) * sh[..., 24])
     return result
 
+def sh_basis(deg, dirs):
+    """
+    Real SH basis at unit directions, same polynomials and ordering as eval_sh.
+    Each term is computed once for all channels and written contiguously.
+    Args:
+        deg: int SH deg, 0-4
+        dirs: torch.Tensor unit directions [..., 3]
+    Returns:
+        [(deg + 1) ** 2, ...], basis index first
+    """
+    assert deg <= 4 and deg >= 0
+    x, y, z = dirs.movedim(-1, 0)
+    terms = [torch.full_like(x, C0)]
+    if deg > 0:
+        terms += [-C1 * y, C1 * z, -C1 * x]
+
+        if deg > 1:
+            xx, yy, zz = x * x, y * y, z * z
+            xy, yz, xz = x * y, y * z, x * z
+            xx_yy = xx - yy
+            terms += [
+                C2[0] * xy,
+                C2[1] * yz,
+                C2[2] * (2.0 * zz - xx - yy),
+                C2[3] * xz,
+                C2[4] * xx_yy,
+            ]
+
+            if deg > 2:
+                zz4 = 4 * zz - xx - yy
+                terms += [
+                    C3[0] * y * (3 * xx - yy),
+                    C3[1] * xy * z,
+                    C3[2] * y * zz4,
+                    C3[3] * z * (2 * zz - 3 * xx - 3 * yy),
+                    C3[4] * x * zz4,
+                    C3[5] * z * xx_yy,
+                    C3[6] * x * (xx - 3 * yy),
+                ]
+
+                if deg > 3:
+                    zz7 = 7 * zz - 1
+                    zz7_3 = 7 * zz - 3
+                    terms += [
+                        C4[0] * xy * xx_yy,
+                        C4[1] * yz * (3 * xx - yy),
+                        C4[2] * xy * zz7,
+                        C4[3] * yz * zz7_3,
+                        C4[4] * (zz * (35 * zz - 30) + 3),
+                        C4[5] * xz * zz7_3,
+                        C4[6] * xx_yy * zz7,
+                        C4[7] * xz * (xx - 3 * yy),
+                        C4[8] * (xx * (xx - 3 * yy) - yy * (3 * xx - yy)),
+                    ]
+    return torch.stack(terms, 0)
+
+
+def eval_sh_fused(deg, sh, dirs):
+    """
+    Same as eval_sh for torch tensors, as a basis evaluation followed by a single contraction
+    (einsum of basis[K, ...] with sh[..., C, K]) instead of one multiply-add chain per coefficient.
+    The batch dimensions of sh and dirs are broadcast, e.g. sh [N, C, K] with dirs [V, N, 3] for several views.
+    Only python control flow on deg, so it can be wrapped in torch.compile.
+    Args:
+        deg: int SH deg, 0-4
+        sh: torch.Tensor SH coeffs [..., C, (deg + 1) ** 2] (or more coefficients, the first ones are used)
+        dirs: torch.Tensor unit directions [..., 3]
+    Returns:
+        [..., C]
+    """
+    coeff = (deg + 1) ** 2
+    assert sh.shape[-1] >= coeff
+    if deg < 2:
+        # too few terms for the contraction to pay off, and degree 0 keeps its view independent shape
+        return eval_sh(deg, sh, dirs)
+    return torch.einsum('k...,...ck->...c', sh_basis(deg, dirs).to(sh.dtype), sh[..., :coeff])
+
+
 def RGB2SH(rgb):
     return (rgb - 0.5) / C0
 
@@ -0,0 +1,178 @@
+import torch
+import torch.nn.functional as F
+
+from grid_put import linear_grid_put_2d
+from mesh import safe_normalize
+from texture_padding import pad_texture
+
+
+def rasterize_torch(v_clip, f, resolution, max_elements=2 ** 24):
+    # pure torch (cpu) counterpart of nvdiffrast.torch.rasterize for a single view, same output conventions.
+    # v_clip: [N, 4] clip space vertices, f: [M, 3] int triangles, resolution: (H, W)
+    # return: rast [1, H, W, 4] = (u, v, z / w, triangle_id + 1), perspective correct barycentrics (u for v0, v for v1)
+    H, W = resolution
+    device = v_clip.device
+    f = f.long()
+
+    w = v_clip[:, 3]
+    ndc = v_clip[:, :3] / w.unsqueeze(-1)
+    # pixel (i, j) has its center at ndc ((j + 0.5) / W * 2 - 1, (i + 0.5) / H * 2 - 1)
+    xy = (ndc[:, :2] * 0.5 + 0.5) * torch.tensor([W, H], dtype=torch.float32, device=device)
+    z = ndc[:, 2]
+
+    # triangles behind the camera are skipped (no near plane clipping)
+    tri_valid = (w[f] > 1e-8).all(-1)
+    tri_xy = xy[f] # [M, 3, 2]
+    rect_min = (tri_xy.min(1).values - 0.5).ceil().long()
+    rect_max = (tri_xy.max(1).values - 0.5).floor().long()
+    rect_min[:, 0].clamp_(0, W)
+    rect_min[:, 1].clamp_(0, H)
+    rect_max[:, 0].clamp_(-1, W - 1)
+    rect_max[:, 1].clamp_(-1, H - 1)
+    rect_size = (rect_max - rect_min + 1).clamp_min(0)
+    counts = torch.where(tri_valid, rect_size.prod(-1), torch.zeros_like(rect_size[:, 0]))
+
+    # depth test by packing (depth bits, triangle id) into a single int64 key, the smallest wins
+    zbuf = torch.full((H * W,), torch.iinfo(torch.int64).max, dtype=torch.long, device=device)
+
+    tris = counts.nonzero(as_tuple=True)[0]
+    cum = torch.cumsum(counts[tris], 0)
+    start = 0
+    while start < len(tris):
+        end = int(torch.searchsorted(cum, cum[start] - counts[tris[start]] + max_elements, right=True).clamp_min(start + 1))
+        tri = tris[start:end]
+        num = counts[tri]
+        tid = torch.repeat_interleave(tri, num)
+        offset = torch.arange(tid.shape[0], device=device) - torch.repeat_interleave(torch.cumsum(num, 0) - num, num)
+        px = rect_min[tid, 0] + offset % rect_size[tid, 0]
+        py = rect_min[tid, 1] + offset // rect_size[tid, 0]
+
+        a, b, c = tri_xy[tid].unbind(1)
+        p = torch.stack([px, py], dim=-1).float() + 0.5
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        l0 = ((b[:, 0] - p[:, 0]) * (c[:, 1] - p[:, 1]) - (b[:, 1] - p[:, 1]) * (c[:, 0] - p[:, 0])) / area
+        l1 = ((c[:, 0] - p[:, 0]) * (a[:, 1] - p[:, 1]) - (c[:, 1] - p[:, 1]) * (a[:, 0] - p[:, 0])) / area
+        l2 = 1 - l0 - l1
+        depth = (l0 * z[f[tid, 0]] + l1 * z[f[tid, 1]] + l2 * z[f[tid, 2]]) * 0.5 + 0.5
+        inside = (area != 0) & (l0 >= 0) & (l1 >= 0) & (l2 >= 0) & (depth >= 0) & (depth <= 1)
+
+        # non-negative floats keep their order as int bits
+        key = (depth[inside].float().view(torch.int32).long() << 32) | tid[inside]
+        zbuf.scatter_reduce_(0, (py * W + px)[inside], key, reduce="amin")
+        start = end
+
+    # barycentrics of the visible triangle at each covered pixel
+    covered = zbuf != torch.iinfo(torch.int64).max
+    pix = covered.nonzero(as_tuple=True)[0]
+    tid = zbuf[pix] & 0xFFFFFFFF
+    a, b, c = tri_xy[tid].unbind(1)
+    p = torch.stack([pix % W, pix // W], dim=-1).float() + 0.5
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    l0 = ((b[:, 0] - p[:, 0]) * (c[:, 1] - p[:, 1]) - (b[:, 1] - p[:, 1]) * (c[:, 0] - p[:, 0])) / area
+    l1 = ((c[:, 0] - p[:, 0]) * (a[:, 1] - p[:, 1]) - (c[:, 1] - p[:, 1]) * (a[:, 0] - p[:, 0])) / area
+    l2 = 1 - l0 - l1
+    depth = l0 * z[f[tid, 0]] + l1 * z[f[tid, 1]] + l2 * z[f[tid, 2]]
+    # perspective correction
+    pw = torch.stack([l0, l1, l2], dim=-1) / w[f[tid]]
+    pw = pw / pw.sum(-1, keepdim=True)
+
+    rast = torch.zeros((H * W, 4), dtype=torch.float32, device=device)
+    rast[pix] = torch.stack([pw[:, 0], pw[:, 1], depth, (tid + 1).float()], dim=-1)
+    return rast.view(1, H, W, 4)
+
+
+def interpolate_torch(attr, rast, f):
+    # counterpart of nvdiffrast.torch.interpolate
+    # attr: [N, C], rast: [1, H, W, 4], f: [M, 3]
+    # return: [1, H, W, C], 0 on background pixels
+    tid = rast[..., 3].long() - 1
+    index = f.long()[tid.clamp_min(0)] # [1, H, W, 3]
+    bary = torch.stack([rast[..., 0], rast[..., 1], 1 - rast[..., 0] - rast[..., 1]], dim=-1)
+    out = (attr[index] * bary.unsqueeze(-1)).sum(-2)
+    return out * (tid >= 0).unsqueeze(-1)
+
+
+@torch.no_grad()
+def uv_coverage(vt, ft, texture_size, dilation=1):
+    # texels covered by the uv charts of a mesh, dilated by a few texels so partially covered border texels count as inside.
+    # vt: [N, 2] in [0, 1], ft: [M, 3]
+    # return: [S, S] bool
+    S = texture_size
+    v_clip = F.pad(vt.float() * 2 - 1, pad=(0, 2), mode='constant', value=1.0)
+    v_clip[:, 2] = 0
+    rast = rasterize_torch(v_clip, ft, (S, S))
+    mask = (rast[0, ..., 3] > 0).float()
+    if dilation > 0:
+        mask = F.max_pool2d(mask[None, None], 2 * dilation + 1, stride=1, padding=dilation)[0, 0]
+    return mask > 0
+
+
+class TextureBaker:
+    # back-project rendered views onto the uv atlas of a mesh.
+    # every visible pixel of every view becomes a (uv, color, weight) sample with weight = view cosine ** cos_power,
+    # all samples are splatted at once and the holes are padded (push-pull or nearest texel, see texture_padding).
+    def __init__(self, mesh, texture_size=1024, cos_thresh=0.5, cos_power=1.0, glctx=None):
+        # mesh: with v/f, vt/ft and vn/fn
+        # glctx: nvdiffrast context, rasterize with torch if None
+        self.mesh = mesh
+        self.device = mesh.v.device
+        self.texture_size = texture_size
+        self.cos_thresh = cos_thresh
+        self.cos_power = cos_power
+        self.glctx = glctx
+
+        self.uvs, self.colors, self.weights = [], [], []
+
+    def rasterize(self, v_clip, resolution):
+        if self.glctx is not None:
+            import nvdiffrast.torch as dr
+            rast, _ = dr.rasterize(self.glctx, v_clip.unsqueeze(0), self.mesh.f, resolution)
+            interpolate = lambda attr, f: dr.interpolate(attr.unsqueeze(0).contiguous(), rast, f)[0]
+        else:
+            rast = rasterize_torch(v_clip, self.mesh.f, resolution)
+            interpolate = lambda attr, f: interpolate_torch(attr, rast, f)
+        return rast, interpolate
+
+    @torch.no_grad()
+    def add_view(self, image, pose, proj):
+        # image: [3, H, W] in [0, 1], pose: [4, 4] camera to world, proj: [4, 4] perspective (np.ndarray or torch.Tensor)
+        H, W = image.shape[-2:]
+        pose = torch.as_tensor(pose, dtype=torch.float32, device=self.device)
+        proj = torch.as_tensor(proj, dtype=torch.float32, device=self.device)
+
+        v_cam = F.pad(self.mesh.v, pad=(0, 1), mode='constant', value=1.0) @ torch.inverse(pose).T
+        v_clip = v_cam @ proj.T
+        rast, interpolate = self.rasterize(v_clip, (H, W))
+
+        alpha = rast[0, ..., 3] > 0 # [H, W]
+        uvs = interpolate(self.mesh.vt, self.mesh.ft)[0] # [H, W, 2] in [0, 1]
+
+        # rotated normal (where [0, 0, 1] always faces camera)
+        normal = safe_normalize(interpolate(self.mesh.vn, self.mesh.fn)[0])
+        viewcos = (normal @ pose[:3, :3])[..., 2]
+
+        mask = alpha & (viewcos > self.cos_thresh)
+        self.uvs.append(uvs[mask].clamp(0, 1))
+        self.colors.append(image.permute(1, 2, 0)[mask].float())
+        self.weights.append(viewcos[mask] ** self.cos_power)
+
+    @torch.no_grad()
+    def bake(self, padding="push_pull"):
+        # padding: hole filling mode of texture_padding.pad_texture, None to keep the holes black
+        # return: albedo [S, S, 3], mask [S, S] of the texels that received samples
+        S = self.texture_size
+        uvs = torch.cat(self.uvs)
+        albedo, count = linear_grid_put_2d(
+            S, S,
+            uvs[..., [1, 0]] * 2 - 1,
+            torch.cat(self.colors),
+            return_count=True,
+            weights=torch.cat(self.weights),
+        )
+        mask = count.squeeze(-1) > 0
+        albedo = albedo / count.clamp_min(1e-8)
+
+        if padding is not None:
+            albedo = pad_texture(albedo, mask, padding)
+
+        return albedo, mask
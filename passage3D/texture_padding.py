@@ -0,0 +1,63 @@
+import torch
+import torch.nn.functional as F
+
+
+def push_pull_fill(image, weight, min_resolution=1):
+    # fill the holes of a texture from a mip pyramid of its known texels (push-pull).
+    # image: [H, W, C] float, weight: [H, W] or [H, W, 1] in [0, 1] (bool mask or coverage), 0 = hole
+    # return: [H, W, C], texels with weight 1 are unchanged, holes get a smooth extrapolation of their surroundings.
+    H, W, C = image.shape
+    weight = weight.float().view(1, 1, H, W).clamp(0, 1)
+    image = image.permute(2, 0, 1).unsqueeze(0) # [1, C, H, W]
+
+    # push: weighted average down to the coarsest level
+    levels = [(image, weight)]
+    while min(levels[-1][1].shape[-2:]) > min_resolution:
+        color, w = levels[-1]
+        w_sum = F.avg_pool2d(w, 2, ceil_mode=True)
+        color = F.avg_pool2d(color * w, 2, ceil_mode=True) / w_sum.clamp_min(1e-8)
+        levels.append((color, (4 * w_sum).clamp_max(1)))
+
+    # pull: blend each level over the upsampled coarser one
+    filled = levels[-1][0]
+    for color, w in reversed(levels[:-1]):
+        up = F.interpolate(filled, size=color.shape[-2:], mode='bilinear', align_corners=False)
+        filled = w * color + (1 - w) * up
+
+    return filled.squeeze(0).permute(1, 2, 0).contiguous()
+
+
+def nearest_fill(image, mask, max_distance=None):
+    # copy every hole texel from its nearest known texel (exact euclidean distance transform).
+    # image: [H, W, C], mask: [H, W] bool, True = known
+    # max_distance: only fill holes up to this many texels away from the known region (None = all)
+    # return: [H, W, C]
+    from scipy.ndimage import distance_transform_edt
+
+    mask = mask.view(image.shape[:2]).bool()
+    if mask.all() or not mask.any():
+        return image.clone()
+
+    dist, indices = distance_transform_edt(~mask.cpu().numpy(), return_indices=True)
+    rows = torch.from_numpy(indices[0]).to(image.device)
+    cols = torch.from_numpy(indices[1]).to(image.device)
+    filled = image[rows, cols]
+
+    if max_distance is not None:
+        far = torch.from_numpy(dist > max_distance).to(image.device)
+        filled[far] = image[far]
+
+    return filled
+
+
+PADDING_MODES = ("push_pull", "nearest")
+
+
+def pad_texture(image, mask, mode="push_pull"):
+    # image: [H, W, C], mask: [H, W] bool or coverage weight, True/1 = known
+    if mode == "push_pull":
+        return push_pull_fill(image, mask)
+    elif mode == "nearest":
+        return nearest_fill(image, mask > 0)
+    else:
+        raise ValueError(f"unknown texture padding mode {mode}, expected one of {PADDING_MODES}")
@@ -0,0 +1,125 @@
+import numpy as np
+
+# [(step ratio upper bound, render resolution)] of the stage 1 novel views
+RESOLUTION_SCHEDULE = ((0.3, 128), (0.6, 256), (1.0, 512))
+SAMPLER_MODES = ("random", "stratified", "sobol")
+
+
+class ViewSampler:
+    # precomputed camera schedule of the stage 1 training: for every step, the elevation / azimuth offsets of its
+    # batch of random views, their background and the render resolution, stored as compact arrays.
+    # the schedule only depends on the options and the seed, so a run can be replayed exactly.
+    #   sampler = ViewSampler.from_opt(opt, seed=0)
+    #   vers, hors, radii, bg_colors, render_resolution = sampler.views(step) # step starts at 1, like GUI.step
+    # steps past iters (gui training beyond opt.iters) keep the last render resolution, like the clamped step ratio,
+    # and draw independent uniform views seeded by (seed, step), so they stay reproducible without replaying the schedule.
+    def __init__(self, iters, batch_size=1, elevation=0, radius=2, min_ver=-30, max_ver=30, invert_bg_prob=0.5,
+                 num_views=1, mode="sobol", seed=0, resolution_schedule=RESOLUTION_SCHEDULE):
+        # iters: number of steps of the schedule
+        # min_ver, max_ver: elevation offset range [min_ver, max_ver) added to elevation, in degrees
+        # num_views: views per sample, the extra ones rotated by 90 degrees in azimuth (4 for mvdream / imagedream)
+        # mode: "random" (independent uniform draws, like the previous np.random.randint sampling),
+        #       "stratified" (jittered strata of azimuth x elevation per step),
+        #       "sobol" (scrambled sobol sequence over the whole schedule, low discrepancy at every prefix)
+        if mode not in SAMPLER_MODES:
+            raise ValueError(f"unknown view sampler mode {mode}, expected one of {SAMPLER_MODES}")
+
+        self.iters = iters
+        self.batch_size = batch_size
+        self.elevation = elevation
+        self.radius = radius
+        self.min_ver = min_ver
+        self.max_ver = max_ver
+        self.num_views = num_views
+        self.invert_bg_prob = invert_bg_prob
+        self.mode = mode
+        self.seed = seed
+
+        n = iters * batch_size
+        rng = np.random.default_rng(seed)
+        if mode == "random":
+            u = rng.random((n, 3))
+        elif mode == "stratified":
+            u = self.stratified(iters, batch_size, rng)
+        else:
+            from scipy.stats import qmc
+            # power-of-two sample count keeps the balance properties of the sequence, the prefix is used
+            u = qmc.Sobol(d=3, scramble=True, seed=rng).random_base2(max(int(np.ceil(np.log2(max(n, 2)))), 1))[:n]
+
+        # [iters, batch_size] elevation / azimuth offsets in degrees, white background flags
+        self.vers = (min_ver + u[:, 0] * (max_ver - min_ver)).astype(np.float32).reshape(iters, batch_size)
+        self.hors = (-180 + u[:, 1] * 360).astype(np.float32).reshape(iters, batch_size)
+        self.white_bg = (u[:, 2] >= invert_bg_prob).reshape(iters, batch_size)
+
+        # [iters] render resolution, from the step ratio min(1, step / iters)
+        ratios = np.minimum(1, np.arange(1, iters + 1) / iters)
+        bounds, resolutions = zip(*resolution_schedule)
+        self.resolutions = np.asarray(resolutions, dtype=np.int16)[np.minimum(np.searchsorted(bounds, ratios, side="right"), len(bounds) - 1)]
+
+    @staticmethod
+    def stratified(iters, batch_size, rng):
+        # each step covers a grid of azimuth x elevation strata (as square as possible for batch_size cells)
+        # with one jittered sample per cell, the grid is randomly offset every step
+        cols = int(np.ceil(np.sqrt(batch_size)))
+        rows = int(np.ceil(batch_size / cols))
+        cells = rng.permuted(np.tile(np.arange(rows * cols), (iters, 1)), axis=1)[:, :batch_size] # [iters, batch_size]
+        u = np.empty((iters, batch_size, 3))
+        u[..., 0] = (cells // cols + rng.random((iters, batch_size))) / rows
+        u[..., 1] = ((cells % cols + rng.random((iters, batch_size))) / cols + rng.random((iters, 1))) % 1
+        u[..., 2] = rng.random((iters, batch_size))
+        return u.reshape(-1, 3)
+
+    @classmethod
+    def from_opt(cls, opt, seed=0):
+        # stage 1 schedule of a config: same elevation bounds as before
+        # (avoid too large elevation (> 80 or < -80), and make sure it always cover [min_ver, max_ver])
+        min_ver = max(min(opt.min_ver, opt.min_ver - opt.elevation), -80 - opt.elevation)
+        max_ver = min(max(opt.max_ver, opt.max_ver - opt.elevation), 80 - opt.elevation)
+        return cls(
+            opt.iters, opt.batch_size, opt.elevation, opt.radius, min_ver, max_ver, opt.invert_bg_prob,
+            num_views=4 if (opt.mvdream or opt.imagedream) else 1, mode=opt.view_sampler, seed=seed,
+        )
+
+    def __len__(self):
+        return self.iters
+
+    def sample(self, step):
+        # return: elevation and azimuth offsets [batch_size] in degrees, white background flags [batch_size], render resolution
+        if step <= self.iters:
+            i = step - 1
+            return self.vers[i], self.hors[i], self.white_bg[i], int(self.resolutions[i])
+
+        u = np.random.default_rng((self.seed, step)).random((self.batch_size, 3))
+        vers = (self.min_ver + u[:, 0] * (self.max_ver - self.min_ver)).astype(np.float32)
+        hors = (-180 + u[:, 1] * 360).astype(np.float32)
+        return vers, hors, u[:, 2] >= self.invert_bg_prob, int(self.resolutions[-1])
+
+    def views(self, step):
+        # every rendered view of a step (the num_views views of a sample follow each other)
+        # return: absolute elevations, azimuths, radii [batch_size * num_views], bg colors [batch_size * num_views, 3], render resolution
+        vers, hors, white_bg, resolution = self.sample(step)
+        offsets = 90 * np.arange(self.num_views, dtype=np.float32)
+        view_vers = np.repeat(self.elevation + vers, self.num_views)
+        view_hors = (hors[:, None] + offsets[None, :]).reshape(-1)
+        view_radii = np.full_like(view_vers, self.radius)
+        bg_colors = np.repeat(white_bg, self.num_views)[:, None].repeat(3, axis=1).astype(np.float32)
+        return view_vers, view_hors, view_radii, bg_colors, resolution
+
+    def save(self, path):
+        np.savez_compressed(
+            path, vers=self.vers, hors=self.hors, white_bg=self.white_bg, resolutions=self.resolutions,
+            config=np.array([self.elevation, self.radius, self.min_ver, self.max_ver, self.num_views, self.seed, self.invert_bg_prob], dtype=np.float64), mode=self.mode,
+        )
+
+    @classmethod
+    def load(cls, path):
+        # replay a saved schedule
+        data = np.load(path)
+        sampler = cls.__new__(cls)
+        sampler.vers, sampler.hors, sampler.white_bg, sampler.resolutions = data["vers"], data["hors"], data["white_bg"], data["resolutions"]
+        sampler.iters, sampler.batch_size = sampler.vers.shape
+        elevation, radius, min_ver, max_ver, num_views, seed, invert_bg_prob = data["config"]
+        sampler.elevation, sampler.radius, sampler.min_ver, sampler.max_ver = float(elevation), float(radius), float(min_ver), float(max_ver)
+        sampler.num_views, sampler.seed, sampler.mode = int(num_views), int(seed), str(data["mode"])
+        sampler.invert_bg_prob = float(invert_bg_prob)
+        return sampler